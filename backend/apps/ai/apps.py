@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class AIConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.ai'
+    label = 'ai'
+
+    def ready(self):
+        # 注册文章保存/删除时更新知识库检索索引的信号
+        from . import signals  # noqa: F401
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from asgiref.sync import sync_to_async
+
+from .config import DeepSeekConfig
+from .cache import result_cache
+from .services import (
+    DeepSeekService,
+    DEFAULT_TAGS,
+    DEFAULT_WRITING_RATING,
+    DEFAULT_WRITING_SUGGESTIONS,
+)
+from . import chunking, prompts, resilience, routing, usage
+from .resilience import DeepSeekError
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDeepSeekService(DeepSeekService):
+    """DeepSeek AI服务（异步版本）
+
+    提示词、结果解析和缓存与同步服务共用，上游调用使用 httpx 异步客户端，
+    与同步调用一样按优先级从调度器取得名额，经同一个路由器选择上游和发送对冲请求。
+    排队和重试等待都在事件循环中进行，等待期间不占用工作线程。
+    """
+
+    async def _await_before_retry(self, wait_time: float, deadline: Optional[float]) -> bool:
+        """重试前异步等待；如果等待后已超过截止时间则不再重试"""
+        if deadline is not None and time.monotonic() + wait_time >= deadline:
+            return False
+        await asyncio.sleep(wait_time)
+        return True
+
+    async def agenerate_content(self, prompt: str, max_tokens: int = None,
+                                deadline: Optional[float] = None, json_mode: bool = False,
+                                operation: str = "generate", messages: Optional[List[Dict]] = None) -> str:
+        """生成内容（异步）"""
+        if not self.api_key:
+            raise Exception("DeepSeek API Key未配置")
+
+        max_tokens = max_tokens or DeepSeekConfig.DEFAULT_MAX_TOKENS
+
+        headers, data = self._build_request(prompt, max_tokens, messages=messages)
+        if json_mode:
+            data["response_format"] = {"type": "json_object"}
+
+        # 与同步版本共用熔断器和重试预算
+        resilience.retry_budget.record_request()
+        router = routing.get_router()
+        error = None
+        provider = None
+        for attempt in range(self.max_retries):
+            if attempt > 0:
+                if not resilience.acquire_retry(error):
+                    break
+                wait_time = resilience.backoff_delay(attempt)
+                if not await self._await_before_retry(wait_time, deadline):
+                    break
+                logger.info(f"已等待 {wait_time:.2f} 秒，重试...")
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+            resilience.check_circuit()
+            try:
+                logger.info(f"尝试异步调用DeepSeek API (第{attempt + 1}次)...")
+                # 与同步调用共用调度器的名额、优先级和排队截止时间；
+                # 重试时优先换一个上游，主上游过慢时路由器会发送对冲请求
+                async with scheduler.aslot(operation, deadline):
+                    # 排队可能用掉了剩余时间，取得名额后重新检查截止时间
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        # 没有发出请求，归还 check_circuit 可能占用的半开探测名额
+                        resilience.circuit_breaker.release_probe()
+                        error = DeepSeekError("DeepSeek API请求超时，请检查网络连接或稍后重试", retryable=True)
+                        break
+                    started_at = time.monotonic()
+                    provider, response = await router.apost(
+                        "/chat/completions",
+                        headers=headers,
+                        data=data,
+                        operation=operation,
+                        total_timeout=remaining,
+                        avoid=provider
+                    )
+            except httpx.TimeoutException:
+                error = DeepSeekError("DeepSeek API请求超时，请检查网络连接或稍后重试", retryable=True)
+            except httpx.HTTPError:
+                error = DeepSeekError("网络连接错误，请检查网络设置", retryable=True)
+            else:
+                if response.status_code == 200:
+                    resilience.record_outcome()
+                    result = response.json()
+                    logger.info("DeepSeek API调用成功")
+                    content = result["choices"][0]["message"]["content"]
+                    await sync_to_async(usage.record_usage)(
+                        operation, provider.model or self.model,
+                        usage.normalize_usage(result.get("usage"), self._prompt_text(data), content),
+                        time.monotonic() - started_at
+                    )
+                    return content
+                error = DeepSeekError(
+                    f"DeepSeek API错误: {response.status_code} - {response.text}",
+                    retryable=resilience.is_retryable_status(response.status_code)
+                )
+
+            resilience.record_outcome(error)
+            logger.error(str(error))
+
+        if error is None:
+            raise DeepSeekError("DeepSeek API请求超时，请检查网络连接或稍后重试")
+        raise error
+
+    async def _acached(self, operation: str, params: Dict, content: str, compute):
+        """_cached 的异步版本，compute 为返回协程的函数"""
+        key = result_cache.make_key(operation, self.model, prompts.PROMPT_VERSIONS[operation], params, content)
+        return await result_cache.aget_or_compute(key, compute, operation=operation)
+
+    async def agenerate_article_outline(self, topic: str, style: str = "专业") -> Dict:
+        """生成文章大纲（异步）"""
+        prompt = prompts.outline_prompt(topic, style)
+
+        async def compute():
+            return self._parse_outline(await self.agenerate_content(prompt, operation="outline"))
+
+        try:
+            return await self._acached("outline", {"style": style}, topic, compute)
+        except Exception as e:
+            logger.error(f"生成大纲失败: {e}")
+            return self._create_default_outline(topic)
+
+    async def aimprove_writing(self, content: str, improve_type: str = "style", mode: str = None) -> Dict:
+        """文章润色优化（异步），mode 含义与 improve_writing 相同"""
+        mode = mode or DeepSeekConfig.IMPROVE_MODE
+        deadline = time.monotonic() + DeepSeekConfig.IMPROVE_DEADLINE
+
+        if mode == "structured":
+            try:
+                prompt = prompts.structured_improve_prompt(content, improve_type)
+                result = await self.agenerate_content(prompt, max_tokens=4500, deadline=deadline,
+                                                      json_mode=True, operation="improve")
+                return self._parse_structured_improvement(result)
+            except Exception as e:
+                logger.warning(f"结构化润色失败，改用并发模式: {e}")
+
+        prompt = prompts.improve_prompt(content, improve_type)
+        improved, suggestions, rating = await asyncio.gather(
+            self.agenerate_content(prompt, max_tokens=4000, deadline=deadline, operation="improve"),
+            self._agenerate_writing_suggestions(content, deadline),
+            self._arate_writing_quality(content, deadline),
+            return_exceptions=True,
+        )
+
+        if isinstance(improved, Exception):
+            logger.error(f"文章优化失败: {improved}")
+            return self._improvement_unavailable(content)
+
+        return {
+            "improved_content": improved,
+            "suggestions": suggestions if isinstance(suggestions, list) else DEFAULT_WRITING_SUGGESTIONS,
+            "overall_rating": rating if isinstance(rating, str) else DEFAULT_WRITING_RATING,
+            "provider": "deepseek"
+        }
+
+    async def _agenerate_writing_suggestions(self, content: str, deadline: Optional[float] = None) -> List[str]:
+        """生成写作建议（异步）"""
+        if len(content) < 50:
+            return ["内容较短，建议扩展更多技术细节"]
+
+        try:
+            text = chunking.leading_text(content, DeepSeekConfig.SUGGESTIONS_MAX_CHARS)
+            suggestions = await self.agenerate_content(
+                prompts.suggestions_prompt(text), max_tokens=500, deadline=deadline, operation="suggestions"
+            )
+            return self._parse_suggestions(suggestions)
+        except Exception:
+            return DEFAULT_WRITING_SUGGESTIONS
+
+    async def _arate_writing_quality(self, content: str, deadline: Optional[float] = None) -> str:
+        """评估写作质量（异步）"""
+        if len(content) < 50:
+            return "内容过短"
+
+        try:
+            rating = await self.agenerate_content(prompts.rating_prompt(content), max_tokens=10,
+                                                  deadline=deadline, operation="rating")
+            score = self._parse_rating(rating)
+            if score:
+                return score
+        except Exception:
+            pass
+
+        return DEFAULT_WRITING_RATING
+
+    async def _asummarize_chunk(self, chunk: str, semaphore: asyncio.Semaphore) -> Optional[str]:
+        """摘要单个分块（异步），出错时返回 None"""
+        async with semaphore:
+            try:
+                return await self._acached(
+                    "chunk_summary", {}, chunk,
+                    lambda: self.agenerate_content(
+                        prompts.chunk_summary_prompt(chunk), max_tokens=400, operation="chunk_summary"
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"分块任务失败: {e}")
+                return None
+
+    async def _aarticle_digest(self, content: str) -> str:
+        """_article_digest 的异步版本，同时最多 CHUNK_CONCURRENCY 个分块在请求中"""
+        chunks = chunking.split_chunks(content)
+        semaphore = asyncio.Semaphore(DeepSeekConfig.CHUNK_CONCURRENCY)
+        for _ in range(DeepSeekConfig.CHUNK_REDUCE_MAX_DEPTH):
+            if len(chunks) <= 1:
+                break
+            results = await asyncio.gather(*(self._asummarize_chunk(chunk, semaphore) for chunk in chunks))
+            chunks = self._reduce_chunks(chunks, results)
+        return "\n\n".join(chunks)
+
+    async def agenerate_summary(self, content: str, max_length: int = 200) -> str:
+        """生成文章摘要（异步）"""
+        if len(content) < 100:
+            return content
+
+        try:
+            text = await self._aarticle_digest(content)
+            prompt = prompts.summary_prompt(text, max_length)
+            summary = await self._acached(
+                "summary", {"max_length": max_length}, text,
+                lambda: self.agenerate_content(prompt, max_tokens=300, operation="summary")
+            )
+            return self._truncate_summary(summary, max_length)
+        except Exception as e:
+            logger.error(f"生成摘要失败: {e}")
+            return self._truncate_summary(content, max_length)
+
+    async def agenerate_tags(self, content: str, count: int = 5) -> List[str]:
+        """生成文章标签（异步）"""
+        if len(content) < 50:
+            return ["技术", "文档"]
+
+        try:
+            text = await self._aarticle_digest(content)
+            prompt = prompts.tags_prompt(text, count)
+            result = await self._acached(
+                "tags", {"count": count}, text,
+                lambda: self.agenerate_content(prompt, max_tokens=100, operation="tags")
+            )
+            return self._parse_tags(result, count)
+        except Exception:
+            return DEFAULT_TAGS
+
+# 全局异步DeepSeek服务实例
+async_deepseek_service = AsyncDeepSeekService()
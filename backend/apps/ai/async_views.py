@@ -0,0 +1,219 @@
+"""AI功能的异步视图
+
+DRF 的视图是同步的，这里直接使用 Django 原生异步视图：在ASGI下运行时，
+等待DeepSeek响应和重试退避都不会占用工作线程。接口的请求和响应格式与
+views.py 中对应的同步接口保持一致。
+"""
+import json
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import AIAssistantSession
+from .async_services import async_deepseek_service
+from . import completion, conversation, throttling, usage
+from .context import schedule_compaction
+from .resilience import CircuitOpenError, circuit_breaker
+from .serializers import (
+    AIMessageSerializer,
+    OutlineRequestSerializer,
+    ImproveRequestSerializer,
+    SummaryRequestSerializer,
+    AutoCompleteRequestSerializer
+)
+
+_authenticator = JWTAuthentication()
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def _circuit_open(error):
+    response = _json({'error': str(error)}, status=503)
+    response['Retry-After'] = str(max(1, circuit_breaker.retry_after()))
+    return response
+
+
+def async_jwt_view(throttle_scope: str):
+    """异步视图的JWT认证和限流，并解析JSON请求体到 request.data
+
+    Django 4.2 的 csrf_exempt/require_POST 装饰器会把异步视图包装成同步函数，
+    这里直接在包装函数中完成对应的处理。throttle_scope 与同步接口的限流范围相同。
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                return _json({'detail': f'方法 "{request.method}" 不被允许。'}, status=405)
+            try:
+                # 认证会查询用户表，放到线程池执行
+                result = await sync_to_async(_authenticator.authenticate)(request)
+            except APIException as e:
+                return _json({'detail': str(e.detail)}, status=401)
+            if result is None:
+                return _json({'detail': '身份认证信息未提供。'}, status=401)
+            request.user, request.auth = result
+
+            wait = await sync_to_async(throttling.check_request)(request.user.pk, throttle_scope)
+            if wait is not None:
+                response = _json({'detail': throttling.throttled_message(wait)}, status=429)
+                response['Retry-After'] = str(math.ceil(wait))
+                return response
+
+            try:
+                request.data = json.loads(request.body or b'{}')
+            except ValueError:
+                return _json({'error': '请求体不是有效的JSON'}, status=400)
+            with usage.usage_scope(request.user):
+                return await view(request, *args, **kwargs)
+        # 使用JWT认证，不需要CSRF校验
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@async_jwt_view('ai_chat')
+async def chat(request, pk):
+    """与AI对话（异步）"""
+    session = await AIAssistantSession.objects.filter(pk=pk, user=request.user).afirst()
+    if session is None:
+        return _json({'detail': '未找到。'}, status=404)
+
+    message_content = str(request.data.get('message', '')).strip()
+    if not message_content:
+        return _json({'error': '消息内容不能为空'}, status=400)
+
+    if circuit_breaker.state == circuit_breaker.OPEN:
+        return _circuit_open(CircuitOpenError('DeepSeek服务暂时不可用，请稍后重试'))
+
+    # 两阶段：先保存用户消息和生成中的AI消息，模型返回后再更新AI消息
+    user_message, ai_message = await sync_to_async(conversation.start_turn)(session, message_content)
+    try:
+        messages, needs_compaction = await sync_to_async(conversation.turn_context)(session, ai_message)
+        with usage.collect() as records:
+            ai_response = await async_deepseek_service.agenerate_content(
+                '', operation="chat", messages=messages
+            )
+    except Exception as e:
+        await sync_to_async(conversation.fail_turn)(ai_message, str(e))
+        if isinstance(e, CircuitOpenError):
+            return _circuit_open(e)
+        return _json({
+            'error': f'AI服务错误: {str(e)}',
+            'user_message': AIMessageSerializer(user_message).data,
+            'ai_message': AIMessageSerializer(ai_message).data
+        }, status=500)
+
+    await sync_to_async(conversation.complete_turn)(
+        ai_message, ai_response, sum(r['completion_tokens'] for r in records)
+    )
+    if needs_compaction:
+        schedule_compaction(session.id)
+
+    return _json({
+        'user_message': AIMessageSerializer(user_message).data,
+        'ai_message': AIMessageSerializer(ai_message).data
+    })
+
+
+@async_jwt_view('ai_generate')
+async def generate_outline(request):
+    """生成文章大纲（异步）"""
+    serializer = OutlineRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return _json(serializer.errors, status=400)
+
+    topic = serializer.validated_data['topic']
+    style = serializer.validated_data.get('style', '专业')
+
+    try:
+        outline = await async_deepseek_service.agenerate_article_outline(topic, style)
+        return _json(outline)
+    except Exception as e:
+        return _json({'error': f'生成大纲失败: {str(e)}'}, status=500)
+
+
+@async_jwt_view('ai_improve')
+async def improve_article(request):
+    """文章润色优化（异步）"""
+    serializer = ImproveRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return _json(serializer.errors, status=400)
+
+    content = serializer.validated_data['content']
+    improve_type = serializer.validated_data.get('improve_type', 'style')
+    mode = serializer.validated_data.get('mode')
+
+    try:
+        improvement = await async_deepseek_service.aimprove_writing(content, improve_type, mode)
+        return _json(improvement)
+    except Exception as e:
+        return _json({'error': f'文章优化失败: {str(e)}'}, status=500)
+
+
+@async_jwt_view('ai_generate')
+async def generate_summary(request):
+    """生成文章摘要（异步）"""
+    serializer = SummaryRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return _json(serializer.errors, status=400)
+
+    content = serializer.validated_data['content']
+    max_length = serializer.validated_data.get('max_length', 200)
+
+    try:
+        summary = await async_deepseek_service.agenerate_summary(content, max_length)
+        return _json({'summary': summary})
+    except Exception as e:
+        return _json({'error': f'生成摘要失败: {str(e)}'}, status=500)
+
+
+@async_jwt_view('ai_generate')
+async def generate_tags(request):
+    """生成文章标签（异步）"""
+    content = str(request.data.get('content', '')).strip()
+    count = request.data.get('count', 5)
+
+    if not content:
+        return _json({'error': '内容不能为空'}, status=400)
+
+    try:
+        tags = await async_deepseek_service.agenerate_tags(content, count)
+        return _json({'tags': tags})
+    except Exception as e:
+        return _json({'error': f'生成标签失败: {str(e)}'}, status=500)
+
+
+@async_jwt_view('ai_autocomplete')
+async def auto_complete(request):
+    """文章自动补全（异步），支持 mode 参数和结果缓存；取消旧请求只在同步接口中提供"""
+    if not request.data.get('prompt', ''):
+        return _json({'error': '补全提示不能为空'}, status=400)
+
+    serializer = AutoCompleteRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return _json(serializer.errors, status=400)
+    data = serializer.validated_data
+
+    full_prompt, max_tokens, cache_key = completion.prepare(data['context'], data['prompt'], data['mode'])
+    cached = completion.completion_cache.get(cache_key)
+    if cached is not None:
+        return _json({'completion': cached, 'cached': True})
+
+    try:
+        text = await async_deepseek_service.agenerate_content(
+            full_prompt, max_tokens=max_tokens, operation="auto_complete"
+        )
+    except CircuitOpenError as e:
+        return _circuit_open(e)
+    except Exception as e:
+        return _json({'error': f'自动补全失败: {str(e)}'}, status=500)
+
+    if text:
+        completion.completion_cache.set(cache_key, text)
+    return _json({'completion': text})
@@ -0,0 +1,146 @@
+"""批量处理文章（摘要、标签）
+
+一次请求处理多篇文章：文章内容一次查询读出，每篇文章的AI调用在共享线程池中执行，
+单个请求同时最多处理 BATCH_CONCURRENCY 篇，所有批量请求共用 BATCH_WORKERS 个线程，
+不会占满分块摘要使用的线程池。生成的摘要在处理结束时用一条 bulk_update 写回，
+随后逐篇更新相关文章索引和知识库检索索引（bulk_update 不触发 post_save）。
+每篇文章单独报告结果，部分失败不影响其他文章。
+"""
+import contextvars
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List
+
+from django.utils import timezone
+
+from articles import embeddings
+from articles.models import Article
+
+from . import retrieval
+from .config import DeepSeekConfig
+from .scheduler import priority_scope
+from .services import deepseek_service
+
+logger = logging.getLogger(__name__)
+
+_batch_executor = ThreadPoolExecutor(
+    max_workers=DeepSeekConfig.BATCH_WORKERS, thread_name_prefix="ai-batch"
+)
+
+
+def _process_article(article_id: int, content: str, options: Dict) -> Dict:
+    """处理单篇文章，每个操作单独记录成功或失败（按 batch 优先级排队）"""
+    with priority_scope('batch'):
+        return _run_operations(article_id, content, options)
+
+
+def _run_operations(article_id: int, content: str, options: Dict) -> Dict:
+    result = {'article_id': article_id, 'errors': {}}
+    if 'summary' in options['operations']:
+        try:
+            result['summary'] = deepseek_service.generate_summary(
+                content, options['max_length'], strict=True
+            )
+        except Exception as e:
+            result['errors']['summary'] = str(e)
+    if 'tags' in options['operations']:
+        try:
+            result['tags'] = deepseek_service.generate_tags(content, options['tag_count'], strict=True)
+        except Exception as e:
+            result['errors']['tags'] = str(e)
+    if not result['errors']:
+        result['status'] = 'ok'
+    else:
+        result['status'] = 'partial' if len(result['errors']) < len(options['operations']) else 'failed'
+    return result
+
+
+def _save_summaries(summaries: Dict[int, str]) -> int:
+    """用一条 bulk_update 写回摘要，并更新相关文章索引和知识库检索索引"""
+    if not summaries:
+        return 0
+    now = timezone.now()
+    articles = [Article(id=article_id, summary=summary, updated_at=now)
+                for article_id, summary in summaries.items()]
+    saved = Article.objects.bulk_update(articles, ['summary', 'updated_at'], batch_size=100)
+    _refresh_indexes(list(summaries))
+    return saved
+
+
+def _refresh_indexes(article_ids: List[int]):
+    """bulk_update 不触发 post_save，这里按信号处理函数的方式逐篇更新索引"""
+    updated = Article.objects.filter(id__in=article_ids).only('id', 'title', 'content', 'author_id', 'updated_at')
+    for article in updated:
+        try:
+            embeddings.update_article(article)
+        except Exception as e:
+            logger.warning(f"更新文章 #{article.pk} 的向量失败: {e}")
+        try:
+            retrieval.update_article(article)
+        except Exception as e:
+            logger.warning(f"更新文章 #{article.pk} 的检索索引失败: {e}")
+
+
+def run_batch(user, article_ids: List[int], options: Dict) -> Iterator[Dict]:
+    """逐篇产出处理结果（按完成顺序），全部完成或迭代被中断时写回已生成的摘要
+
+    options: operations、max_length、tag_count、overwrite（为 False 时跳过已有摘要的文章）。
+    """
+    articles = {
+        article_id: (content, summary)
+        for article_id, content, summary in Article.objects.filter(
+            author=user, id__in=article_ids
+        ).values_list('id', 'content', 'summary')
+    }
+
+    queue = []
+    for article_id in dict.fromkeys(article_ids):
+        if article_id not in articles:
+            yield {'article_id': article_id, 'status': 'not_found', 'errors': {'article': '文章不存在'}}
+            continue
+        operations = list(options['operations'])
+        if not options['overwrite'] and articles[article_id][1]:
+            operations = [op for op in operations if op != 'summary']
+        if operations:
+            queue.append((article_id, operations))
+        else:
+            yield {'article_id': article_id, 'status': 'skipped', 'errors': {}}
+
+    summaries = {}
+    pending = {}
+    items = iter(queue)
+
+    def submit_next():
+        for article_id, operations in items:
+            # 携带上下文，用量记到当前用户名下
+            future = _batch_executor.submit(
+                contextvars.copy_context().run, _process_article,
+                article_id, articles[article_id][0], dict(options, operations=operations)
+            )
+            pending[future] = article_id
+            return
+
+    try:
+        for _ in range(DeepSeekConfig.BATCH_CONCURRENCY):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                article_id = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'article_id': article_id, 'status': 'failed', 'errors': {'article': str(e)}}
+                if 'summary' in result:
+                    summaries[article_id] = result['summary']
+                submit_next()
+                yield result
+    finally:
+        # 客户端中途断开时不再提交新的文章，已提交的执行完后丢弃
+        for future in pending:
+            future.cancel()
+        try:
+            saved = _save_summaries(summaries)
+            logger.info(f"批量处理写回 {saved} 篇文章的摘要")
+        except Exception as e:
+            logger.error(f"批量写回摘要失败: {e}")
@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .config import DeepSeekConfig
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """一次正在进行中的上游调用，供相同key的并发请求等待结果"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _LeaderCancelled(Exception):
+    """异步 single-flight 中负责计算的请求被取消（例如客户端断开），等待者重新发起计算"""
+
+
+class ResultCache:
+    """AI结果两级缓存
+
+    第一级是进程内带TTL的LRU，第二级是数据库表 ai_result_cache（多进程共享）。
+    相同key的并发请求只会有一个真正调用上游（single-flight），其余请求等待并复用结果。
+    计算失败的结果不会被缓存。
+    """
+
+    def __init__(self, max_entries: int = None, ttl: int = None, store_ttl: int = None):
+        self.max_entries = max_entries or DeepSeekConfig.CACHE_MAX_ENTRIES
+        self.ttl = ttl or DeepSeekConfig.CACHE_TTL
+        self.store_ttl = store_ttl or DeepSeekConfig.CACHE_STORE_TTL
+
+        self._entries = OrderedDict()  # key -> (过期时间, 值)
+        self._inflight = {}
+        self._ainflight = {}  # 事件循环 -> {key: asyncio.Future}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {
+            'hits': 0,
+            'store_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'errors': 0,
+        }
+
+    @staticmethod
+    def make_key(operation: str, model: str, version: int, params: Dict, content: str) -> str:
+        """根据模型、提示词模板版本、参数和内容生成缓存key"""
+        raw = json.dumps({
+            'operation': operation,
+            'model': model,
+            'version': version,
+            'params': params,
+            'content_sha256': hashlib.sha256(content.encode('utf-8')).hexdigest(),
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], operation: str = '') -> Any:
+        """读取缓存，未命中时调用 compute 计算并写入两级缓存"""
+        with self._lock:
+            found, value = self._get_local(key)
+            if found:
+                self._stats['hits'] += 1
+                return value
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            found, value = self._get_stored(key)
+            if found:
+                with self._lock:
+                    self._stats['store_hits'] += 1
+            else:
+                with self._lock:
+                    self._stats['misses'] += 1
+                value = compute()
+                self._set_stored(key, operation, value)
+
+            with self._lock:
+                self._set_local(key, value)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                              operation: str = '') -> Any:
+        """get_or_compute 的异步版本，compute 为返回协程的函数
+
+        single-flight 只在同一事件循环内生效，数据库缓存的读写放到线程池中执行。
+        计算的请求被取消时，等待者不受影响，其中一个重新发起计算。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                found, value = self._get_local(key)
+                if found:
+                    self._stats['hits'] += 1
+                    return value
+
+                inflight = self._ainflight.setdefault(loop, {})
+                future = inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = loop.create_future()
+                    inflight[key] = future
+                else:
+                    self._stats['coalesced'] += 1
+
+            if leader:
+                break
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # 原来的计算请求被取消，由第一个重新进入的等待者接着计算
+                continue
+
+        try:
+            found, value = await sync_to_async(self._get_stored)(key)
+            if found:
+                with self._lock:
+                    self._stats['store_hits'] += 1
+            else:
+                with self._lock:
+                    self._stats['misses'] += 1
+                value = await compute()
+                await sync_to_async(self._set_stored)(key, operation, value)
+
+            with self._lock:
+                self._set_local(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # 不能直接 cancel 共享的 future：等待者会收到 CancelledError，连同自己一起被取消
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                inflight.pop(key, None)
+                if not inflight:
+                    self._ainflight.pop(loop, None)
+
+    def _get_local(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._stats['expirations'] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _set_local(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _get_stored(self, key: str):
+        from .models import AIResultCache
+
+        try:
+            row = AIResultCache.objects.filter(
+                cache_key=key, expires_at__gt=timezone.now()
+            ).values_list('value', flat=True).first()
+        except Exception as e:
+            # 数据库缓存不可用时退化为只用进程内缓存
+            logger.warning(f"读取AI结果缓存失败: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return False, None
+        if row is None:
+            return False, None
+        return True, row
+
+    def _set_stored(self, key: str, operation: str, value: Any):
+        from .models import AIResultCache
+
+        expires_at = timezone.now() + timedelta(seconds=self.store_ttl)
+        try:
+            updated = AIResultCache.objects.filter(cache_key=key).update(
+                value=value, expires_at=expires_at
+            )
+            if not updated:
+                try:
+                    AIResultCache.objects.create(
+                        cache_key=key, operation=operation, value=value, expires_at=expires_at
+                    )
+                except IntegrityError:
+                    # 其他进程刚写入了相同key，结果等价，忽略即可
+                    pass
+        except Exception as e:
+            logger.warning(f"写入AI结果缓存失败: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_purge = self._writes % DeepSeekConfig.CACHE_PURGE_EVERY == 0
+        if should_purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """清理数据库中已过期的缓存"""
+        from .models import AIResultCache
+
+        try:
+            deleted, _ = AIResultCache.objects.filter(expires_at__lte=timezone.now()).delete()
+        except Exception as e:
+            logger.warning(f"清理AI结果缓存失败: {e}")
+            return 0
+        return deleted
+
+    def clear_local(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """命中/未命中/淘汰统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['in_flight'] = len(self._inflight) + sum(len(v) for v in self._ainflight.values())
+        lookups = stats['hits'] + stats['store_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['store_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# 全局结果缓存实例
+result_cache = ResultCache()
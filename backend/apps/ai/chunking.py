@@ -0,0 +1,90 @@
+"""长文章分块
+
+文章内容是编辑器生成的HTML（也兼容纯文本/Markdown）。先按段落、标题、代码块等
+块级元素切分并转为纯文本，再把相邻的块合并为不超过 max_chars 的分块；
+遇到标题时尽量另起一块，使修改某个章节只影响它所在的分块。
+"""
+import html
+import re
+from typing import List
+
+from django.utils.html import strip_tags
+
+from .config import DeepSeekConfig
+
+# 块级元素的结束位置、标题的开始位置、纯文本中的空行都作为切分点
+_BLOCK_SPLIT_RE = re.compile(
+    r'(?<=</p>)|(?<=</h[1-6]>)|(?<=</pre>)|(?<=</blockquote>)|(?<=</ul>)|(?<=</ol>)|(?<=</table>)'
+    r'|(?<=<br>)|(?<=<br/>)|(?=<h[1-6][\s>])|\n\s*\n',
+    re.IGNORECASE
+)
+_HEADING_RE = re.compile(r'^\s*(<h[1-6][\s>]|#{1,6}\s)', re.IGNORECASE)
+_SENTENCE_END_RE = re.compile(r'(?<=[。！？；.!?;])')
+
+
+def _to_text(block: str) -> str:
+    text = html.unescape(strip_tags(block))
+    return re.sub(r'[ \t\r\f\v]+', ' ', text).strip()
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """超长的单个段落按句子切分，单句仍然过长时硬切"""
+    pieces, current = [], ''
+    for sentence in _SENTENCE_END_RE.split(text):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) > max_chars:
+            pieces.append(current)
+            current = ''
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_blocks(content: str) -> List[tuple]:
+    """切分为 (是否标题, 纯文本) 的块列表，忽略空块"""
+    blocks = []
+    for raw in _BLOCK_SPLIT_RE.split(content or ''):
+        text = _to_text(raw)
+        if text:
+            blocks.append((bool(_HEADING_RE.match(raw)), text))
+    return blocks
+
+
+def split_chunks(content: str, max_chars: int = None) -> List[str]:
+    """把文章切分为若干不超过 max_chars 的纯文本分块"""
+    max_chars = max_chars or DeepSeekConfig.CHUNK_MAX_CHARS
+    min_chars = max_chars // 4
+
+    chunks, current = [], ''
+    for is_heading, text in split_blocks(content):
+        pieces = _split_long(text, max_chars) if len(text) > max_chars else [text]
+        for piece in pieces:
+            # 新章节开始且当前分块已有一定长度时另起一块
+            starts_section = is_heading and len(current) >= min_chars
+            if current and (starts_section or len(current) + len(piece) + 1 > max_chars):
+                chunks.append(current)
+                current = ''
+            current = f"{current}\n{piece}" if current else piece
+            is_heading = False
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def leading_text(content: str, max_chars: int) -> str:
+    """文章开头不超过 max_chars 的纯文本，在块边界处截断"""
+    parts, length = [], 0
+    for _, text in split_blocks(content):
+        if length + len(text) > max_chars:
+            if not parts:
+                parts.append(text[:max_chars])
+            break
+        parts.append(text)
+        length += len(text) + 1
+    return "\n".join(parts)
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Dict, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import DeepSeekConfig
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCancelled(requests.exceptions.RequestException):
+    """请求被调用方取消（例如对冲请求中落后的一方）"""
+
+
+def _request_timeout(total_timeout: Optional[float], default: float, timeout_error) -> float:
+    """本次请求的总超时：调用方的剩余时间与默认总超时中较小的一个
+
+    剩余时间为0或负数（排队或重试等待已用完截止时间）时直接抛出 timeout_error，不发出请求。
+    """
+    if total_timeout is None:
+        return default
+    if total_timeout <= 0:
+        raise timeout_error("请求截止时间已过")
+    return min(total_timeout, default)
+
+
+class DeepSeekHTTPClient:
+    """DeepSeek HTTP传输层
+
+    所有请求共用一个 requests.Session 和有界连接池，复用 keep-alive 连接，
+    避免每次调用都重新进行 TCP + TLS 握手。Session 本身不保存会话状态（不使用cookie），
+    可以在 WSGI/ASGI 的多个工作线程之间共享。
+    """
+
+    def __init__(self, base_url: str = None, pool_connections: int = None,
+                 pool_maxsize: int = None, connect_timeout: float = None,
+                 read_timeout: float = None, total_timeout: float = None):
+        self.base_url = (base_url or DeepSeekConfig.BASE_URL).rstrip('/')
+        self.pool_maxsize = pool_maxsize or DeepSeekConfig.POOL_MAXSIZE
+        self.connect_timeout = connect_timeout or DeepSeekConfig.CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or DeepSeekConfig.READ_TIMEOUT
+        self.total_timeout = total_timeout or DeepSeekConfig.TOTAL_TIMEOUT
+
+        self.session = requests.Session()
+        # pool_block=True：连接池满时排队等待空闲连接，而不是无限制地新建socket
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections or DeepSeekConfig.POOL_CONNECTIONS,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=True,
+            max_retries=0,  # 重试由 DeepSeekService 负责
+        )
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._requests = 0
+        self._errors = 0
+        self._timeouts = 0
+        self._cancelled = 0
+        self._total_latency = 0.0
+
+    def post(self, path: str, json: Dict, headers: Dict = None,
+             total_timeout: Optional[float] = None,
+             cancel: Optional[threading.Event] = None) -> requests.Response:
+        """发送POST请求并读取完整响应体
+
+        connect/read 超时交给 urllib3，总超时在读取响应体时按截止时间检查，
+        超时统一抛出 requests.exceptions.Timeout。
+        cancel 被设置后，收到响应头时立即关闭连接并抛出 RequestCancelled
+        （等待响应头期间无法中断）。
+        """
+        total_timeout = _request_timeout(total_timeout, self.total_timeout, requests.exceptions.Timeout)
+        deadline = time.monotonic() + total_timeout
+        started = time.monotonic()
+        self._on_start()
+        try:
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                headers=headers,
+                json=json,
+                timeout=(self.connect_timeout, min(self.read_timeout, total_timeout)),
+                stream=True,
+            )
+            try:
+                chunks = []
+                for chunk in response.iter_content(chunk_size=8192):
+                    if cancel is not None and cancel.is_set():
+                        raise RequestCancelled("请求已取消")
+                    chunks.append(chunk)
+                    if time.monotonic() > deadline:
+                        raise requests.exceptions.Timeout(
+                            f"请求总耗时超过 {total_timeout} 秒"
+                        )
+                # 把读取到的内容放回 response，之后 .json()/.text 照常可用
+                response._content = b''.join(chunks)
+                response._content_consumed = True
+            finally:
+                # 读完后释放连接回连接池
+                response.close()
+            return response
+        except RequestCancelled:
+            with self._lock:
+                self._cancelled += 1
+            raise
+        except requests.exceptions.Timeout:
+            with self._lock:
+                self._timeouts += 1
+                self._errors += 1
+            raise
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            self._on_finish(time.monotonic() - started)
+
+    def stream_lines(self, path: str, json: Dict, headers: Dict = None,
+                     total_timeout: Optional[float] = None) -> Iterator[str]:
+        """以流式方式发送POST请求，逐行返回响应内容
+
+        非200响应会读取完整响应体后抛出 requests.exceptions.HTTPError，
+        生成器被提前关闭（例如客户端断开）时会立即释放上游连接。
+        """
+        total_timeout = _request_timeout(total_timeout, self.total_timeout, requests.exceptions.Timeout)
+        deadline = time.monotonic() + total_timeout
+        started = time.monotonic()
+        self._on_start()
+        response = None
+        try:
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                headers=headers,
+                json=json,
+                timeout=(self.connect_timeout, min(self.read_timeout, total_timeout)),
+                stream=True,
+            )
+            if response.status_code != 200:
+                raise requests.exceptions.HTTPError(
+                    f"DeepSeek API错误: {response.status_code} - {response.text}",
+                    response=response,
+                )
+            # text/event-stream 通常不带charset，requests会按ISO-8859-1解码导致中文乱码
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                if time.monotonic() > deadline:
+                    raise requests.exceptions.Timeout(
+                        f"请求总耗时超过 {total_timeout} 秒"
+                    )
+                if line:
+                    yield line
+        except requests.exceptions.Timeout:
+            with self._lock:
+                self._timeouts += 1
+                self._errors += 1
+            raise
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            if response is not None:
+                response.close()
+            self._on_finish(time.monotonic() - started)
+
+    def _on_start(self):
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+    def _on_finish(self, latency: float):
+        with self._lock:
+            self._in_flight -= 1
+            self._total_latency += latency
+
+    def stats(self) -> Dict:
+        """连接池和请求统计"""
+        pools = []
+        # urllib3 的 PoolManager 按 host 维护连接池
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': pool.host,
+                'connections_created': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                # 队列中未建立的连接以 None 占位
+                'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0,
+            })
+
+        with self._lock:
+            avg_latency = self._total_latency / self._requests if self._requests else 0.0
+            return {
+                'pool_maxsize': self.pool_maxsize,
+                'in_flight': self._in_flight,
+                'max_in_flight': self._max_in_flight,
+                'requests': self._requests,
+                'errors': self._errors,
+                'timeouts': self._timeouts,
+                'cancelled': self._cancelled,
+                'avg_latency_ms': round(avg_latency * 1000, 1),
+                'pools': pools,
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> DeepSeekHTTPClient:
+    """获取进程内共享的HTTP客户端"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DeepSeekHTTPClient()
+    return _client
+
+
+class AsyncDeepSeekHTTPClient:
+    """DeepSeek 异步HTTP传输层（httpx）
+
+    供ASGI下的异步视图使用：等待上游响应时不占用线程，
+    同一事件循环内的所有请求共享一个有界的keep-alive连接池。
+    """
+
+    def __init__(self, base_url: str = None, pool_maxsize: int = None,
+                 connect_timeout: float = None, read_timeout: float = None,
+                 total_timeout: float = None):
+        self.base_url = (base_url or DeepSeekConfig.BASE_URL).rstrip('/')
+        self.pool_maxsize = pool_maxsize or DeepSeekConfig.POOL_MAXSIZE
+        self.connect_timeout = connect_timeout or DeepSeekConfig.CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or DeepSeekConfig.READ_TIMEOUT
+        self.total_timeout = total_timeout or DeepSeekConfig.TOTAL_TIMEOUT
+
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.pool_maxsize,
+                max_keepalive_connections=self.pool_maxsize,
+            ),
+            # pool：等待空闲连接的最长时间
+            timeout=httpx.Timeout(
+                connect=self.connect_timeout,
+                read=self.read_timeout,
+                write=self.read_timeout,
+                pool=self.total_timeout,
+            ),
+        )
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._requests = 0
+        self._errors = 0
+        self._timeouts = 0
+
+    async def post(self, path: str, json: Dict, headers: Dict = None,
+                   total_timeout: Optional[float] = None) -> httpx.Response:
+        """发送POST请求并读取完整响应体，超过总超时抛出 httpx.TimeoutException"""
+        total_timeout = _request_timeout(total_timeout, self.total_timeout, httpx.TimeoutException)
+        self._requests += 1
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            return await asyncio.wait_for(
+                self.client.post(f"{self.base_url}{path}", headers=headers, json=json),
+                timeout=total_timeout,
+            )
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            self._errors += 1
+            raise httpx.TimeoutException(f"请求总耗时超过 {total_timeout} 秒")
+        except httpx.TimeoutException:
+            self._timeouts += 1
+            self._errors += 1
+            raise
+        except httpx.HTTPError:
+            self._errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> Dict:
+        """请求统计"""
+        return {
+            'pool_maxsize': self.pool_maxsize,
+            'in_flight': self._in_flight,
+            'max_in_flight': self._max_in_flight,
+            'requests': self._requests,
+            'errors': self._errors,
+            'timeouts': self._timeouts,
+        }
+
+
+# httpx.AsyncClient 绑定在创建它的事件循环上，因此按事件循环、再按上游地址分别缓存
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client(base_url: str = None) -> AsyncDeepSeekHTTPClient:
+    """获取当前事件循环中某个上游（默认 DEEPSEEK_BASE_URL）共享的异步HTTP客户端"""
+    base_url = (base_url or DeepSeekConfig.BASE_URL).rstrip('/')
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(base_url)
+    if client is None:
+        client = clients[base_url] = AsyncDeepSeekHTTPClient(base_url=base_url)
+    return client
+
+
+def async_client_stats() -> Dict:
+    """汇总所有事件循环中异步客户端的统计"""
+    totals = {'event_loops': 0, 'in_flight': 0, 'requests': 0, 'errors': 0, 'timeouts': 0}
+    for clients in list(_async_clients.values()):
+        totals['event_loops'] += 1
+        for client in list(clients.values()):
+            stats = client.stats()
+            for key in ('in_flight', 'requests', 'errors', 'timeouts'):
+                totals[key] += stats[key]
+    return totals
@@ -0,0 +1,153 @@
+"""编辑器自动补全快速通道
+
+inline 模式用于编辑器中随输入触发的行内建议：
+- 只发送上下文末尾约 AUTOCOMPLETE_CONTEXT_TOKENS 个token，max_tokens 也很小；
+- 按（末尾上下文窗口 + 提示）在进程内缓存结果，用户回删、重复输入时直接命中；
+- 同一用户同一编辑器（channel）的新请求会取消旧请求：旧请求在收到下一段输出时
+  关闭上游连接并返回 cancelled，不再继续消耗token。request_id 需要递增，
+  晚到的旧请求直接视为已取消。取消只在同一进程内生效。
+
+full 模式保持原有的长补全（max_tokens=500），上下文同样按token预算截断，也使用缓存。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from .config import DeepSeekConfig
+from .services import deepseek_service
+from .tokens import trim_to_tokens
+from . import prompts
+
+MODE_SETTINGS = {
+    # 模式 -> (上下文token预算, max_tokens)
+    'inline': (DeepSeekConfig.AUTOCOMPLETE_CONTEXT_TOKENS, DeepSeekConfig.AUTOCOMPLETE_MAX_TOKENS),
+    'full': (DeepSeekConfig.AUTOCOMPLETE_FULL_CONTEXT_TOKENS, 500),
+}
+
+
+class CompletionCache:
+    """进程内带TTL的LRU（补全结果短小且时效性强，不写入数据库缓存）"""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (过期时间, 补全内容)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+completion_cache = CompletionCache(
+    max_entries=DeepSeekConfig.AUTOCOMPLETE_CACHE_ENTRIES, ttl=DeepSeekConfig.AUTOCOMPLETE_CACHE_TTL
+)
+
+
+class Ticket:
+    """一次可被取消的补全请求"""
+
+    def __init__(self, request_id: Optional[int]):
+        self.request_id = request_id
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class CancelRegistry:
+    """按（用户, channel）记录最新的补全请求"""
+
+    def __init__(self):
+        self._latest: Dict[Tuple[int, str], Ticket] = {}
+        self._lock = threading.Lock()
+        self._stats = {'cancelled': 0, 'stale': 0}
+
+    @contextmanager
+    def register(self, user_id: int, channel: str, request_id: Optional[int]) -> Iterator[Ticket]:
+        ticket = Ticket(request_id)
+        if request_id is None:
+            yield ticket
+            return
+
+        key = (user_id, channel)
+        with self._lock:
+            current = self._latest.get(key)
+            if current is not None and current.request_id >= request_id:
+                # 比正在进行的请求更旧，直接作废
+                self._stats['stale'] += 1
+                ticket.cancel()
+            else:
+                if current is not None:
+                    self._stats['cancelled'] += 1
+                    current.cancel()
+                self._latest[key] = ticket
+        try:
+            yield ticket
+        finally:
+            with self._lock:
+                if self._latest.get(key) is ticket:
+                    del self._latest[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._latest))
+
+
+cancel_registry = CancelRegistry()
+
+
+def prepare(context: str, prompt: str, mode: str) -> Tuple[str, int, str]:
+    """按模式截断上下文，返回 (完整提示词, max_tokens, 缓存key)"""
+    context_tokens, max_tokens = MODE_SETTINGS[mode]
+    window = trim_to_tokens(context, context_tokens)
+    full_prompt = prompts.auto_complete_prompt(window, prompt)
+    key = hashlib.sha256(json.dumps(
+        [deepseek_service.model, mode, max_tokens, window, prompt], ensure_ascii=False
+    ).encode('utf-8')).hexdigest()
+    return full_prompt, max_tokens, key
+
+
+def stream(ticket: Ticket, full_prompt: str, max_tokens: int) -> Iterator[str]:
+    """流式生成补全，请求被取消后关闭上游连接并停止"""
+    if ticket.cancelled:
+        return
+    deltas = deepseek_service.stream_content(full_prompt, max_tokens=max_tokens, operation="auto_complete")
+    try:
+        for delta in deltas:
+            if ticket.cancelled:
+                return
+            yield delta
+    finally:
+        deltas.close()
+
+
+def stats() -> Dict:
+    return {'cache': completion_cache.stats(), 'cancellation': cancel_registry.stats()}
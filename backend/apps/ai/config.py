@@ -3,7 +3,110 @@ from django.conf import settings
 class DeepSeekConfig:
     """DeepSeek配置"""
     API_KEY = settings.DEEPSEEK_API_KEY
-    BASE_URL = "https://api.deepseek.com/v1"
+    BASE_URL = settings.DEEPSEEK_BASE_URL
     CHAT_MODEL = "deepseek-chat"
     DEFAULT_MAX_TOKENS = 2000
-    TIMEOUT = 30
\ No newline at end of file
+    TIMEOUT = 30
+
+    # HTTP连接池（进程内所有工作线程共享）
+    POOL_CONNECTIONS = settings.DEEPSEEK_POOL_CONNECTIONS
+    POOL_MAXSIZE = settings.DEEPSEEK_POOL_MAXSIZE
+    # 分阶段超时（秒）：建立连接 / 两次读取之间 / 整个请求
+    CONNECT_TIMEOUT = settings.DEEPSEEK_CONNECT_TIMEOUT
+    READ_TIMEOUT = settings.DEEPSEEK_READ_TIMEOUT
+    TOTAL_TIMEOUT = settings.DEEPSEEK_TOTAL_TIMEOUT
+
+    # 多上游路由：错误率EWMA超过阈值的上游降级到备用上游之后
+    PROVIDERS = settings.AI_PROVIDERS
+    PROVIDER_ERROR_THRESHOLD = 0.5
+    # 对冲请求：等待时间为主上游该操作延迟的 PERCENTILE 分位数（不小于 MIN_DELAY 秒）
+    HEDGE_ENABLED = settings.AI_HEDGE_ENABLED
+    HEDGE_PERCENTILE = settings.AI_HEDGE_PERCENTILE
+    HEDGE_MIN_DELAY = settings.AI_HEDGE_MIN_DELAY
+    HEDGE_BUDGET_RATIO = settings.AI_HEDGE_BUDGET_RATIO
+    HEDGE_BUDGET_MIN_PER_SECOND = 0.1
+    HEDGE_WORKERS = 32
+
+    # 熔断器：连续失败N次后打开，打开后等待恢复时间再放行少量探测请求
+    BREAKER_FAILURE_THRESHOLD = settings.DEEPSEEK_BREAKER_FAILURE_THRESHOLD
+    BREAKER_RECOVERY_TIMEOUT = settings.DEEPSEEK_BREAKER_RECOVERY_TIMEOUT
+    BREAKER_HALF_OPEN_MAX_CALLS = settings.DEEPSEEK_BREAKER_HALF_OPEN_MAX_CALLS
+    # 重试预算：重试次数约不超过请求数的 RATIO 倍，另有每秒 MIN_PER_SECOND 次的保底
+    RETRY_BUDGET_RATIO = settings.DEEPSEEK_RETRY_BUDGET_RATIO
+    RETRY_BUDGET_MIN_PER_SECOND = settings.DEEPSEEK_RETRY_BUDGET_MIN_PER_SECOND
+    RETRY_BUDGET_MAX_BALANCE = 10
+    # 重试退避（秒）：第n次重试在 [0, min(MAX, BASE * 2^(n-1))] 内随机等待
+    RETRY_BACKOFF_BASE = 1
+    RETRY_BACKOFF_MAX = 8
+
+    # 调度：同时进行的上游调用上限；editing/batch 不能占用为 interactive 保留的名额
+    SCHEDULER_MAX_IN_FLIGHT = settings.AI_SCHEDULER_MAX_IN_FLIGHT
+    SCHEDULER_INTERACTIVE_RESERVED = settings.AI_SCHEDULER_INTERACTIVE_RESERVED
+    # 各优先级最长排队时间（秒），超过后丢弃请求
+    SCHEDULER_MAX_WAIT = {'interactive': 5, 'editing': 60, 'batch': 300}
+
+    # 限流：每个用户在各接口范围的请求频率（视图中的 throttle_scopes 指定范围），以及全局和token限额
+    THROTTLE_ENABLED = settings.AI_THROTTLE_ENABLED
+    THROTTLE_RATES = {
+        'ai_chat': '30/min',
+        'ai_autocomplete': '120/min',
+        'ai_generate': '20/min',
+        'ai_improve': '10/min',
+        'ai_batch': '5/min',
+        'ai_jobs': '20/min',
+    }
+    THROTTLE_GLOBAL_REQUEST_RATE = settings.AI_THROTTLE_GLOBAL_REQUEST_RATE
+    THROTTLE_USER_TOKEN_RATE = settings.AI_THROTTLE_USER_TOKEN_RATE
+    THROTTLE_GLOBAL_TOKEN_RATE = settings.AI_THROTTLE_GLOBAL_TOKEN_RATE
+
+    # 结果缓存：进程内LRU容量/有效期（秒），数据库缓存有效期（秒）
+    CACHE_MAX_ENTRIES = settings.AI_RESULT_CACHE_MAX_ENTRIES
+    CACHE_TTL = settings.AI_RESULT_CACHE_TTL
+    CACHE_STORE_TTL = settings.AI_RESULT_CACHE_STORE_TTL
+    CACHE_PURGE_EVERY = 500  # 每写入N次清理一次过期数据
+
+    # 文章润色：parallel（并发子调用）或 structured（单次JSON调用）
+    IMPROVE_MODE = settings.AI_IMPROVE_MODE
+    IMPROVE_DEADLINE = settings.AI_IMPROVE_DEADLINE  # 整个润色请求的截止时间（秒）
+    FANOUT_WORKERS = settings.AI_FANOUT_WORKERS
+
+    # 长文章分块摘要（map-reduce）
+    CHUNK_MAX_CHARS = settings.AI_CHUNK_MAX_CHARS
+    CHUNK_CONCURRENCY = settings.AI_CHUNK_CONCURRENCY
+    CHUNK_REDUCE_MAX_DEPTH = 3  # 分块摘要合并后仍然过长时，最多再分块摘要的轮数
+    SUGGESTIONS_MAX_CHARS = 2000  # 写作建议参考的正文长度
+
+    # 对话上下文：摘要+近期消息的token预算；压缩时保留最近N条消息原文
+    CONTEXT_MAX_TOKENS = settings.AI_CONTEXT_MAX_TOKENS
+    CONTEXT_KEEP_MESSAGES = settings.AI_CONTEXT_KEEP_MESSAGES
+    CONTEXT_FETCH_MESSAGES = 50  # 每轮最多读取的近期消息数
+    CONTEXT_COMPACT_BATCH = 100  # 每次压缩最多合并的消息数
+    CONTEXT_MESSAGE_MAX_CHARS = 2000  # 压缩时单条消息保留的最大字符数
+    CHAT_PENDING_TIMEOUT = 600  # 超过该时间（秒）仍在生成中的AI回复视为中断
+
+    # 知识库检索（BM25）：每轮对话附带 top-k 个相关分块，总量不超过token预算
+    RETRIEVAL_TOP_K = settings.AI_RETRIEVAL_TOP_K
+    RETRIEVAL_MAX_TOKENS = settings.AI_RETRIEVAL_MAX_TOKENS
+    RETRIEVAL_CHUNK_CHARS = 600  # 索引分块的最大字符数
+    RETRIEVAL_MIN_SCORE = 2.0  # 低于该BM25得分的分块视为不相关
+    RETRIEVAL_CACHE_USERS = 16  # 内存中最多缓存多少个用户的索引
+    RETRIEVAL_BUILD_WORKERS = 2  # 后台建索引的线程数
+
+    # 自动补全：inline 模式用于编辑器行内建议，full 模式为较长的续写
+    AUTOCOMPLETE_CONTEXT_TOKENS = settings.AI_AUTOCOMPLETE_CONTEXT_TOKENS
+    AUTOCOMPLETE_MAX_TOKENS = settings.AI_AUTOCOMPLETE_MAX_TOKENS
+    AUTOCOMPLETE_FULL_CONTEXT_TOKENS = 2000
+    AUTOCOMPLETE_CACHE_ENTRIES = 2000
+    AUTOCOMPLETE_CACHE_TTL = 600  # 秒
+
+    # 批量处理文章：每个请求最多同时处理 BATCH_CONCURRENCY 篇，所有请求共用 BATCH_WORKERS 个线程
+    BATCH_MAX_ARTICLES = settings.AI_BATCH_MAX_ARTICLES
+    BATCH_CONCURRENCY = settings.AI_BATCH_CONCURRENCY
+    BATCH_WORKERS = settings.AI_BATCH_WORKERS
+
+    # 后台任务队列
+    JOB_WORKER_CONCURRENCY = settings.AI_JOB_WORKER_CONCURRENCY
+    JOB_LEASE_SECONDS = settings.AI_JOB_LEASE_SECONDS  # 租约（可见性超时），到期未续约的任务会被重新领取
+    JOB_POLL_INTERVAL = settings.AI_JOB_POLL_INTERVAL
+    JOB_MAX_ATTEMPTS = settings.AI_JOB_MAX_ATTEMPTS
+    JOB_RETRY_BACKOFF = 30  # 失败重试的基础等待时间（秒），按次数指数增长
@@ -0,0 +1,147 @@
+"""AI对话上下文
+
+每轮对话发送给模型的内容 = 较早对话的摘要 + 在token预算内的近期消息。
+摘要保存在会话上（context_summary / summary_upto_id），近期消息超出预算时
+在后台把较早的消息合并进摘要，每次只处理新增的消息，不重新生成整段历史的摘要。
+这样无论会话有多少条消息，每轮读取的消息数和发送的token数都有上限。
+"""
+import contextvars
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+from django.db import close_old_connections
+from django.db.models import Q
+
+from .config import DeepSeekConfig
+from .models import AIAssistantSession, AIMessage
+from .tokens import estimate_tokens
+from . import prompts
+
+logger = logging.getLogger(__name__)
+
+# 本进程内正在压缩的会话，避免同一会话重复提交
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+
+def _context_messages(session_id: int, after_id: int):
+    """可作为上下文的消息：用户消息和已完成的AI回复"""
+    return AIMessage.objects.filter(session_id=session_id, id__gt=after_id).filter(
+        Q(is_user=True) | Q(status='completed')
+    )
+
+
+def build_messages(session: AIAssistantSession, max_tokens: int = None,
+                   before_id: int = None) -> Tuple[List[Dict], bool]:
+    """组装本轮发送给模型的消息列表
+
+    只使用ID小于 before_id 的消息（本轮待生成的AI消息之前的对话）；其中最新一条
+    （本轮的用户消息）总会包含在内，更早的消息从新到旧加入直到超出预算。
+    返回 (messages, needs_compaction)：未摘要的消息放不进预算时 needs_compaction 为 True。
+    """
+    max_tokens = max_tokens or DeepSeekConfig.CONTEXT_MAX_TOKENS
+
+    messages = []
+    budget = max_tokens
+    if session.context_summary:
+        summary = prompts.chat_context_system_prompt(session.context_summary)
+        messages.append({"role": "system", "content": summary})
+        budget -= estimate_tokens(summary)
+
+    queryset = _context_messages(session.id, session.summary_upto_id)
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    recent = list(
+        queryset.order_by('-id')
+        .values_list('content', 'is_user')[:DeepSeekConfig.CONTEXT_FETCH_MESSAGES]
+    )
+
+    turns = []
+    for content, is_user in recent:
+        if not content:
+            continue
+        cost = estimate_tokens(content)
+        if turns and cost > budget:
+            break
+        budget -= cost
+        turns.append({"role": "user" if is_user else "assistant", "content": content})
+    turns.reverse()
+
+    # 有消息因预算被丢弃，或未摘要的消息已经超过单轮读取上限
+    overflow = len(turns) < len(recent) or len(recent) >= DeepSeekConfig.CONTEXT_FETCH_MESSAGES
+    needs_compaction = overflow and len(recent) > DeepSeekConfig.CONTEXT_KEEP_MESSAGES
+    return messages + turns, needs_compaction
+
+
+def compact_session(session_id: int):
+    """把较早的未摘要消息合并进会话摘要，保留最近 CONTEXT_KEEP_MESSAGES 条原文"""
+    from .services import deepseek_service
+
+    session = AIAssistantSession.objects.filter(pk=session_id).only(
+        'id', 'context_summary', 'summary_upto_id'
+    ).first()
+    if session is None:
+        return
+
+    keep = DeepSeekConfig.CONTEXT_KEEP_MESSAGES
+    unsummarized = AIMessage.objects.filter(session_id=session_id, id__gt=session.summary_upto_id)
+    # 最近 keep 条消息保留原文，只压缩它们之前的消息
+    boundary = unsummarized.order_by('-id').values_list('id', flat=True)[keep:keep + 1].first()
+    if boundary is None:
+        return
+
+    batch = list(
+        _context_messages(session_id, session.summary_upto_id).filter(id__lte=boundary)
+        .order_by('id')
+        .values_list('id', 'content', 'is_user')[:DeepSeekConfig.CONTEXT_COMPACT_BATCH]
+    )
+    if not batch:
+        # 边界之前只有失败的回复，直接跳过
+        AIAssistantSession.objects.filter(
+            pk=session_id, summary_upto_id=session.summary_upto_id
+        ).update(summary_upto_id=boundary)
+        return
+
+    limit = DeepSeekConfig.CONTEXT_MESSAGE_MAX_CHARS
+    transcript = "\n".join(
+        f"{'用户' if is_user else '助手'}：{content[:limit]}"
+        for _, content, is_user in batch if content
+    )
+
+    summary = deepseek_service.generate_content(
+        prompts.conversation_summary_prompt(session.context_summary, transcript),
+        max_tokens=800,
+        operation="chat_summary"
+    )
+
+    # 以旧的 summary_upto_id 为条件更新，其他进程已经推进过摘要时放弃本次结果
+    updated = AIAssistantSession.objects.filter(
+        pk=session_id, summary_upto_id=session.summary_upto_id
+    ).update(context_summary=summary.strip(), summary_upto_id=batch[-1][0])
+    if updated:
+        logger.info(f"会话 #{session_id} 已压缩 {len(batch)} 条消息")
+
+
+def _run_compaction(session_id: int):
+    close_old_connections()
+    try:
+        compact_session(session_id)
+    except Exception as e:
+        logger.warning(f"压缩会话 #{session_id} 失败: {e}")
+    finally:
+        with _compacting_lock:
+            _compacting.discard(session_id)
+        close_old_connections()
+
+
+def schedule_compaction(session_id: int):
+    """在后台线程中压缩会话，不阻塞当前请求"""
+    from .services import _fanout_executor
+
+    with _compacting_lock:
+        if session_id in _compacting:
+            return
+        _compacting.add(session_id)
+    # 携带当前上下文，摘要调用的用量记到同一用户名下
+    _fanout_executor.submit(contextvars.copy_context().run, _run_compaction, session_id)
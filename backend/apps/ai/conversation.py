@@ -0,0 +1,106 @@
+"""两阶段对话
+
+1. 在一个很短的事务中保存用户消息和一条 pending 状态的AI消息；
+2. 在事务之外调用模型（可能持续数十秒），期间不占用数据库连接上的事务和行锁；
+3. 调用结束后把AI消息更新为 completed 或 failed。
+
+进程崩溃等原因留下的 pending 消息超过 CHAT_PENDING_TIMEOUT 后视为中断，
+会被标记为 failed，可以通过重试接口重新生成。
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .config import DeepSeekConfig
+from .models import AIAssistantSession, AIMessage
+from .context import build_messages
+from .tokens import estimate_tokens
+from . import prompts, retrieval
+
+logger = logging.getLogger(__name__)
+
+
+def start_turn(session: AIAssistantSession, content: str) -> Tuple[AIMessage, AIMessage]:
+    """保存用户消息和待生成的AI消息"""
+    with transaction.atomic():
+        user_message = AIMessage.objects.create(session=session, content=content, is_user=True)
+        ai_message = AIMessage.objects.create(session=session, content='', is_user=False, status='pending')
+    return user_message, ai_message
+
+
+def turn_context(session: AIAssistantSession, ai_message: AIMessage) -> Tuple[List[Dict], bool]:
+    """本轮发送给模型的上下文：该AI消息之前的对话，加上从用户知识库检索到的相关片段"""
+    messages, needs_compaction = build_messages(session, before_id=ai_message.id)
+    if not messages or messages[-1]['role'] != 'user':
+        return messages, needs_compaction
+
+    try:
+        passages = retrieval.retrieve(session.user_id, messages[-1]['content'])
+    except Exception as e:
+        logger.warning(f"知识库检索失败: {e}")
+        passages = []
+    if passages:
+        # 放在对话摘要之后、对话消息之前
+        position = sum(1 for message in messages if message['role'] == 'system')
+        messages.insert(position, {
+            "role": "system",
+            "content": prompts.knowledge_context_system_prompt(passages),
+        })
+    return messages, needs_compaction
+
+
+def complete_turn(ai_message: AIMessage, content: str, tokens_used: Optional[int] = None) -> bool:
+    """保存生成结果；消息已不是 pending（例如已被判定为中断）时不覆盖，返回 False"""
+    ai_message.content = content
+    ai_message.status = 'completed'
+    ai_message.error = ''
+    ai_message.tokens_used = estimate_tokens(content) if tokens_used is None else tokens_used
+    return _finish(ai_message)
+
+
+def fail_turn(ai_message: AIMessage, error: str, content: str = '') -> bool:
+    """标记生成失败，保留已经生成的部分内容"""
+    ai_message.content = content
+    ai_message.status = 'failed'
+    ai_message.error = error
+    ai_message.tokens_used = estimate_tokens(content)
+    return _finish(ai_message)
+
+
+def _finish(ai_message: AIMessage) -> bool:
+    ai_message.updated_at = timezone.now()
+    updated = AIMessage.objects.filter(pk=ai_message.pk, status='pending').update(
+        content=ai_message.content,
+        status=ai_message.status,
+        error=ai_message.error,
+        tokens_used=ai_message.tokens_used,
+        updated_at=ai_message.updated_at,
+    )
+    # 更新会话时间（只更新这一列，避免覆盖后台写入的会话摘要）
+    AIAssistantSession.objects.filter(pk=ai_message.session_id).update(updated_at=ai_message.updated_at)
+    return bool(updated)
+
+
+def recover_stale(session_id: int = None) -> int:
+    """把超时仍为 pending 的AI消息标记为失败"""
+    queryset = AIMessage.objects.filter(
+        status='pending',
+        updated_at__lt=timezone.now() - timedelta(seconds=DeepSeekConfig.CHAT_PENDING_TIMEOUT)
+    )
+    if session_id is not None:
+        queryset = queryset.filter(session_id=session_id)
+    return queryset.update(status='failed', error='回复生成中断，请重试', updated_at=timezone.now())
+
+
+def restart_turn(session: AIAssistantSession, message_id: int) -> Optional[AIMessage]:
+    """把失败的AI消息重新置为 pending，返回该消息；消息不存在或不能重试时返回 None"""
+    recover_stale(session.id)
+    updated = AIMessage.objects.filter(
+        pk=message_id, session=session, is_user=False, status='failed'
+    ).update(status='pending', content='', error='', tokens_used=0, updated_at=timezone.now())
+    if not updated:
+        return None
+    return AIMessage.objects.get(pk=message_id)
@@ -0,0 +1,165 @@
+import logging
+from datetime import timedelta
+from typing import Callable, Dict, List
+
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .config import DeepSeekConfig
+from .models import AIJob
+from .scheduler import priority_scope
+from .services import deepseek_service
+from . import usage
+
+logger = logging.getLogger(__name__)
+
+
+# 执行函数都使用 strict 模式：上游失败时抛出异常，由 run_job 退避重试或标记失败，
+# 而不是把截断原文、默认标签等兜底结果当作成功保存
+def _run_summary(params: Dict) -> Dict:
+    return {'summary': deepseek_service.generate_summary(params['content'], params.get('max_length', 200),
+                                                         strict=True)}
+
+
+def _run_tags(params: Dict) -> Dict:
+    return {'tags': deepseek_service.generate_tags(params['content'], params.get('count', 5), strict=True)}
+
+
+def _run_outline(params: Dict) -> Dict:
+    return deepseek_service.generate_article_outline(params['topic'], params.get('style', '专业'), strict=True)
+
+
+def _run_improve(params: Dict) -> Dict:
+    return deepseek_service.improve_writing(
+        params['content'], params.get('improve_type', 'style'), params.get('mode'), strict=True
+    )
+
+
+# 任务类型 -> 执行函数，返回值作为任务结果保存
+JOB_HANDLERS: Dict[str, Callable[[Dict], Dict]] = {
+    'summary': _run_summary,
+    'tags': _run_tags,
+    'outline': _run_outline,
+    'improve': _run_improve,
+}
+
+
+def submit_job(user, job_type: str, params: Dict) -> AIJob:
+    """提交后台任务"""
+    return AIJob.objects.create(
+        user=user,
+        job_type=job_type,
+        params=params,
+        max_attempts=DeepSeekConfig.JOB_MAX_ATTEMPTS,
+        available_at=timezone.now(),
+    )
+
+
+def _claimable(now) -> Q:
+    """可领取的任务：到期的等待任务，或租约已过期（工作进程崩溃/卡死）的执行中任务"""
+    return (
+        Q(status='pending', available_at__lte=now) |
+        Q(status='running', lease_expires_at__lt=now)
+    )
+
+
+def claim_jobs(worker_id: str, limit: int, lease_seconds: int = None) -> List[AIJob]:
+    """领取最多 limit 个任务并加上租约
+
+    每个任务用一条带条件的 UPDATE 抢占，只有更新成功的工作进程拿到任务，
+    不依赖 SELECT ... FOR UPDATE SKIP LOCKED，MySQL 5.7 也能使用。
+    """
+    if limit <= 0:
+        return []
+
+    lease_seconds = lease_seconds or DeepSeekConfig.JOB_LEASE_SECONDS
+    now = timezone.now()
+    candidates = list(
+        AIJob.objects.filter(_claimable(now))
+        .order_by('available_at')
+        .values_list('id', flat=True)[:limit * 2]
+    )
+
+    claimed = []
+    for job_id in candidates:
+        updated = AIJob.objects.filter(_claimable(now), id=job_id).update(
+            status='running',
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+
+    return list(AIJob.objects.filter(id__in=claimed).order_by('available_at'))
+
+
+def extend_leases(worker_id: str, job_ids: List[int], lease_seconds: int = None) -> int:
+    """为仍在执行的任务续约"""
+    if not job_ids:
+        return 0
+    lease_seconds = lease_seconds or DeepSeekConfig.JOB_LEASE_SECONDS
+    now = timezone.now()
+    return AIJob.objects.filter(id__in=job_ids, status='running', lease_owner=worker_id).update(
+        lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now
+    )
+
+
+def run_job(job: AIJob, worker_id: str) -> str:
+    """执行一个已领取的任务并保存结果，返回任务最终状态
+
+    在工作线程中调用，结束时关闭本线程的数据库连接。
+    """
+    close_old_connections()
+    try:
+        # 只有仍持有租约时才写回结果，避免覆盖已被其他工作进程重新领取的任务
+        # （QuerySet.update 不会自动更新 auto_now 字段，这里显式写入 updated_at）
+        def owned_update(**fields):
+            return AIJob.objects.filter(id=job.id, status='running', lease_owner=worker_id).update(
+                updated_at=timezone.now(), **fields
+            )
+        now = timezone.now()
+
+        if job.attempts > job.max_attempts:
+            owned_update(status='failed', error='超过最大执行次数', finished_at=now, lease_expires_at=None)
+            return 'failed'
+
+        handler = JOB_HANDLERS.get(job.job_type)
+        if handler is None:
+            owned_update(status='failed', error=f'未知任务类型: {job.job_type}', finished_at=now, lease_expires_at=None)
+            return 'failed'
+
+        try:
+            with usage.usage_scope(job.user_id), priority_scope('batch'):
+                result = handler(job.params)
+        except Exception as e:
+            logger.error(f"AI任务 #{job.id} 执行失败 (第{job.attempts}次): {e}")
+            now = timezone.now()
+            if job.attempts < job.max_attempts:
+                backoff = DeepSeekConfig.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+                owned_update(
+                    status='pending',
+                    error=str(e),
+                    available_at=now + timedelta(seconds=backoff),
+                    lease_owner='',
+                    lease_expires_at=None,
+                )
+                return 'pending'
+            owned_update(status='failed', error=str(e), finished_at=now, lease_expires_at=None)
+            return 'failed'
+
+        owned_update(
+            status='succeeded',
+            result=result,
+            error='',
+            finished_at=timezone.now(),
+            lease_expires_at=None,
+        )
+        logger.info(f"AI任务 #{job.id} 执行完成")
+        return 'succeeded'
+    finally:
+        close_old_connections()
@@ -0,0 +1,185 @@
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+SAMPLE_CONTENT = (
+    "<h2>背景</h2><p>知识库系统需要在编辑器中提供AI辅助写作功能，包括大纲生成、润色、摘要和标签。</p>"
+    "<h2>方案</h2><p>后端通过连接池调用上游模型，结果按内容哈希缓存，长文章分块后并发摘要。</p>"
+    "<h2>结论</h2><p>在保证延迟的前提下，上游调用次数和token用量都明显下降。</p>"
+)
+
+# 接口名 -> (路径, 是否流式, 请求体生成函数)；{session} 在运行前替换为压测会话ID
+ENDPOINTS = {
+    'chat': ('sessions/{session}/chat/', False, lambda tag: {'message': f'介绍一下知识库系统 {tag}'}),
+    'chat_stream': ('sessions/{session}/chat_stream/', True,
+                    lambda tag: {'message': f'介绍一下知识库系统 {tag}'}),
+    'auto_complete': ('articles/auto_complete/', False,
+                      lambda tag: {'prompt': f'继续写 {tag}', 'context': SAMPLE_CONTENT}),
+    'auto_complete_stream': ('articles/auto_complete_stream/', True,
+                             lambda tag: {'prompt': f'继续写 {tag}', 'context': SAMPLE_CONTENT}),
+    'outline': ('generate_outline/', False, lambda tag: {'topic': f'知识库系统设计 {tag}'}),
+    'improve': ('improve_article/', False,
+                lambda tag: {'content': f'{SAMPLE_CONTENT}<p>{tag}</p>', 'improve_type': 'style'}),
+    'summary': ('generate_summary/', False, lambda tag: {'content': f'{SAMPLE_CONTENT}<p>{tag}</p>'}),
+    'tags': ('generate_tags/', False, lambda tag: {'content': f'{SAMPLE_CONTENT}<p>{tag}</p>'}),
+}
+# 有异步版本的接口
+ASYNC_ENDPOINTS = {'chat', 'auto_complete', 'outline', 'improve', 'summary', 'tags'}
+
+
+def percentile(sorted_values, p):
+    """最近秩法求百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = ('压测 /api/ai/* 接口：按目标并发持续发送请求，输出吞吐量和 p50/p95/p99 延迟。'
+            '配合 mock_deepseek 模拟服务使用可排除上游波动')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/ai/',
+                            help='AI接口的根地址')
+        parser.add_argument('--username', required=True,
+                            help='以该用户身份请求（直接签发JWT，无需密码）')
+        parser.add_argument('--endpoint', default='chat', choices=sorted(ENDPOINTS),
+                            help='压测的接口')
+        parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='使用 /api/ai/async/ 下的异步版本接口')
+        parser.add_argument('--concurrency', type=int, default=10, help='并发请求数')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='总请求数（指定 --duration 时忽略）')
+        parser.add_argument('--duration', type=float, default=0,
+                            help='持续压测的秒数，0 表示按 --requests 计数')
+        parser.add_argument('--timeout', type=float, default=120, help='单个请求的超时（秒）')
+        parser.add_argument('--unique', action='store_true',
+                            help='每个请求的内容都不同，绕过结果缓存')
+        parser.add_argument('--metrics', action='store_true',
+                            help='结束后输出 /api/ai/metrics/ 的运行指标（需要管理员用户）')
+
+    def handle(self, *args, **options):
+        endpoint = options['endpoint']
+        if options['use_async'] and endpoint not in ASYNC_ENDPOINTS:
+            raise CommandError(f"接口 {endpoint} 没有异步版本")
+
+        user = get_user_model().objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"用户 {options['username']} 不存在")
+
+        base_url = options['url'].rstrip('/') + '/'
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        timeout = options['timeout']
+        concurrency = max(1, options['concurrency'])
+
+        path, is_stream, make_body = ENDPOINTS[endpoint]
+        if '{session}' in path:
+            response = requests.post(f"{base_url}sessions/", json={'title': '压测会话'},
+                                     headers=headers, timeout=timeout)
+            if response.status_code != 201:
+                raise CommandError(f"创建压测会话失败: {response.status_code} {response.text[:200]}")
+            path = path.format(session=response.json()['id'])
+        if options['use_async']:
+            path = 'async/' + path
+        target = base_url + path
+
+        run_id = uuid.uuid4().hex[:8]
+        total = options['requests']
+        deadline = time.monotonic() + options['duration'] if options['duration'] > 0 else None
+
+        lock = threading.Lock()
+        issued = [0]
+        results = []  # (状态, 耗时, 首字节耗时)
+        local = threading.local()
+
+        def next_index():
+            with lock:
+                if deadline is not None:
+                    if time.monotonic() >= deadline:
+                        return None
+                elif issued[0] >= total:
+                    return None
+                issued[0] += 1
+                return issued[0]
+
+        def send(index):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                local.session.headers.update(headers)
+            tag = f'{run_id}-{index}' if options['unique'] else run_id
+            started = time.monotonic()
+            first_byte = None
+            try:
+                with local.session.post(target, json=make_body(tag), timeout=timeout,
+                                        stream=is_stream) as response:
+                    status = str(response.status_code)
+                    if is_stream:
+                        for line in response.iter_lines():
+                            if first_byte is None and line.startswith(b'event: token'):
+                                first_byte = time.monotonic() - started
+                            if line.startswith(b'event: error'):
+                                status = 'stream_error'
+                    else:
+                        first_byte = time.monotonic() - started
+                        response.content
+            except requests.Timeout:
+                status = 'timeout'
+            except requests.RequestException:
+                status = 'connection_error'
+            return status, time.monotonic() - started, first_byte
+
+        def worker():
+            while True:
+                index = next_index()
+                if index is None:
+                    return
+                result = send(index)
+                with lock:
+                    results.append(result)
+
+        self.stdout.write(f"压测 {target}，并发 {concurrency}，"
+                          + (f"持续 {options['duration']} 秒" if deadline else f"共 {total} 个请求"))
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-bench') as executor:
+            for _ in range(concurrency):
+                executor.submit(worker)
+        elapsed = time.monotonic() - started
+
+        self._report(results, elapsed, is_stream)
+
+        if options['metrics']:
+            response = requests.get(f"{base_url}metrics/", headers=headers, timeout=timeout)
+            self.stdout.write(f"运行指标: {response.text}")
+
+    def _report(self, results, elapsed, is_stream):
+        counts = {}
+        for status, _, _ in results:
+            counts[status] = counts.get(status, 0) + 1
+        ok = sorted(duration for status, duration, _ in results if status == '200')
+
+        self.stdout.write(f"总请求 {len(results)}，耗时 {elapsed:.2f} 秒，状态分布 {counts}")
+        self.stdout.write(f"吞吐量 {len(results) / elapsed:.2f} 请求/秒，"
+                          f"成功 {len(ok) / elapsed:.2f} 请求/秒")
+        if not ok:
+            self.stdout.write(self.style.WARNING("没有成功的请求"))
+            return
+        self.stdout.write(
+            "成功请求延迟(ms): "
+            + "  ".join(f"p{p}={percentile(ok, p) * 1000:.0f}" for p in (50, 95, 99))
+            + f"  max={ok[-1] * 1000:.0f}"
+        )
+        if is_stream:
+            ttfb = sorted(first for status, _, first in results if status == '200' and first is not None)
+            if ttfb:
+                self.stdout.write(
+                    "首个token延迟(ms): "
+                    + "  ".join(f"p{p}={percentile(ttfb, p) * 1000:.0f}" for p in (50, 95, 99))
+                )
@@ -0,0 +1,79 @@
+import os
+import signal
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apps.ai.config import DeepSeekConfig
+from apps.ai.jobs import claim_jobs, extend_leases, run_job
+
+
+class Command(BaseCommand):
+    help = '运行AI后台任务工作进程：从 ai_jobs 表领取任务并用固定大小的线程池执行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=DeepSeekConfig.JOB_WORKER_CONCURRENCY,
+                            help='同时执行的任务数')
+        parser.add_argument('--lease-seconds', type=int, default=DeepSeekConfig.JOB_LEASE_SECONDS,
+                            help='任务租约时长（秒），工作进程异常退出后任务在租约到期后会被重新领取')
+        parser.add_argument('--poll-interval', type=float, default=DeepSeekConfig.JOB_POLL_INTERVAL,
+                            help='没有空闲任务时的轮询间隔（秒）')
+        parser.add_argument('--worker-id', default='',
+                            help='工作进程标识，默认使用 主机名:进程号:随机串')
+        parser.add_argument('--once', action='store_true',
+                            help='处理完当前所有可执行的任务后退出')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        lease_seconds = options['lease_seconds']
+        poll_interval = options['poll_interval']
+        worker_id = options['worker_id'] or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.stdout.write(f"AI任务工作进程 {worker_id} 启动，并发数 {concurrency}")
+
+        running = {}  # job_id -> Future
+        last_heartbeat = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-job') as executor:
+            while True:
+                for job_id, future in list(running.items()):
+                    if future.done():
+                        del running[job_id]
+                        try:
+                            status = future.result()
+                        except Exception as e:
+                            status = f'error: {e}'
+                        self.stdout.write(f"任务 #{job_id}: {status}")
+
+                if self.stopping:
+                    if not running:
+                        break
+                    time.sleep(0.2)
+                    continue
+
+                free = concurrency - len(running)
+                jobs = claim_jobs(worker_id, free, lease_seconds) if free > 0 else []
+                for job in jobs:
+                    running[job.id] = executor.submit(run_job, job, worker_id)
+
+                # 在租约过期前为执行中的任务续约
+                if time.monotonic() - last_heartbeat >= lease_seconds / 3:
+                    extend_leases(worker_id, list(running.keys()), lease_seconds)
+                    last_heartbeat = time.monotonic()
+
+                if options['once'] and not jobs and not running:
+                    break
+                if not jobs:
+                    time.sleep(poll_interval if not running else min(poll_interval, 0.2))
+
+        self.stdout.write(f"AI任务工作进程 {worker_id} 已退出")
+
+    def _request_stop(self, signum, frame):
+        # 停止领取新任务，等待执行中的任务完成后退出
+        self.stopping = True
@@ -0,0 +1,69 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.ai.mock_server import MockBehavior, MockDeepSeekServer
+
+
+class Command(BaseCommand):
+    help = ('启动本地模拟DeepSeek服务（/chat/completions，支持流式）。'
+            '设置 DEEPSEEK_BASE_URL=http://127.0.0.1:<端口>/v1 后即可离线压测AI接口')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+        parser.add_argument('--port', type=int, default=8900, help='监听端口')
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help='首字节前的平均延迟（秒）')
+        parser.add_argument('--latency-dist', default='fixed',
+                            choices=['fixed', 'uniform', 'normal', 'lognormal'],
+                            help='延迟分布')
+        parser.add_argument('--jitter', type=float, default=0.2,
+                            help='延迟抖动（秒）：uniform 为 ±jitter，normal/lognormal 为标准差')
+        parser.add_argument('--token-delay', type=float, default=0.02,
+                            help='流式响应每个分段之间的间隔（秒）')
+        parser.add_argument('--tokens', type=int, default=60,
+                            help='每次回复的分段数')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的比例（0~1）')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的比例（0~1）')
+        parser.add_argument('--timeout-rate', type=float, default=0.0,
+                            help='挂起不响应的比例（0~1），用于触发客户端读超时')
+        parser.add_argument('--timeout-seconds', type=float, default=120.0,
+                            help='挂起的请求在多少秒后断开连接')
+        parser.add_argument('--burst-every', type=float, default=0.0,
+                            help='每隔多少秒出现一次503突发，0为关闭')
+        parser.add_argument('--burst-duration', type=float, default=0.0,
+                            help='每次503突发持续的秒数')
+        parser.add_argument('--verbose', action='store_true', help='输出每个请求的访问日志')
+
+    def handle(self, *args, **options):
+        behavior = MockBehavior(
+            latency=options['latency'],
+            latency_dist=options['latency_dist'],
+            jitter=options['jitter'],
+            token_delay=options['token_delay'],
+            reply_tokens=options['tokens'],
+            error_rate=options['error_rate'],
+            rate_limit_rate=options['rate_limit_rate'],
+            timeout_rate=options['timeout_rate'],
+            timeout_seconds=options['timeout_seconds'],
+            burst_every=options['burst_every'],
+            burst_duration=options['burst_duration'],
+        )
+        server = MockDeepSeekServer((options['host'], options['port']), behavior,
+                                    verbose=options['verbose'])
+
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+
+        host, port = server.server_address[:2]
+        self.stdout.write(f"模拟DeepSeek服务已启动: http://{host}:{port}/v1")
+        self.stdout.write(f"使用方式: DEEPSEEK_BASE_URL=http://{host}:{port}/v1 DEEPSEEK_API_KEY=mock")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"模拟服务已停止，请求统计: {server.stats.snapshot()}")
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True, verbose_name='缓存键')),
+                ('operation', models.CharField(max_length=50, verbose_name='操作类型')),
+                ('value', models.JSONField(verbose_name='缓存结果')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='过期时间')),
+            ],
+            options={
+                'verbose_name': 'AI结果缓存',
+                'verbose_name_plural': 'AI结果缓存',
+                'db_table': 'ai_result_cache',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ai', '0002_result_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_type', models.CharField(choices=[('summary', '生成摘要'), ('tags', '生成标签'), ('outline', '生成大纲'), ('improve', '文章润色')], max_length=20, verbose_name='任务类型')),
+                ('params', models.JSONField(default=dict, verbose_name='任务参数')),
+                ('status', models.CharField(choices=[('pending', '等待中'), ('running', '执行中'), ('succeeded', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='任务结果')),
+                ('error', models.TextField(blank=True, verbose_name='错误信息')),
+                ('attempts', models.IntegerField(default=0, verbose_name='已执行次数')),
+                ('max_attempts', models.IntegerField(default=3, verbose_name='最大执行次数')),
+                ('available_at', models.DateTimeField(verbose_name='可执行时间')),
+                ('lease_owner', models.CharField(blank=True, max_length=100, verbose_name='租约持有者')),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True, verbose_name='租约到期时间')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_jobs', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': 'AI任务',
+                'verbose_name_plural': 'AI任务',
+                'db_table': 'ai_jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='ai_jobs_status_avail_idx'), models.Index(fields=['status', 'lease_expires_at'], name='ai_jobs_status_lease_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ai', '0003_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('requests', models.IntegerField(default=0, verbose_name='调用次数')),
+                ('prompt_tokens', models.BigIntegerField(default=0, verbose_name='输入token数')),
+                ('completion_tokens', models.BigIntegerField(default=0, verbose_name='输出token数')),
+                ('total_tokens', models.BigIntegerField(default=0, verbose_name='总token数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_usage_daily', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': 'AI每日用量',
+                'verbose_name_plural': 'AI每日用量',
+                'db_table': 'ai_usage_daily',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AIUsageLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(max_length=50, verbose_name='操作类型')),
+                ('model', models.CharField(max_length=100, verbose_name='模型')),
+                ('prompt_tokens', models.IntegerField(default=0, verbose_name='输入token数')),
+                ('completion_tokens', models.IntegerField(default=0, verbose_name='输出token数')),
+                ('total_tokens', models.IntegerField(default=0, verbose_name='总token数')),
+                ('estimated', models.BooleanField(default=False, verbose_name='是否估算')),
+                ('latency_ms', models.IntegerField(default=0, verbose_name='耗时（毫秒）')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ai_usage_logs', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': 'AI用量明细',
+                'verbose_name_plural': 'AI用量明细',
+                'db_table': 'ai_usage_logs',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='ai_usage_user_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='aiusagedaily',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='ai_usage_daily_user_date_uniq'),
+        ),
+    ]
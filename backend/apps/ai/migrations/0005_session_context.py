@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0004_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiassistantsession',
+            name='context_summary',
+            field=models.TextField(blank=True, verbose_name='较早对话摘要'),
+        ),
+        migrations.AddField(
+            model_name='aiassistantsession',
+            name='summary_upto_id',
+            field=models.BigIntegerField(default=0, verbose_name='摘要已包含的最后消息ID'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0005_session_context'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aimessage',
+            name='error',
+            field=models.TextField(blank=True, verbose_name='错误信息'),
+        ),
+        migrations.AddField(
+            model_name='aimessage',
+            name='status',
+            field=models.CharField(choices=[('pending', '生成中'), ('completed', '已完成'), ('failed', '失败')], default='completed', max_length=20, verbose_name='状态'),
+        ),
+        migrations.AddField(
+            model_name='aimessage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新时间'),
+        ),
+        migrations.AlterField(
+            model_name='aimessage',
+            name='content',
+            field=models.TextField(blank=True, verbose_name='消息内容'),
+        ),
+    ]
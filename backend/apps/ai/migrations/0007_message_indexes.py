@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0006_message_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aiassistantsession',
+            index=models.Index(fields=['user', 'updated_at'], name='ai_session_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aimessage',
+            index=models.Index(fields=['session', 'created_at'], name='ai_msg_session_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0007_message_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='桶标识')),
+                ('tokens', models.FloatField(verbose_name='余量')),
+                ('updated_at', models.FloatField(verbose_name='更新时间（Unix时间戳）')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='版本号')),
+            ],
+            options={
+                'verbose_name': 'AI限流令牌桶',
+                'verbose_name_plural': 'AI限流令牌桶',
+                'db_table': 'ai_rate_buckets',
+            },
+        ),
+    ]
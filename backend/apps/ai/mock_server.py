@@ -0,0 +1,207 @@
+"""本地模拟DeepSeek服务
+
+实现 /chat/completions 接口（普通响应和SSE流式响应，均带 usage），用于在不调用真实API的情况下
+压测和回归测试重试、缓存、并发等逻辑。可以配置延迟分布、错误率、限流、周期性5xx突发和超时。
+启动方式见 management/commands/mock_deepseek.py。
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from .tokens import estimate_tokens
+
+
+@dataclass
+class MockBehavior:
+    """模拟服务的行为配置"""
+    latency: float = 0.5  # 首字节前的平均延迟（秒）
+    latency_dist: str = 'fixed'  # fixed / uniform / normal / lognormal
+    jitter: float = 0.2  # uniform 为 ±jitter 秒；normal/lognormal 为标准差（秒）
+    token_delay: float = 0.02  # 流式响应每个token之间的间隔（秒）
+    reply_tokens: int = 60  # 每次回复的token（分段）数
+    error_rate: float = 0.0  # 返回500的比例
+    rate_limit_rate: float = 0.0  # 返回429的比例
+    timeout_rate: float = 0.0  # 挂起不响应的比例
+    timeout_seconds: float = 120.0  # 挂起多久后断开连接
+    burst_every: float = 0.0  # 每隔N秒出现一次5xx突发，0为关闭
+    burst_duration: float = 0.0  # 每次突发持续的秒数
+    started_at: float = field(default_factory=time.monotonic)
+
+    def sample_latency(self) -> float:
+        if self.latency_dist == 'uniform':
+            value = random.uniform(self.latency - self.jitter, self.latency + self.jitter)
+        elif self.latency_dist == 'normal':
+            value = random.gauss(self.latency, self.jitter)
+        elif self.latency_dist == 'lognormal':
+            # 长尾分布：中位数约为 latency
+            sigma = self.jitter / self.latency if self.latency > 0 else 0
+            value = self.latency * random.lognormvariate(0, sigma)
+        else:
+            value = self.latency
+        return max(0.0, value)
+
+    def in_burst(self) -> bool:
+        if self.burst_every <= 0 or self.burst_duration <= 0:
+            return False
+        return (time.monotonic() - self.started_at) % self.burst_every < self.burst_duration
+
+
+class MockStats:
+    """请求计数，关闭服务时输出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def incr(self, key: str):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+def _reply_text(body: Dict, tokens: int) -> str:
+    """根据请求生成回复：要求JSON时返回大纲/结构化润色都能解析的JSON，否则返回占位文本"""
+    messages = body.get('messages') or [{}]
+    prompt = str(messages[-1].get('content', ''))
+    if body.get('response_format', {}).get('type') == 'json_object' or 'JSON' in prompt:
+        return json.dumps({
+            'title': '模拟大纲',
+            'sections': [
+                {'title': f'第{i}章', 'points': ['要点一', '要点二', '要点三']}
+                for i in range(1, 5)
+            ],
+            'improved_content': '模拟润色结果。' * 10,
+            'suggestions': ['建议一', '建议二', '建议三'],
+            'rating': 8,
+        }, ensure_ascii=False)
+    if 'max_tokens' in body and body['max_tokens'] <= 10:
+        return '8'
+    return ''.join(f'模拟回复{i}，' for i in range(tokens))
+
+
+class MockDeepSeekHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockDeepSeek/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        behavior: MockBehavior = self.server.behavior
+        stats: MockStats = self.server.stats
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            stats.incr('400')
+            return self._send_json(400, {'error': {'message': 'invalid json'}})
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            stats.incr('404')
+            return self._send_json(404, {'error': {'message': 'not found'}})
+
+        roll = random.random()
+        if behavior.in_burst():
+            stats.incr('burst_503')
+            return self._send_json(503, {'error': {'message': 'service unavailable (burst)'}})
+        if roll < behavior.timeout_rate:
+            stats.incr('timeout')
+            time.sleep(behavior.timeout_seconds)
+            self.close_connection = True
+            return
+        roll -= behavior.timeout_rate
+        if roll < behavior.rate_limit_rate:
+            stats.incr('429')
+            return self._send_json(429, {'error': {'message': 'rate limited'}})
+        roll -= behavior.rate_limit_rate
+        if roll < behavior.error_rate:
+            stats.incr('500')
+            return self._send_json(500, {'error': {'message': 'internal error'}})
+
+        time.sleep(behavior.sample_latency())
+
+        reply = _reply_text(body, behavior.reply_tokens)
+        prompt_text = ''.join(str(m.get('content', '')) for m in body.get('messages') or [])
+        usage = {
+            'prompt_tokens': estimate_tokens(prompt_text),
+            'completion_tokens': estimate_tokens(reply),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        if body.get('stream'):
+            stats.incr('200_stream')
+            return self._send_stream(body, reply, usage)
+
+        stats.incr('200')
+        self._send_json(200, {
+            'id': f'mock-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': reply},
+                'finish_reason': 'stop',
+            }],
+            'usage': usage,
+        })
+
+    def _send_json(self, status: int, data: Dict):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, body: Dict, reply: str, usage: Dict):
+        behavior: MockBehavior = self.server.behavior
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_event(data):
+            chunk = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.flush()
+
+        completion_id = f'mock-{uuid.uuid4().hex}'
+        pieces = [piece + '，' for piece in reply.split('，') if piece] or [reply]
+        try:
+            for piece in pieces:
+                write_event(json.dumps({
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}],
+                }, ensure_ascii=False))
+                time.sleep(behavior.token_delay)
+            if (body.get('stream_options') or {}).get('include_usage'):
+                write_event(json.dumps({'id': completion_id, 'choices': [], 'usage': usage}))
+            write_event('[DONE]')
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开
+            self.server.stats.incr('client_disconnect')
+
+
+class MockDeepSeekServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, address, behavior: MockBehavior, verbose: bool = False):
+        super().__init__(address, MockDeepSeekHandler)
+        self.behavior = behavior
+        self.stats = MockStats()
+        self.verbose = verbose
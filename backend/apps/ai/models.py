@@ -7,6 +7,8 @@ class AIAssistantSession(models.Model):
     """AI助手会话"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='用户')
     title = models.CharField(max_length=200, verbose_name='会话标题')
+    context_summary = models.TextField(blank=True, verbose_name='较早对话摘要')
+    summary_upto_id = models.BigIntegerField(default=0, verbose_name='摘要已包含的最后消息ID')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
     
@@ -14,21 +16,150 @@ class AIAssistantSession(models.Model):
         db_table = 'ai_sessions'
         verbose_name = 'AI会话'
         verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='ai_session_user_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
 class AIMessage(models.Model):
     """AI消息"""
+    STATUS_CHOICES = (
+        ('pending', '生成中'),
+        ('completed', '已完成'),
+        ('failed', '失败'),
+    )
+    
     session = models.ForeignKey(AIAssistantSession, on_delete=models.CASCADE, 
                                related_name='messages', verbose_name='会话')
-    content = models.TextField(verbose_name='消息内容')
+    content = models.TextField(blank=True, verbose_name='消息内容')
     is_user = models.BooleanField(default=True, verbose_name='是否用户消息')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed', verbose_name='状态')
+    error = models.TextField(blank=True, verbose_name='错误信息')
     tokens_used = models.IntegerField(default=0, verbose_name='使用token数')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
     
     class Meta:
         db_table = 'ai_messages'
         verbose_name = 'AI消息'
         verbose_name_plural = verbose_name
         ordering = ['created_at']
+        indexes = [
+            # 按会话分页读取消息、查询会话最后一条消息
+            models.Index(fields=['session', 'created_at'], name='ai_msg_session_created_idx'),
+        ]
+
+class AIResultCache(models.Model):
+    """AI生成结果缓存（摘要、标签、大纲）"""
+    cache_key = models.CharField(max_length=64, unique=True, verbose_name='缓存键')
+    operation = models.CharField(max_length=50, verbose_name='操作类型')
+    value = models.JSONField(verbose_name='缓存结果')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='过期时间')
+    
+    class Meta:
+        db_table = 'ai_result_cache'
+        verbose_name = 'AI结果缓存'
+        verbose_name_plural = verbose_name
+
+class AIJob(models.Model):
+    """AI后台任务"""
+    JOB_TYPE_CHOICES = (
+        ('summary', '生成摘要'),
+        ('tags', '生成标签'),
+        ('outline', '生成大纲'),
+        ('improve', '文章润色'),
+    )
+    STATUS_CHOICES = (
+        ('pending', '等待中'),
+        ('running', '执行中'),
+        ('succeeded', '已完成'),
+        ('failed', '失败'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_jobs', verbose_name='用户')
+    job_type = models.CharField(max_length=20, choices=JOB_TYPE_CHOICES, verbose_name='任务类型')
+    params = models.JSONField(default=dict, verbose_name='任务参数')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='状态')
+    result = models.JSONField(null=True, blank=True, verbose_name='任务结果')
+    error = models.TextField(blank=True, verbose_name='错误信息')
+    attempts = models.IntegerField(default=0, verbose_name='已执行次数')
+    max_attempts = models.IntegerField(default=3, verbose_name='最大执行次数')
+    available_at = models.DateTimeField(verbose_name='可执行时间')
+    lease_owner = models.CharField(max_length=100, blank=True, verbose_name='租约持有者')
+    lease_expires_at = models.DateTimeField(null=True, blank=True, verbose_name='租约到期时间')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
+    
+    class Meta:
+        db_table = 'ai_jobs'
+        verbose_name = 'AI任务'
+        verbose_name_plural = verbose_name
+        ordering = ['-created_at']
+        indexes = [
+            # 工作进程领取任务：按状态筛选、按可执行时间/租约到期时间排序
+            models.Index(fields=['status', 'available_at'], name='ai_jobs_status_avail_idx'),
+            models.Index(fields=['status', 'lease_expires_at'], name='ai_jobs_status_lease_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_job_type_display()} #{self.pk} ({self.status})"
+
+class AIUsageLog(models.Model):
+    """AI调用用量明细（只追加）"""
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='ai_usage_logs', verbose_name='用户')
+    operation = models.CharField(max_length=50, verbose_name='操作类型')
+    model = models.CharField(max_length=100, verbose_name='模型')
+    prompt_tokens = models.IntegerField(default=0, verbose_name='输入token数')
+    completion_tokens = models.IntegerField(default=0, verbose_name='输出token数')
+    total_tokens = models.IntegerField(default=0, verbose_name='总token数')
+    estimated = models.BooleanField(default=False, verbose_name='是否估算')
+    latency_ms = models.IntegerField(default=0, verbose_name='耗时（毫秒）')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')
+    
+    class Meta:
+        db_table = 'ai_usage_logs'
+        verbose_name = 'AI用量明细'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='ai_usage_user_created_idx'),
+        ]
+
+class AIUsageDaily(models.Model):
+    """AI用量按用户、按天汇总，随每次调用增量更新"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_usage_daily', verbose_name='用户')
+    date = models.DateField(verbose_name='日期')
+    requests = models.IntegerField(default=0, verbose_name='调用次数')
+    prompt_tokens = models.BigIntegerField(default=0, verbose_name='输入token数')
+    completion_tokens = models.BigIntegerField(default=0, verbose_name='输出token数')
+    total_tokens = models.BigIntegerField(default=0, verbose_name='总token数')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    
+    class Meta:
+        db_table = 'ai_usage_daily'
+        verbose_name = 'AI每日用量'
+        verbose_name_plural = verbose_name
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='ai_usage_daily_user_date_uniq'),
+        ]
+
+class AIRateBucket(models.Model):
+    """AI接口限流的令牌桶状态，所有工作进程共享
+
+    tokens 为 updated_at 时刻的余量，读取时按经过的时间补充；扣除时在一条条件 UPDATE 中
+    计算补充量并检查余量，version 记录更新次数。
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name='桶标识')
+    tokens = models.FloatField(verbose_name='余量')
+    updated_at = models.FloatField(verbose_name='更新时间（Unix时间戳）')
+    version = models.PositiveIntegerField(default=0, verbose_name='版本号')
+    
+    class Meta:
+        db_table = 'ai_rate_buckets'
+        verbose_name = 'AI限流令牌桶'
+        verbose_name_plural = verbose_name
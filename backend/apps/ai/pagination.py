@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class SessionCursorPagination(CursorPagination):
+    """会话列表：按最近更新时间倒序，游标分页"""
+    ordering = ('-updated_at', '-id')
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class MessageCursorPagination(CursorPagination):
+    """会话消息：按创建时间倒序（最新的在前），游标分页，配合 (session, created_at) 索引"""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
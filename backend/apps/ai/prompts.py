@@ -0,0 +1,196 @@
+# 提示词模板
+# 同步服务（services.py）和异步服务（async_services.py）共用同一套模板
+from typing import Dict, List
+
+# 提示词模板版本：修改对应模板时递增，使旧的缓存结果自动失效
+PROMPT_VERSIONS = {
+    "outline": 1,
+    "summary": 2,
+    "chunk_summary": 1,
+    "tags": 2,
+}
+
+
+def outline_prompt(topic: str, style: str) -> str:
+    """文章大纲"""
+    return f"""请为主题"{topic}"生成一个{style}风格的文章大纲。
+
+要求：
+1. 包含清晰的章节结构（3-5个主要章节）
+2. 每个章节要有3-5个具体的内容要点
+3. 适合技术文档的格式
+4. 包含引言和总结部分
+5. 返回严格的JSON格式
+
+JSON格式示例：
+{{
+    "title": "文章标题",
+    "sections": [
+        {{
+            "title": "章节标题",
+            "points": ["要点1", "要点2", "要点3"]
+        }}
+    ]
+}}
+
+请直接返回JSON，不要其他文字。"""
+
+
+def improve_prompt(content: str, improve_type: str) -> str:
+    """文章润色"""
+    improve_prompts = {
+        "grammar": f"""请修正以下内容的语法错误和拼写错误，保持原意不变：
+
+{content}
+
+要求：
+1. 只修正错误，不要改变内容结构
+2. 保持专业的技术文档风格
+3. 直接返回修正后的内容""",
+
+        "style": f"""请优化以下内容的写作风格，使其更加专业、流畅：
+
+{content}
+
+要求：
+1. 保持核心内容不变
+2. 优化句子结构和表达方式
+3. 提升技术文档的专业性和可读性
+4. 直接返回优化后的内容""",
+
+        "expand": f"""请扩展以下内容，增加技术细节和深度：
+
+{content}
+
+要求：
+1. 保持原文主旨和技术准确性
+2. 增加相关的技术细节和实际例子
+3. 扩展后的内容应该是原文的1.5-2倍长度
+4. 直接返回扩展后的内容"""
+    }
+    return improve_prompts.get(improve_type, improve_prompts["style"])
+
+
+def structured_improve_prompt(content: str, improve_type: str) -> str:
+    """文章润色 + 写作建议 + 质量评分（单次JSON输出）"""
+    tasks = {
+        "grammar": "修正内容中的语法错误和拼写错误，保持原意和内容结构不变",
+        "style": "优化内容的写作风格，保持核心内容不变，使其更加专业、流畅",
+        "expand": "扩展内容，增加相关的技术细节和实际例子，长度为原文的1.5-2倍",
+    }
+    task = tasks.get(improve_type, tasks["style"])
+
+    return f"""请{task}，同时针对技术文档的特点给出3条具体可行的写作改进建议，并从专业性、清晰度、逻辑性等方面为原文评分（满分10分）。
+
+原文：
+{content}
+
+请返回严格的JSON对象，格式如下：
+{{
+    "improved_content": "处理后的完整内容",
+    "suggestions": ["建议1", "建议2", "建议3"],
+    "rating": 8
+}}
+
+请直接返回JSON，不要其他文字。"""
+
+
+def suggestions_prompt(content: str) -> str:
+    """写作建议（content 由调用方截取）"""
+    return f"""请为以下技术内容提供3条具体的写作改进建议：
+
+{content}
+
+要求：
+1. 针对技术文档的特点提出建议
+2. 每条建议要具体可行
+3. 用中文返回，用分号分隔
+4. 不要编号，直接返回建议内容"""
+
+
+def rating_prompt(content: str) -> str:
+    """写作质量评分"""
+    return f"""请从技术文档的角度评估以下内容的写作质量（满分10分）：
+
+{content[:500]}
+
+要求：
+1. 从专业性、清晰度、逻辑性等方面评估
+2. 只返回分数数字
+3. 不要其他文字"""
+
+
+def summary_prompt(text: str, max_length: int) -> str:
+    """文章摘要"""
+    return f"""请为以下技术文章生成一个简洁的摘要，长度不超过{max_length}字：
+
+{text}
+
+要求：
+1. 抓住技术核心观点和关键信息
+2. 突出技术要点和实践价值
+3. 语言精炼，逻辑清晰
+4. 直接返回摘要内容"""
+
+
+def chunk_summary_prompt(text: str) -> str:
+    """长文章分块摘要（map阶段）"""
+    return f"""以下是一篇技术文章中的一个片段，请概括其中的技术要点：
+
+{text}
+
+要求：
+1. 保留关键概念、步骤、结论和重要的数据或命令
+2. 不超过300字
+3. 直接返回概括内容"""
+
+
+def tags_prompt(text: str, count: int) -> str:
+    """文章标签"""
+    return f"""根据以下技术内容，生成{count}个相关的技术标签：
+
+{text}
+
+要求：
+1. 标签要体现技术关键词
+2. 每个标签2-4个汉字
+3. 用中文逗号分隔返回
+4. 不要其他文字"""
+
+
+def auto_complete_prompt(context: str, prompt: str) -> str:
+    """文章自动补全"""
+    return f"上下文：{context}\n\n请继续写作：{prompt}"
+
+
+def chat_context_system_prompt(summary: str) -> str:
+    """对话上下文：较早对话的摘要"""
+    return f"以下是你与用户较早对话的摘要，请结合它理解后续对话：\n\n{summary}"
+
+
+def knowledge_context_system_prompt(passages: List[Dict]) -> str:
+    """对话上下文：从用户知识库中检索到的相关片段"""
+    sources = "\n\n".join(
+        f"[{i}]《{passage['title']}》\n{passage['content']}" for i, passage in enumerate(passages, 1)
+    )
+    return f"""以下是从用户知识库文章中检索到的与问题相关的片段。回答时优先依据这些内容，引用时注明来源文章标题；片段与问题无关时忽略它们。
+
+{sources}"""
+
+
+def conversation_summary_prompt(previous_summary: str, transcript: str) -> str:
+    """对话摘要（在已有摘要基础上增量合并新的对话）"""
+    previous = previous_summary or "（暂无）"
+    return f"""请将已有的对话摘要与新增的对话内容合并为一份新的摘要。
+
+已有摘要：
+{previous}
+
+新增对话：
+{transcript}
+
+要求：
+1. 保留用户的问题、目标、偏好以及已经得出的结论和关键信息
+2. 省略寒暄和重复内容
+3. 不超过500字
+4. 直接返回摘要内容"""
@@ -0,0 +1,205 @@
+import logging
+import math
+import random
+import threading
+import time
+from typing import Dict
+
+from .config import DeepSeekConfig
+
+logger = logging.getLogger(__name__)
+
+
+class DeepSeekError(Exception):
+    """DeepSeek调用失败"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CircuitOpenError(DeepSeekError):
+    """熔断器打开，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """熔断器（closed / open / half_open）
+
+    连续失败达到阈值后打开，打开期间所有请求直接失败；
+    经过恢复时间后进入半开状态，只放行少量探测请求，探测成功则关闭，失败则重新打开。
+    进程内所有线程和事件循环共享同一个实例。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = None,
+                 recovery_timeout: float = None, half_open_max_calls: int = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or DeepSeekConfig.BREAKER_FAILURE_THRESHOLD
+        self.recovery_timeout = recovery_timeout or DeepSeekConfig.BREAKER_RECOVERY_TIMEOUT
+        self.half_open_max_calls = half_open_max_calls or DeepSeekConfig.BREAKER_HALF_OPEN_MAX_CALLS
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_at = 0.0
+        self._stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def allow_request(self) -> bool:
+        """是否放行本次请求"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self._stats['rejected'] += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._half_open_calls = 0
+                self._half_open_at = time.monotonic()
+                logger.info(f"熔断器 {self.name} 进入半开状态")
+
+            if self._state == self.HALF_OPEN:
+                # 探测请求迟迟没有结果（例如客户端中途断开）时，允许发起新的探测
+                if time.monotonic() - self._half_open_at >= self.recovery_timeout:
+                    self._half_open_calls = 0
+                    self._half_open_at = time.monotonic()
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self._stats['rejected'] += 1
+                    return False
+                self._half_open_calls += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._stats['successes'] += 1
+            self._consecutive_failures = 0
+            if self._state != self.CLOSED:
+                logger.info(f"熔断器 {self.name} 已关闭")
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._stats['opened'] += 1
+                logger.warning(f"熔断器 {self.name} 已打开，{self.recovery_timeout} 秒内直接拒绝请求")
+
+    def release_probe(self):
+        """放行的请求没有得到结果（例如客户端在收到输出前断开），归还半开状态的探测名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> int:
+        """距离下次允许探测还有多少秒"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+            return max(0, math.ceil(self.recovery_timeout - (time.monotonic() - self._opened_at)))
+
+    def stats(self) -> Dict:
+        stats = {'state': self.state, 'retry_after': self.retry_after()}
+        with self._lock:
+            stats.update(self._stats)
+            stats['consecutive_failures'] = self._consecutive_failures
+        return stats
+
+
+class RetryBudget:
+    """全局重试预算
+
+    每次正常请求存入 ratio 个令牌，每次重试消耗一个令牌，另外每秒补充
+    min_per_second 个令牌作为低流量时的保底。这样重试次数最多约为请求数的 ratio 倍，
+    上游故障时不会因为每个请求都重试多次而把流量放大数倍。
+    """
+
+    def __init__(self, ratio: float = None, min_per_second: float = None, max_balance: float = None):
+        self.ratio = ratio if ratio is not None else DeepSeekConfig.RETRY_BUDGET_RATIO
+        self.min_per_second = min_per_second if min_per_second is not None else DeepSeekConfig.RETRY_BUDGET_MIN_PER_SECOND
+        self.max_balance = max_balance or DeepSeekConfig.RETRY_BUDGET_MAX_BALANCE
+
+        self._lock = threading.Lock()
+        self._balance = self.max_balance
+        self._updated_at = time.monotonic()
+        self._stats = {'requests': 0, 'retries': 0, 'retries_denied': 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self.max_balance, self._balance + (now - self._updated_at) * self.min_per_second)
+        self._updated_at = now
+
+    def record_request(self):
+        """记录一次首次请求"""
+        with self._lock:
+            self._refill()
+            self._balance = min(self.max_balance, self._balance + self.ratio)
+            self._stats['requests'] += 1
+
+    def try_acquire(self) -> bool:
+        """申请一次重试，预算不足时返回False"""
+        with self._lock:
+            self._refill()
+            if self._balance >= 1:
+                self._balance -= 1
+                self._stats['retries'] += 1
+                return True
+            self._stats['retries_denied'] += 1
+            return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refill()
+            stats = dict(self._stats)
+            stats['balance'] = round(self._balance, 2)
+            stats['ratio'] = self.ratio
+        return stats
+
+
+def backoff_delay(retry: int) -> float:
+    """第 retry 次重试前的等待时间：指数退避加完全随机抖动（full jitter），避免大量请求同时重试"""
+    cap = min(DeepSeekConfig.RETRY_BACKOFF_MAX, DeepSeekConfig.RETRY_BACKOFF_BASE * 2 ** (retry - 1))
+    return random.uniform(0, cap)
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """限流和服务器错误可以重试；其余4xx是请求本身的问题，重试也不会成功"""
+    return status_code == 429 or status_code >= 500
+
+
+def check_circuit():
+    """熔断打开时直接失败，不再调用上游"""
+    if not circuit_breaker.allow_request():
+        raise CircuitOpenError("DeepSeek服务暂时不可用，请稍后重试")
+
+
+def record_outcome(error: DeepSeekError = None):
+    """记录一次上游调用结果：只有可重试的错误（超时、网络错误、429、5xx）计为熔断失败"""
+    if error is not None and error.retryable:
+        circuit_breaker.record_failure()
+    else:
+        circuit_breaker.record_success()
+
+
+def acquire_retry(error: DeepSeekError) -> bool:
+    """上一次失败后是否允许重试：错误可重试，且全局重试预算充足"""
+    return error.retryable and retry_budget.try_acquire()
+
+
+# 进程内共享的熔断器和重试预算
+circuit_breaker = CircuitBreaker('deepseek')
+retry_budget = RetryBudget()
@@ -0,0 +1,239 @@
+"""知识库检索：基于BM25的文章分块倒排索引
+
+每个用户的文章切分为不超过 RETRIEVAL_CHUNK_CHARS 的分块（与长文章摘要共用分块规则），
+分词规则与相关文章一致（汉字bigram + 英文单词）。索引按用户保存在内存中：
+首次检索时在后台线程中建索引，建好之前的对话不带知识库上下文，不阻塞请求；
+文章保存/删除时通过信号增量更新本进程已加载的索引，其他进程在检索时按
+Article.updated_at 拉取变化的文章重建其分块，已删除的文章在返回结果前过滤掉。
+
+对话时用用户的问题检索 top-k 分块，在 RETRIEVAL_MAX_TOKENS 预算内作为上下文发送，
+发送的知识库内容有上限，不随知识库大小增长。
+"""
+import logging
+import math
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.db import close_old_connections
+
+from articles.models import Article
+from articles.text import tokenize
+
+from .chunking import split_chunks
+from .config import DeepSeekConfig
+from .tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_build_executor = ThreadPoolExecutor(
+    max_workers=DeepSeekConfig.RETRIEVAL_BUILD_WORKERS, thread_name_prefix="ai-retrieval"
+)
+
+
+class ChunkIndex:
+    """单个用户的BM25倒排索引"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.chunks: Dict[int, Tuple[int, str, int]] = {}  # 分块ID -> (文章ID, 文本, 词数)
+        self.terms: Dict[int, Counter] = {}  # 分块ID -> 词频
+        self.postings: Dict[str, Dict[int, int]] = {}  # 词 -> {分块ID: 词频}
+        self.article_chunks: Dict[int, List[int]] = {}  # 文章ID -> 分块ID列表
+        self.article_versions: Dict[int, object] = {}  # 文章ID -> 建索引时的 updated_at
+        self.titles: Dict[int, str] = {}
+        self.total_length = 0
+        self.synced_at = None  # 已同步到的 Article.updated_at
+
+    def _remove_locked(self, article_id: int):
+        for chunk_id in self.article_chunks.pop(article_id, []):
+            _, _, length = self.chunks.pop(chunk_id)
+            self.total_length -= length
+            for term in self.terms.pop(chunk_id):
+                posting = self.postings[term]
+                del posting[chunk_id]
+                if not posting:
+                    del self.postings[term]
+        self.article_versions.pop(article_id, None)
+        self.titles.pop(article_id, None)
+
+    def add_article(self, article_id: int, title: str, content: str, version=None):
+        """（重新）索引一篇文章；版本不比已索引的新时跳过"""
+        with self._lock:
+            indexed = self.article_versions.get(article_id)
+            if version is not None and indexed is not None and indexed >= version:
+                return
+        chunks = []
+        for text in split_chunks(content, DeepSeekConfig.RETRIEVAL_CHUNK_CHARS):
+            # 标题计入每个分块的词，问题提到文章主题时也能命中正文分块
+            terms = Counter(tokenize(f"{title} {text}"))
+            if terms:
+                chunks.append((text, terms))
+
+        with self._lock:
+            self._remove_locked(article_id)
+            chunk_ids = []
+            for text, terms in chunks:
+                chunk_id = self._next_id
+                self._next_id += 1
+                length = sum(terms.values())
+                self.chunks[chunk_id] = (article_id, text, length)
+                self.terms[chunk_id] = terms
+                self.total_length += length
+                for term, tf in terms.items():
+                    self.postings.setdefault(term, {})[chunk_id] = tf
+                chunk_ids.append(chunk_id)
+            self.article_chunks[article_id] = chunk_ids
+            self.article_versions[article_id] = version
+            self.titles[article_id] = title
+
+    def remove_article(self, article_id: int):
+        with self._lock:
+            self._remove_locked(article_id)
+
+    def search(self, query: str, k: int) -> List[Tuple[float, int, str]]:
+        """BM25得分最高的 k 个分块，返回 [(得分, 文章ID, 分块文本)]"""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            count = len(self.chunks)
+            if not count or not query_terms:
+                return []
+            avg_length = self.total_length / count
+            scores: Dict[int, float] = {}
+            for term in query_terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for chunk_id, tf in posting.items():
+                    length = self.chunks[chunk_id][2]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(score, self.chunks[chunk_id][0], self.chunks[chunk_id][1]) for chunk_id, score in top]
+
+
+class _Registry:
+    """按用户缓存索引，超过上限时淘汰最久未使用的用户"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._indexes: 'OrderedDict[int, ChunkIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[int, threading.Lock] = {}
+        self._building = set()
+
+    def peek(self, user_id: int) -> Optional[ChunkIndex]:
+        with self._lock:
+            return self._indexes.get(user_id)
+
+    def get(self, user_id: int) -> Optional[ChunkIndex]:
+        """增量同步后返回已加载的索引；还没有加载时在后台建索引，返回 None"""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                schedule = user_id not in self._building
+                self._building.add(user_id)
+            else:
+                self._indexes.move_to_end(user_id)
+                load_lock = self._loading.setdefault(user_id, threading.Lock())
+        if index is None:
+            if schedule:
+                _build_executor.submit(self.build, user_id)
+            return None
+
+        # 增量同步在该用户的锁内进行，避免并发请求重复索引同一批文章
+        with load_lock:
+            _sync(user_id, index)
+        return index
+
+    def build(self, user_id: int):
+        """建立用户的完整索引（在后台线程中运行）"""
+        close_old_connections()
+        try:
+            index = ChunkIndex()
+            _sync(user_id, index)
+            with self._lock:
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    evicted, _ = self._indexes.popitem(last=False)
+                    self._loading.pop(evicted, None)
+            logger.info(f"加载用户 #{user_id} 的知识库索引: {len(index.article_chunks)} 篇文章")
+        except Exception as e:
+            logger.warning(f"建立用户 #{user_id} 的知识库索引失败: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(user_id)
+            close_old_connections()
+
+
+_registry = _Registry(max_users=DeepSeekConfig.RETRIEVAL_CACHE_USERS)
+
+
+def _sync(user_id: int, index: ChunkIndex):
+    """索引 synced_at 之后有变化的文章（首次加载时为全部文章）"""
+    articles = Article.objects.filter(author_id=user_id)
+    if index.synced_at is not None:
+        articles = articles.filter(updated_at__gt=index.synced_at)
+    rows = articles.values_list('id', 'title', 'content', 'updated_at')
+    for article_id, title, content, updated_at in rows.iterator(chunk_size=500):
+        index.add_article(article_id, title, content, updated_at)
+        if index.synced_at is None or updated_at > index.synced_at:
+            index.synced_at = updated_at
+
+
+def update_article(article):
+    """文章保存后更新本进程已加载的索引"""
+    index = _registry.peek(article.author_id)
+    if index is not None:
+        index.add_article(article.pk, article.title, article.content, article.updated_at)
+
+
+def remove_article(article):
+    index = _registry.peek(article.author_id)
+    if index is not None:
+        index.remove_article(article.pk)
+
+
+def retrieve(user_id: int, query: str, k: int = None, max_tokens: int = None) -> List[Dict]:
+    """检索与问题相关的分块，按得分从高到低在token预算内选取"""
+    k = k or DeepSeekConfig.RETRIEVAL_TOP_K
+    max_tokens = max_tokens or DeepSeekConfig.RETRIEVAL_MAX_TOKENS
+
+    index = _registry.get(user_id)
+    if index is None:
+        # 索引正在后台建立，本轮对话不带知识库上下文
+        return []
+    # 多取几个候选：部分分块可能超出预算或所属文章已在其他进程中删除
+    candidates = [item for item in index.search(query, k * 2) if item[0] >= DeepSeekConfig.RETRIEVAL_MIN_SCORE]
+    if not candidates:
+        return []
+
+    existing = set(
+        Article.objects.filter(author_id=user_id, id__in={article_id for _, article_id, _ in candidates})
+        .values_list('id', flat=True)
+    )
+    results, budget = [], max_tokens
+    for score, article_id, text in candidates:
+        if article_id not in existing:
+            index.remove_article(article_id)
+            continue
+        cost = estimate_tokens(text)
+        if cost > budget:
+            continue
+        budget -= cost
+        results.append({
+            'article_id': article_id,
+            'title': index.titles.get(article_id, ''),
+            'content': text,
+            'score': score,
+        })
+        if len(results) >= k:
+            break
+    return results
@@ -0,0 +1,341 @@
+"""多上游路由与对冲请求
+
+可以配置多个兼容OpenAI接口的上游（AI_PROVIDERS，例如DeepSeek官方、其他部署或本地模拟服务），
+每个上游单独维护连接池、延迟和错误率的EWMA，以及按操作类型统计的近期延迟样本。
+
+非流式调用的路由规则：
+- 主上游为配置顺序中第一个错误率EWMA低于阈值的上游，全部不健康时选错误率最低的；
+- 主上游在该操作的延迟分位数（HEDGE_PERCENTILE）内没有返回时，向下一个上游
+  （只有一个上游时向同一上游）发送一次对冲请求，采用先成功返回的结果，另一方取消；
+- 对冲请求消耗对冲预算（与重试预算相同的令牌桶），对冲次数最多约为请求数的
+  HEDGE_BUDGET_RATIO 倍，平均成本不会因此翻倍。
+
+同步HTTP客户端无法中断正在等待响应头的请求，落后的一方在收到响应头后立即关闭连接。
+异步接口使用 apost，选择上游和对冲的规则相同，落后的一方所在的任务直接取消。
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import requests
+
+from .client import (
+    AsyncDeepSeekHTTPClient,
+    DeepSeekHTTPClient,
+    RequestCancelled,
+    get_async_http_client,
+    get_http_client,
+)
+from .config import DeepSeekConfig
+from .resilience import RetryBudget
+
+logger = logging.getLogger(__name__)
+
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=DeepSeekConfig.HEDGE_WORKERS, thread_name_prefix="ai-hedge"
+)
+
+
+class Provider:
+    """一个兼容OpenAI接口的上游"""
+
+    LATENCY_ALPHA = 0.2
+    ERROR_ALPHA = 0.1
+    SAMPLE_SIZE = 200  # 每种操作保留的延迟样本数
+    MIN_SAMPLES = 20  # 样本不足时不计算分位数（不对冲）
+
+    def __init__(self, name: str, client: DeepSeekHTTPClient, model: str = None, api_key: str = None):
+        self.name = name
+        self.client = client
+        self.model = model  # 为空时使用请求中的模型
+        self.api_key = api_key  # 为空时使用请求中的Authorization
+
+        self._lock = threading.Lock()
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self._samples: Dict[str, deque] = {}
+        self._stats = {'requests': 0, 'errors': 0, 'hedged': 0, 'wins': 0, 'cancelled': 0}
+
+    def async_client(self) -> AsyncDeepSeekHTTPClient:
+        """当前事件循环中该上游的异步HTTP客户端"""
+        return get_async_http_client(self.client.base_url)
+
+    def prepare(self, headers: Dict, data: Dict) -> Tuple[Dict, Dict]:
+        """按上游配置替换模型和密钥"""
+        if self.model:
+            data = dict(data, model=self.model)
+        if self.api_key:
+            headers = dict(headers, Authorization=f"Bearer {self.api_key}")
+        return headers, data
+
+    def record_outcome(self, success: bool):
+        """只更新错误率（流式请求的耗时取决于输出长度，不计入延迟统计）"""
+        with self._lock:
+            self._record_outcome_locked(success)
+
+    def _record_outcome_locked(self, success: bool):
+        self._stats['requests'] += 1
+        self.error_ewma += self.ERROR_ALPHA * ((0.0 if success else 1.0) - self.error_ewma)
+        if not success:
+            self._stats['errors'] += 1
+
+    def _record_latency_locked(self, operation: str, latency: float):
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.LATENCY_ALPHA * (latency - self.latency_ewma)
+        samples = self._samples.get(operation)
+        if samples is None:
+            samples = self._samples[operation] = deque(maxlen=self.SAMPLE_SIZE)
+        samples.append(latency)
+
+    def record(self, operation: str, latency: float, success: bool):
+        with self._lock:
+            self._record_outcome_locked(success)
+            if success:
+                self._record_latency_locked(operation, latency)
+
+    def record_cancelled(self, operation: str, elapsed: float):
+        """对冲中落后被取消的请求：实际延迟至少为 elapsed，作为下限记入延迟样本，不计入错误率
+
+        只记录胜出一方的延迟会让分位数越来越低，对冲越来越频繁。
+        """
+        with self._lock:
+            self._stats['cancelled'] += 1
+            self._record_latency_locked(operation, elapsed)
+
+    def count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def latency_percentile(self, operation: str, percentile: float) -> Optional[float]:
+        with self._lock:
+            samples = self._samples.get(operation)
+            if samples is None or len(samples) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'name': self.name,
+                'base_url': self.client.base_url,
+                'model': self.model,
+                'latency_ewma_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+                'error_ewma': round(self.error_ewma, 3),
+            })
+        return stats
+
+
+class ProviderRouter:
+    """在多个上游之间选择主上游，并在主上游过慢时发送对冲请求"""
+
+    def __init__(self, providers: List[Provider], hedge_percentile: float = None,
+                 hedge_min_delay: float = None, hedge_budget: RetryBudget = None):
+        self.providers = providers
+        self.hedge_percentile = hedge_percentile or DeepSeekConfig.HEDGE_PERCENTILE
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else DeepSeekConfig.HEDGE_MIN_DELAY
+        self.hedge_budget = hedge_budget or RetryBudget(
+            ratio=DeepSeekConfig.HEDGE_BUDGET_RATIO,
+            min_per_second=DeepSeekConfig.HEDGE_BUDGET_MIN_PER_SECOND,
+        )
+
+    def ranked(self, avoid: Optional[Provider] = None) -> List[Provider]:
+        """按配置顺序排列健康的上游，不健康的上游按错误率排在后面，avoid（上次失败的上游）排在最后"""
+        threshold = DeepSeekConfig.PROVIDER_ERROR_THRESHOLD
+        healthy = [p for p in self.providers if p.error_ewma < threshold]
+        unhealthy = sorted((p for p in self.providers if p.error_ewma >= threshold), key=lambda p: p.error_ewma)
+        ranked = healthy + unhealthy
+        if avoid is not None and len(ranked) > 1 and avoid in ranked:
+            ranked.remove(avoid)
+            ranked.append(avoid)
+        return ranked
+
+    def primary(self, avoid: Optional[Provider] = None) -> Provider:
+        return self.ranked(avoid)[0]
+
+    def _hedge_delay(self, provider: Provider, operation: str) -> Optional[float]:
+        if not DeepSeekConfig.HEDGE_ENABLED:
+            return None
+        percentile = provider.latency_percentile(operation, self.hedge_percentile)
+        if percentile is None:
+            return None
+        return max(self.hedge_min_delay, percentile)
+
+    def _call(self, provider: Provider, operation: str, path: str, headers: Dict, data: Dict,
+              total_timeout: Optional[float], cancel: threading.Event) -> Tuple[Provider, requests.Response]:
+        headers, data = provider.prepare(headers, data)
+        started = time.monotonic()
+        try:
+            response = provider.client.post(path, headers=headers, json=data,
+                                            total_timeout=total_timeout, cancel=cancel)
+        except RequestCancelled:
+            provider.record_cancelled(operation, time.monotonic() - started)
+            raise
+        except requests.exceptions.RequestException:
+            provider.record(operation, time.monotonic() - started, success=False)
+            raise
+        if cancel.is_set():
+            provider.record_cancelled(operation, time.monotonic() - started)
+            raise RequestCancelled("请求已取消")
+        provider.record(operation, time.monotonic() - started, success=response.status_code == 200)
+        return provider, response
+
+    def post(self, path: str, headers: Dict, data: Dict, operation: str = "generate",
+             total_timeout: Optional[float] = None,
+             avoid: Optional[Provider] = None) -> Tuple[Provider, requests.Response]:
+        """发送一次非流式请求，返回 (实际使用的上游, 响应)
+
+        只有一个请求时和 DeepSeekHTTPClient.post 的行为相同；发生对冲时返回先成功的响应，
+        两个都失败时返回/抛出主请求的结果。重试时传入上次失败的上游作为 avoid。
+        """
+        self.hedge_budget.record_request()
+        ranked = self.ranked(avoid)
+        primary = ranked[0]
+        delay = self._hedge_delay(primary, operation)
+        if delay is None or (total_timeout is not None and delay >= total_timeout):
+            return self._call(primary, operation, path, headers, data, total_timeout, threading.Event())
+
+        cancels = {}
+        started = time.monotonic()
+        primary_cancel = threading.Event()
+        primary_future = _hedge_executor.submit(
+            self._call, primary, operation, path, headers, data, total_timeout, primary_cancel
+        )
+        cancels[primary_future] = primary_cancel
+        done, _ = wait([primary_future], timeout=delay)
+        remaining = None if total_timeout is None else total_timeout - (time.monotonic() - started)
+        # 剩余时间已用完时不再发送对冲请求，也不消耗对冲预算
+        if not done and (remaining is None or remaining > 0) and self.hedge_budget.try_acquire():
+            backup = ranked[1] if len(ranked) > 1 else primary
+            backup.count('hedged')
+            backup_cancel = threading.Event()
+            backup_future = _hedge_executor.submit(
+                self._call, backup, operation, path, headers, data, remaining, backup_cancel
+            )
+            cancels[backup_future] = backup_cancel
+            logger.info(f"{primary.name} 超过 {delay:.2f} 秒未返回，向 {backup.name} 发送对冲请求")
+
+        pending = set(cancels)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    provider, response = future.result()
+                except requests.exceptions.RequestException:
+                    continue
+                if response.status_code != 200 and pending:
+                    # 失败的响应先不采用，等另一个请求的结果
+                    continue
+                for other in pending:
+                    cancels[other].set()
+                if len(cancels) > 1:
+                    provider.count('wins')
+                return provider, response
+        # 全部失败：以主请求的结果为准
+        return primary_future.result()
+
+    async def _acall(self, provider: Provider, operation: str, path: str, headers: Dict, data: Dict,
+                     total_timeout: Optional[float]) -> Tuple[Provider, httpx.Response]:
+        headers, data = provider.prepare(headers, data)
+        started = time.monotonic()
+        try:
+            response = await provider.async_client().post(path, headers=headers, json=data,
+                                                          total_timeout=total_timeout)
+        except asyncio.CancelledError:
+            provider.record_cancelled(operation, time.monotonic() - started)
+            raise
+        except httpx.HTTPError:
+            provider.record(operation, time.monotonic() - started, success=False)
+            raise
+        provider.record(operation, time.monotonic() - started, success=response.status_code == 200)
+        return provider, response
+
+    async def apost(self, path: str, headers: Dict, data: Dict, operation: str = "generate",
+                    total_timeout: Optional[float] = None,
+                    avoid: Optional[Provider] = None) -> Tuple[Provider, httpx.Response]:
+        """post 的异步版本，返回 (实际使用的上游, httpx响应)"""
+        self.hedge_budget.record_request()
+        ranked = self.ranked(avoid)
+        primary = ranked[0]
+        delay = self._hedge_delay(primary, operation)
+        if delay is None or (total_timeout is not None and delay >= total_timeout):
+            return await self._acall(primary, operation, path, headers, data, total_timeout)
+
+        started = time.monotonic()
+        primary_task = asyncio.ensure_future(self._acall(primary, operation, path, headers, data, total_timeout))
+        tasks = [primary_task]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            remaining = None if total_timeout is None else total_timeout - (time.monotonic() - started)
+            if not done and (remaining is None or remaining > 0) and self.hedge_budget.try_acquire():
+                backup = ranked[1] if len(ranked) > 1 else primary
+                backup.count('hedged')
+                tasks.append(asyncio.ensure_future(
+                    self._acall(backup, operation, path, headers, data, remaining)
+                ))
+                logger.info(f"{primary.name} 超过 {delay:.2f} 秒未返回，向 {backup.name} 发送对冲请求")
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        provider, response = task.result()
+                    except httpx.HTTPError:
+                        continue
+                    if response.status_code != 200 and pending:
+                        # 失败的响应先不采用，等另一个请求的结果
+                        continue
+                    if len(tasks) > 1:
+                        provider.count('wins')
+                    return provider, response
+            # 全部失败：以主请求的结果为准
+            return primary_task.result()
+        finally:
+            # 落后的一方（或调用方被取消时的全部请求）直接取消
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            'providers': [provider.stats() for provider in self.providers],
+            'hedge_budget': self.hedge_budget.stats(),
+            'hedge_percentile': self.hedge_percentile,
+        }
+
+
+def _build_providers() -> List[Provider]:
+    """默认上游使用 DEEPSEEK_BASE_URL 和共享的HTTP客户端，AI_PROVIDERS 中配置的上游依次作为备用"""
+    providers = [Provider('deepseek', get_http_client())]
+    for index, config in enumerate(json.loads(DeepSeekConfig.PROVIDERS or '[]')):
+        providers.append(Provider(
+            config.get('name') or f"provider-{index + 1}",
+            DeepSeekHTTPClient(base_url=config['base_url']),
+            model=config.get('model'),
+            api_key=config.get('api_key'),
+        ))
+    return providers
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ProviderRouter:
+    """进程内共享的路由器（首次使用时创建）"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ProviderRouter(_build_providers())
+    return _router
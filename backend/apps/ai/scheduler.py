@@ -0,0 +1,259 @@
+"""上游AI调用的优先级调度
+
+所有上游调用（包括流式调用的整个输出过程，以及ASGI异步接口的调用）都要先从
+调度器取得一个名额，进程内同时进行的调用数不超过 SCHEDULER_MAX_IN_FLIGHT。
+同步调用用 slot() 阻塞等待，异步调用用 aslot() 在事件循环中等待，两者共用名额和队列。请求分为三个优先级：
+
+- interactive：自动补全、对话，用户在等待输入反馈；
+- editing：润色、大纲、摘要、标签等编辑操作；
+- batch：批量处理、后台任务、对话历史压缩。
+
+名额空出时按优先级从高到低分配，同一优先级内按用户轮转，单个用户的大量请求不会
+挤占其他用户。editing 最多使用 总名额 - SCHEDULER_INTERACTIVE_RESERVED 个名额，
+batch 最多使用一半名额，长时间的改写占满上游时补全和对话仍有名额可用。
+
+排队超过截止时间（调用方的 deadline 与该优先级最长等待时间中较早的一个）的请求
+直接丢弃并抛出 QueueTimeoutError，视图按服务不可用返回503。
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from .config import DeepSeekConfig
+from .resilience import CircuitOpenError
+from . import usage
+
+PRIORITIES = ('interactive', 'editing', 'batch')
+
+# 操作类型 -> 默认优先级，未列出的操作按 editing 处理
+OPERATION_PRIORITIES = {
+    'auto_complete': 'interactive',
+    'chat': 'interactive',
+    'chat_summary': 'batch',
+}
+
+_priority = contextvars.ContextVar('ai_scheduler_priority', default=None)
+
+
+class QueueTimeoutError(CircuitOpenError):
+    """排队超过截止时间被丢弃（与熔断一样按503返回）"""
+
+
+@contextmanager
+def priority_scope(priority: str):
+    """在此范围内的上游调用使用指定优先级（例如批量处理中的摘要按 batch 排队）"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def priority_for(operation: str) -> str:
+    return _priority.get() or OPERATION_PRIORITIES.get(operation, 'editing')
+
+
+class _Waiter:
+    __slots__ = ('priority', 'user_key', 'deadline', 'enqueued_at', 'event', 'future', 'granted')
+
+    def __init__(self, priority: str, user_key, deadline: float):
+        self.priority = priority
+        self.user_key = user_key
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.event = threading.Event()
+        self.future = None  # 异步等待时为事件循环中的 Future
+        self.granted = False
+
+    def wake(self):
+        """唤醒等待方；名额可能由其他线程释放，异步等待方通过 call_soon_threadsafe 唤醒"""
+        self.event.set()
+        if self.future is not None:
+            self.future.get_loop().call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Scheduler:
+    """全局并发上限 + 优先级 + 同优先级内按用户轮转"""
+
+    WAIT_SAMPLES = 500  # 每个优先级保留的近期排队时间样本数
+
+    def __init__(self, max_in_flight: int, interactive_reserved: int):
+        self.max_in_flight = max_in_flight
+        self.limits = {
+            'interactive': max_in_flight,
+            'editing': max(1, max_in_flight - interactive_reserved),
+            'batch': max(1, max_in_flight // 2),
+        }
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = {priority: 0 for priority in PRIORITIES}
+        # 优先级 -> {用户: 该用户排队中的请求}，OrderedDict 的顺序即轮转顺序
+        self._queues: Dict[str, 'OrderedDict[object, deque]'] = {priority: OrderedDict() for priority in PRIORITIES}
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._waits = {priority: deque(maxlen=self.WAIT_SAMPLES) for priority in PRIORITIES}
+        self._stats = {priority: {'granted': 0, 'queued': 0, 'shed': 0} for priority in PRIORITIES}
+
+    def _can_run(self, priority: str) -> bool:
+        return self._in_flight < self.max_in_flight and self._running[priority] < self.limits[priority]
+
+    def _grant_locked(self, waiter: _Waiter):
+        self._in_flight += 1
+        self._running[waiter.priority] += 1
+        self._stats[waiter.priority]['granted'] += 1
+        self._waits[waiter.priority].append(time.monotonic() - waiter.enqueued_at)
+        waiter.granted = True
+        waiter.wake()
+
+    def _pop_locked(self, priority: str) -> Optional[_Waiter]:
+        """取出下一个用户的第一个请求，该用户还有请求时移到轮转队尾"""
+        queue = self._queues[priority]
+        if not queue:
+            return None
+        user_key, waiters = next(iter(queue.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            queue.move_to_end(user_key)
+        else:
+            del queue[user_key]
+        self._queued[priority] -= 1
+        return waiter
+
+    def _dispatch_locked(self):
+        now = time.monotonic()
+        for priority in PRIORITIES:
+            while self._queued[priority] and self._can_run(priority):
+                waiter = self._pop_locked(priority)
+                if waiter.deadline <= now:
+                    # 已过截止时间，由等待线程自己抛出异常
+                    self._stats[priority]['shed'] += 1
+                    waiter.wake()
+                    continue
+                self._grant_locked(waiter)
+
+    def _remove_locked(self, waiter: _Waiter) -> bool:
+        queue = self._queues[waiter.priority]
+        waiters = queue.get(waiter.user_key)
+        if waiters is None or waiter not in waiters:
+            return False
+        waiters.remove(waiter)
+        if not waiters:
+            del queue[waiter.user_key]
+        self._queued[waiter.priority] -= 1
+        return True
+
+    def _new_waiter(self, priority: str, user_id: Optional[int], deadline: Optional[float]) -> _Waiter:
+        queue_deadline = time.monotonic() + DeepSeekConfig.SCHEDULER_MAX_WAIT[priority]
+        if deadline is not None:
+            queue_deadline = min(queue_deadline, deadline)
+        return _Waiter(priority, user_id or 0, queue_deadline)
+
+    def _enqueue(self, waiter: _Waiter) -> bool:
+        """有空闲名额且前面无人排队时直接取得名额返回 True，否则加入队列返回 False"""
+        priority = waiter.priority
+        with self._lock:
+            # 同级或更高优先级已有人排队时不插队
+            ahead = any(self._queued[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+            if not ahead and self._can_run(priority):
+                self._grant_locked(waiter)
+                return True
+            self._queues[priority].setdefault(waiter.user_key, deque()).append(waiter)
+            self._queued[priority] += 1
+            self._stats[priority]['queued'] += 1
+            return False
+
+    def _finish_wait(self, waiter: _Waiter) -> _Waiter:
+        """等待结束：已分到名额则返回，否则移出队列并抛出 QueueTimeoutError"""
+        with self._lock:
+            if waiter.granted:
+                return waiter
+            if self._remove_locked(waiter):
+                self._stats[waiter.priority]['shed'] += 1
+        raise QueueTimeoutError("AI服务繁忙，请稍后重试")
+
+    def acquire(self, priority: str, user_id: Optional[int] = None, deadline: Optional[float] = None) -> _Waiter:
+        """取得一个名额，排队超过截止时间时抛出 QueueTimeoutError"""
+        waiter = self._new_waiter(priority, user_id, deadline)
+        if not self._enqueue(waiter):
+            waiter.event.wait(max(0.0, waiter.deadline - time.monotonic()))
+        return self._finish_wait(waiter)
+
+    async def aacquire(self, priority: str, user_id: Optional[int] = None,
+                       deadline: Optional[float] = None) -> _Waiter:
+        """acquire 的异步版本，排队期间不占用事件循环和工作线程"""
+        waiter = self._new_waiter(priority, user_id, deadline)
+        waiter.future = asyncio.get_running_loop().create_future()
+        if self._enqueue(waiter):
+            return waiter
+        try:
+            await asyncio.wait_for(waiter.future, max(0.0, waiter.deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # 调用方被取消：还在排队就移出队列，已经分到的名额立即归还
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._remove_locked(waiter)
+            if granted:
+                self.release(waiter)
+            raise
+        return self._finish_wait(waiter)
+
+    def release(self, waiter: _Waiter):
+        with self._lock:
+            self._in_flight -= 1
+            self._running[waiter.priority] -= 1
+            self._dispatch_locked()
+
+    @contextmanager
+    def slot(self, operation: str, deadline: Optional[float] = None) -> Iterator[None]:
+        """按操作类型的优先级和当前用户取得名额，退出时释放"""
+        waiter = self.acquire(priority_for(operation), usage.current_user_id(), deadline)
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, operation: str, deadline: Optional[float] = None) -> AsyncIterator[None]:
+        """slot 的异步版本，供ASGI异步接口使用"""
+        waiter = await self.aacquire(priority_for(operation), usage.current_user_id(), deadline)
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            classes = {}
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                classes[priority] = dict(
+                    self._stats[priority],
+                    running=self._running[priority],
+                    queue_depth=self._queued[priority],
+                    queued_users=len(self._queues[priority]),
+                    limit=self.limits[priority],
+                    wait_avg_ms=round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                    wait_p95_ms=round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                )
+            return {
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self._in_flight,
+                'classes': classes,
+            }
+
+
+scheduler = Scheduler(
+    max_in_flight=DeepSeekConfig.SCHEDULER_MAX_IN_FLIGHT,
+    interactive_reserved=DeepSeekConfig.SCHEDULER_INTERACTIVE_RESERVED,
+)
@@ -1,23 +1,34 @@
 from rest_framework import serializers
-from .models import AIAssistantSession, AIMessage
+from .config import DeepSeekConfig
+from .models import AIAssistantSession, AIMessage, AIJob
 
 class AIMessageSerializer(serializers.ModelSerializer):
     """AI消息序列化器"""
     class Meta:
         model = AIMessage
-        fields = ('id', 'content', 'is_user', 'created_at')
+        fields = ('id', 'content', 'is_user', 'status', 'error', 'created_at')
 
 class AIAssistantSessionSerializer(serializers.ModelSerializer):
-    """AI会话序列化器"""
-    messages = AIMessageSerializer(many=True, read_only=True)
-    message_count = serializers.SerializerMethodField()
+    """AI会话序列化器
+    
+    不包含消息内容（消息通过 sessions/<id>/messages/ 分页获取），
+    message_count 和最后一条消息由视图的查询集注解提供。
+    """
+    message_count = serializers.IntegerField(read_only=True, default=0)
+    last_message = serializers.SerializerMethodField()
     
     class Meta:
         model = AIAssistantSession
-        fields = ('id', 'title', 'messages', 'message_count', 'created_at', 'updated_at')
+        fields = ('id', 'title', 'message_count', 'last_message', 'created_at', 'updated_at')
     
-    def get_message_count(self, obj):
-        return obj.messages.count()
+    def get_last_message(self, obj):
+        if getattr(obj, 'last_message_at', None) is None:
+            return None
+        return {
+            'content': obj.last_message_preview,
+            'is_user': obj.last_message_is_user,
+            'created_at': serializers.DateTimeField().to_representation(obj.last_message_at),
+        }
 
 class OutlineRequestSerializer(serializers.Serializer):
     """大纲请求序列化器"""
@@ -36,8 +47,83 @@ class ImproveRequestSerializer(serializers.Serializer):
         default='style',
         label='优化类型'
     )
+    mode = serializers.ChoiceField(
+        choices=[('parallel', '并发调用'), ('structured', '单次结构化调用')],
+        required=False,
+        label='执行模式'
+    )
 
 class SummaryRequestSerializer(serializers.Serializer):
     """摘要请求序列化器"""
     content = serializers.CharField(required=True, label='内容')
-    max_length = serializers.IntegerField(default=200, min_value=50, max_value=500, label='最大长度')
\ No newline at end of file
+    max_length = serializers.IntegerField(default=200, min_value=50, max_value=500, label='最大长度')
+
+class TagsRequestSerializer(serializers.Serializer):
+    """标签请求序列化器"""
+    content = serializers.CharField(required=True, label='内容')
+    count = serializers.IntegerField(default=5, min_value=1, max_value=20, label='标签数量')
+
+class AutoCompleteRequestSerializer(serializers.Serializer):
+    """自动补全请求序列化器"""
+    prompt = serializers.CharField(required=True, label='补全提示')
+    context = serializers.CharField(required=False, allow_blank=True, default='', label='上下文')
+    mode = serializers.ChoiceField(
+        choices=[('inline', '行内建议'), ('full', '续写')],
+        default='full',
+        label='补全模式'
+    )
+    # 同一 channel（编辑器实例）内递增，新请求会取消尚未完成的旧请求
+    request_id = serializers.IntegerField(required=False, min_value=0, label='请求序号')
+    channel = serializers.CharField(required=False, default='', max_length=64, allow_blank=True, label='编辑器标识')
+
+class BatchRequestSerializer(serializers.Serializer):
+    """批量处理文章请求序列化器"""
+    article_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=DeepSeekConfig.BATCH_MAX_ARTICLES,
+        label='文章ID列表'
+    )
+    operations = serializers.MultipleChoiceField(
+        choices=[('summary', '生成摘要'), ('tags', '生成标签')],
+        default=['summary', 'tags'],
+        label='处理操作'
+    )
+    max_length = serializers.IntegerField(default=200, min_value=50, max_value=500, label='摘要最大长度')
+    tag_count = serializers.IntegerField(default=5, min_value=1, max_value=20, label='标签数量')
+    overwrite = serializers.BooleanField(default=True, label='覆盖已有摘要')
+    stream = serializers.BooleanField(default=False, label='SSE流式返回')
+    
+    def validate_operations(self, value):
+        if not value:
+            raise serializers.ValidationError('至少选择一种操作')
+        # 固定顺序，便于按操作处理
+        return [op for op in ('summary', 'tags') if op in value]
+
+class AIJobSerializer(serializers.ModelSerializer):
+    """AI后台任务序列化器"""
+    class Meta:
+        model = AIJob
+        fields = ('id', 'job_type', 'status', 'attempts', 'error',
+                  'created_at', 'updated_at', 'finished_at')
+        read_only_fields = fields
+
+class AIJobCreateSerializer(serializers.Serializer):
+    """提交AI后台任务"""
+    # 任务类型 -> 参数校验使用的序列化器，与对应的同步接口保持一致
+    PARAMS_SERIALIZERS = {
+        'summary': SummaryRequestSerializer,
+        'tags': TagsRequestSerializer,
+        'outline': OutlineRequestSerializer,
+        'improve': ImproveRequestSerializer,
+    }
+    
+    job_type = serializers.ChoiceField(choices=AIJob.JOB_TYPE_CHOICES, label='任务类型')
+    params = serializers.DictField(label='任务参数')
+    
+    def validate(self, data):
+        params_serializer = self.PARAMS_SERIALIZERS[data['job_type']](data=data['params'])
+        if not params_serializer.is_valid():
+            raise serializers.ValidationError({'params': params_serializer.errors})
+        data['params'] = params_serializer.validated_data
+        return data
@@ -1,13 +1,35 @@
 import json
 import logging
+import re
 import requests
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from django.conf import settings
 from .config import DeepSeekConfig
+from .client import get_http_client
+from .cache import result_cache
+from . import chunking, prompts, resilience, routing, usage
+from .scheduler import scheduler
+from .resilience import DeepSeekError
+import contextvars
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WRITING_SUGGESTIONS = [
+    "建议：优化技术术语的使用一致性",
+    "建议：增加具体的代码或配置示例",
+    "建议：改善段落之间的逻辑衔接"
+]
+DEFAULT_WRITING_RATING = "8/10"  # 默认评分
+
+# improve_writing 并发子任务使用的共享线程池
+_fanout_executor = ThreadPoolExecutor(
+    max_workers=DeepSeekConfig.FANOUT_WORKERS, thread_name_prefix="ai-fanout"
+)
+
+DEFAULT_TAGS = ["技术", "开发", "文档", "实践", "总结"]
+
 class DeepSeekService:
     """DeepSeek AI服务"""
     
@@ -15,138 +37,261 @@ class DeepSeekService:
         self.api_key = DeepSeekConfig.API_KEY
         self.base_url = DeepSeekConfig.BASE_URL
         self.model = DeepSeekConfig.CHAT_MODEL
-        self.timeout = 60  # 增加超时时间到60秒
         self.max_retries = 3  # 最大重试次数
     
-    def generate_content(self, prompt: str, max_tokens: int = None) -> str:
-        """生成内容 - 增加重试机制"""
+    @property
+    def client(self):
+        """共享的HTTP客户端（带连接池和keep-alive）"""
+        return get_http_client()
+    
+    def _cached(self, operation: str, params: Dict, content: str, compute):
+        """按 模型+模板版本+参数+内容 缓存结果，相同请求并发时只调用一次上游"""
+        key = result_cache.make_key(operation, self.model, prompts.PROMPT_VERSIONS[operation], params, content)
+        return result_cache.get_or_compute(key, compute, operation=operation)
+    
+    def _build_request(self, prompt: str, max_tokens: int, stream: bool = False,
+                       messages: Optional[List[Dict]] = None):
+        """构造请求头和请求体，传入 messages 时以它作为完整的对话消息列表"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "model": self.model,
+            "messages": messages or [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "stream": stream
+        }
+        if stream:
+            # 流式响应默认不返回用量，要求在最后一个数据块中附带 usage
+            data["stream_options"] = {"include_usage": True}
+        return headers, data
+    
+    def _prompt_text(self, data: Dict) -> str:
+        """请求中所有消息的文本，用于上游未返回用量时估算"""
+        return "\n".join(m["content"] for m in data["messages"])
+    
+    def _wait_before_retry(self, wait_time: float, deadline: Optional[float]) -> bool:
+        """重试前等待；如果等待后已超过截止时间则不再重试"""
+        if deadline is not None and time.monotonic() + wait_time >= deadline:
+            return False
+        time.sleep(wait_time)
+        return True
+    
+    def generate_content(self, prompt: str, max_tokens: int = None,
+                         deadline: Optional[float] = None, json_mode: bool = False,
+                         operation: str = "generate", messages: Optional[List[Dict]] = None) -> str:
+        """生成内容 - 增加重试机制
+        
+        deadline 为 time.monotonic() 的截止时间，所有重试和等待都不会超过它；
+        json_mode 要求模型以JSON对象格式输出；operation 为用量记录中的操作类型；
+        messages 为多轮对话的完整消息列表（见 context.build_messages），传入时忽略 prompt。
+        """
         if not self.api_key:
             raise Exception("DeepSeek API Key未配置")
         
         max_tokens = max_tokens or DeepSeekConfig.DEFAULT_MAX_TOKENS
         
-        # 重试机制
+        headers, data = self._build_request(prompt, max_tokens, messages=messages)
+        if json_mode:
+            data["response_format"] = {"type": "json_object"}
+        
+        # 重试机制：只重试超时、网络错误、429和5xx，重试受全局预算和熔断器限制
+        resilience.retry_budget.record_request()
+        router = routing.get_router()
+        error = None
+        provider = None
         for attempt in range(self.max_retries):
+            if attempt > 0:
+                if not resilience.acquire_retry(error):
+                    break
+                wait_time = resilience.backoff_delay(attempt)
+                if not self._wait_before_retry(wait_time, deadline):
+                    break
+                logger.info(f"已等待 {wait_time:.2f} 秒，重试...")
+            
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+            
+            resilience.check_circuit()
             try:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                data = {
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "max_tokens": max_tokens,
-                    "temperature": 0.7,
-                    "stream": False
-                }
-                
                 logger.info(f"尝试调用DeepSeek API (第{attempt + 1}次)...")
                 
-                response = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=self.timeout
-                )
-                
+                # 按优先级排队取得名额；重试时优先换一个上游，主上游过慢时路由器会发送对冲请求
+                with scheduler.slot(operation, deadline):
+                    # 排队可能用掉了剩余时间，取得名额后重新检查截止时间
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        # 没有发出请求，归还 check_circuit 可能占用的半开探测名额
+                        resilience.circuit_breaker.release_probe()
+                        error = DeepSeekError("DeepSeek API请求超时，请检查网络连接或稍后重试", retryable=True)
+                        break
+                    started_at = time.monotonic()
+                    provider, response = router.post(
+                        "/chat/completions",
+                        headers=headers,
+                        data=data,
+                        operation=operation,
+                        total_timeout=remaining,
+                        avoid=provider
+                    )
+            except requests.exceptions.Timeout:
+                error = DeepSeekError("DeepSeek API请求超时，请检查网络连接或稍后重试", retryable=True)
+            except requests.exceptions.RequestException:
+                error = DeepSeekError("网络连接错误，请检查网络设置", retryable=True)
+            else:
                 if response.status_code == 200:
+                    resilience.record_outcome()
                     result = response.json()
                     logger.info("DeepSeek API调用成功")
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    error_msg = f"DeepSeek API错误: {response.status_code} - {response.text}"
-                    logger.error(error_msg)
-                    
-                    # 如果是服务器错误，重试
-                    if response.status_code >= 500:
-                        if attempt < self.max_retries - 1:
-                            wait_time = 2 ** attempt  # 指数退避
-                            logger.info(f"等待 {wait_time} 秒后重试...")
-                            time.sleep(wait_time)
-                            continue
-                    
-                    raise Exception(error_msg)
-                    
-            except requests.exceptions.Timeout:
-                if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt
-                    logger.warning(f"API请求超时，等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    error_msg = "DeepSeek API请求超时，请检查网络连接或稍后重试"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
-                    
-            except requests.exceptions.ConnectionError:
-                if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt
-                    logger.warning(f"网络连接错误，等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    error_msg = "网络连接错误，请检查网络设置"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
-                    
-            except Exception as e:
-                error_msg = f"DeepSeek服务错误: {str(e)}"
-                logger.error(error_msg)
-                if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt
-                    logger.info(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    raise Exception(error_msg)
+                    content = result["choices"][0]["message"]["content"]
+                    usage.record_usage(
+                        operation, provider.model or self.model,
+                        usage.normalize_usage(result.get("usage"), self._prompt_text(data), content),
+                        time.monotonic() - started_at
+                    )
+                    return content
+                error = DeepSeekError(
+                    f"DeepSeek API错误: {response.status_code} - {response.text}",
+                    retryable=resilience.is_retryable_status(response.status_code)
+                )
+            
+            resilience.record_outcome(error)
+            logger.error(str(error))
         
-        # 所有重试都失败
-        raise Exception("DeepSeek服务暂时不可用，请稍后重试")
+        if error is None:
+            # 还没发出请求就已经到了截止时间
+            raise DeepSeekError("DeepSeek API请求超时，请检查网络连接或稍后重试")
+        raise error
     
-    def generate_article_outline(self, topic: str, style: str = "专业") -> Dict:
-        """生成文章大纲"""
-        prompt = f"""请为主题"{topic}"生成一个{style}风格的文章大纲。
-
-要求：
-1. 包含清晰的章节结构（3-5个主要章节）
-2. 每个章节要有3-5个具体的内容要点
-3. 适合技术文档的格式
-4. 包含引言和总结部分
-5. 返回严格的JSON格式
-
-JSON格式示例：
-{{
-    "title": "文章标题",
-    "sections": [
-        {{
-            "title": "章节标题", 
-            "points": ["要点1", "要点2", "要点3"]
-        }}
-    ]
-}}
-
-请直接返回JSON，不要其他文字。"""
+    def stream_content(self, prompt: str, max_tokens: int = None, operation: str = "generate",
+                       messages: Optional[List[Dict]] = None) -> Iterator[str]:
+        """流式生成内容，逐段返回模型输出的文本
+        
+        只在收到第一个token之前重试；一旦开始输出，中途出错直接抛出，
+        由调用方决定如何处理已收到的部分内容。
+        """
+        if not self.api_key:
+            raise Exception("DeepSeek API Key未配置")
+        
+        max_tokens = max_tokens or DeepSeekConfig.DEFAULT_MAX_TOKENS
+        headers, data = self._build_request(prompt, max_tokens, stream=True, messages=messages)
+        
+        resilience.retry_budget.record_request()
+        router = routing.get_router()
+        provider = None
+        for attempt in range(self.max_retries):
+            resilience.check_circuit()
+            # 流式请求不做对冲，按健康状况选择上游，重试时换一个上游
+            provider = router.primary(avoid=provider)
+            provider_headers, provider_data = provider.prepare(headers, data)
+            started = False
+            chunks = []
+            stream_usage = None
+            error = None
+            recorded = False  # 本次尝试的结果是否已记入熔断器
+            # 整个输出过程占用一个调度名额
+            with scheduler.slot(operation):
+                started_at = time.monotonic()
+                try:
+                    logger.info(f"尝试流式调用DeepSeek API (第{attempt + 1}次)...")
+                    for line in provider.client.stream_lines("/chat/completions", headers=provider_headers, json=provider_data):
+                        if not line.startswith("data:"):
+                            continue
+                        payload = line[len("data:"):].strip()
+                        if payload == "[DONE]":
+                            break
+                        chunk = json.loads(payload)
+                        if chunk.get("usage"):
+                            stream_usage = chunk["usage"]
+                        choices = chunk.get("choices") or []
+                        if not choices:
+                            continue
+                        delta = choices[0].get("delta", {}).get("content")
+                        if delta:
+                            if not started:
+                                # 收到第一个token即视为上游可用
+                                started = recorded = True
+                                resilience.record_outcome()
+                                provider.record_outcome(True)
+                            chunks.append(delta)
+                            yield delta
+                    if not started:
+                        recorded = True
+                        resilience.record_outcome()
+                        provider.record_outcome(True)
+                    usage.record_usage(
+                        operation, provider.model or self.model,
+                        usage.normalize_usage(stream_usage, self._prompt_text(data), "".join(chunks)),
+                        time.monotonic() - started_at
+                    )
+                    return
+                except GeneratorExit:
+                    # 调用方提前关闭（客户端断开、补全被新请求取消），记录已消耗的用量
+                    if started:
+                        usage.record_usage(
+                            operation, provider.model or self.model,
+                            usage.normalize_usage(None, self._prompt_text(data), "".join(chunks)),
+                            time.monotonic() - started_at
+                        )
+                    raise
+                except requests.exceptions.HTTPError as e:
+                    status_code = e.response.status_code if e.response is not None else 0
+                    error = DeepSeekError(str(e), retryable=resilience.is_retryable_status(status_code))
+                except requests.exceptions.RequestException as e:
+                    error = DeepSeekError(f"DeepSeek流式请求失败: {str(e)}", retryable=True)
+                except ValueError as e:
+                    error = DeepSeekError(f"DeepSeek流式响应格式错误: {str(e)}", retryable=True)
+                finally:
+                    if not recorded and error is None:
+                        # 收到输出前出现意外异常，无法判断上游状况，只归还半开探测名额
+                        resilience.circuit_breaker.release_probe()
+            
+            logger.error(str(error))
+            # 输出中途出错同样记为失败（计入连续失败次数），再抛给调用方
+            resilience.record_outcome(error)
+            provider.record_outcome(False)
+            if started:
+                raise error
+            if attempt == self.max_retries - 1 or not resilience.acquire_retry(error):
+                raise error
+            wait_time = resilience.backoff_delay(attempt + 1)
+            logger.info(f"等待 {wait_time:.2f} 秒后重试...")
+            time.sleep(wait_time)
+    
+    def generate_article_outline(self, topic: str, style: str = "专业", strict: bool = False) -> Dict:
+        """生成文章大纲，失败时返回默认大纲；strict 为 True 时抛出异常（后台任务需要失败后重试）"""
+        prompt = prompts.outline_prompt(topic, style)
         
         try:
-            result = self.generate_content(prompt)
-            # 提取JSON部分
-            import re
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                # 如果无法解析JSON，返回默认结构
-                return self._create_default_outline(topic)
+            return self._cached(
+                "outline", {"style": style}, topic,
+                lambda: self._parse_outline(self.generate_content(prompt, operation="outline"))
+            )
         except Exception as e:
+            # 无法生成或解析JSON时返回默认结构（默认结构不会被缓存）
             logger.error(f"生成大纲失败: {e}")
+            if strict:
+                raise
             return self._create_default_outline(topic)
     
+    def _parse_outline(self, result: str) -> Dict:
+        """从模型输出中提取大纲JSON"""
+        json_match = re.search(r'\{.*\}', result, re.DOTALL)
+        if not json_match:
+            raise ValueError("返回内容中没有JSON")
+        return json.loads(json_match.group())
+    
     def _create_default_outline(self, topic: str) -> Dict:
         """创建默认大纲"""
         return {
@@ -171,157 +316,246 @@ JSON格式示例：
             ]
         }
     
-    def improve_writing(self, content: str, improve_type: str = "style") -> Dict:
-        """文章润色优化"""
-        improve_prompts = {
-            "grammar": f"""请修正以下内容的语法错误和拼写错误，保持原意不变：
-
-{content}
-
-要求：
-1. 只修正错误，不要改变内容结构
-2. 保持专业的技术文档风格
-3. 直接返回修正后的内容""",
-
-            "style": f"""请优化以下内容的写作风格，使其更加专业、流畅：
-
-{content}
-
-要求：
-1. 保持核心内容不变
-2. 优化句子结构和表达方式
-3. 提升技术文档的专业性和可读性
-4. 直接返回优化后的内容""",
-
-            "expand": f"""请扩展以下内容，增加技术细节和深度：
-
-{content}
-
-要求：
-1. 保持原文主旨和技术准确性
-2. 增加相关的技术细节和实际例子
-3. 扩展后的内容应该是原文的1.5-2倍长度
-4. 直接返回扩展后的内容"""
-        }
+    def improve_writing(self, content: str, improve_type: str = "style", mode: str = None,
+                        strict: bool = False) -> Dict:
+        """文章润色优化
+        
+        mode:
+        - parallel: 润色、写作建议、质量评分三个调用并发执行，共享同一个截止时间
+        - structured: 一次调用以JSON格式同时返回三项结果，解析失败时退回 parallel
         
-        prompt = improve_prompts.get(improve_type, improve_prompts["style"])
+        润色失败时返回原文；strict 为 True 时抛出异常（建议和评分失败仍使用默认值）。
+        """
+        mode = mode or DeepSeekConfig.IMPROVE_MODE
+        deadline = time.monotonic() + DeepSeekConfig.IMPROVE_DEADLINE
+        
+        if mode == "structured":
+            try:
+                return self._improve_structured(content, improve_type, deadline)
+            except Exception as e:
+                logger.warning(f"结构化润色失败，改用并发模式: {e}")
+        
+        return self._improve_parallel(content, improve_type, deadline, strict)
+    
+    def _improve_parallel(self, content: str, improve_type: str, deadline: float, strict: bool = False) -> Dict:
+        """并发执行润色、写作建议和质量评分"""
+        prompt = prompts.improve_prompt(content, improve_type)
+        
+        # 建议和评分只依赖原文，提交到线程池与润色并发执行（携带当前上下文，用量记到同一用户）
+        suggestions_future = _fanout_executor.submit(
+            contextvars.copy_context().run, self._generate_writing_suggestions, content, deadline
+        )
+        rating_future = _fanout_executor.submit(
+            contextvars.copy_context().run, self._rate_writing_quality, content, deadline
+        )
         
         try:
-            improved_content = self.generate_content(prompt, max_tokens=4000)
-            
-            return {
-                "improved_content": improved_content,
-                "suggestions": self._generate_writing_suggestions(content),
-                "overall_rating": self._rate_writing_quality(content),
-                "provider": "deepseek"
-            }
+            improved_content = self.generate_content(prompt, max_tokens=4000, deadline=deadline, operation="improve")
         except Exception as e:
             logger.error(f"文章优化失败: {e}")
-            return {
-                "improved_content": content,
-                "suggestions": ["AI服务暂时不可用"],
-                "overall_rating": "N/A",
-                "provider": "deepseek"
-            }
+            suggestions_future.cancel()
+            rating_future.cancel()
+            if strict:
+                raise
+            return self._improvement_unavailable(content)
+        
+        return {
+            "improved_content": improved_content,
+            "suggestions": self._future_result(suggestions_future, deadline, DEFAULT_WRITING_SUGGESTIONS),
+            "overall_rating": self._future_result(rating_future, deadline, DEFAULT_WRITING_RATING),
+            "provider": "deepseek"
+        }
+    
+    def _improvement_unavailable(self, content: str) -> Dict:
+        """润色失败时返回原文"""
+        return {
+            "improved_content": content,
+            "suggestions": ["AI服务暂时不可用"],
+            "overall_rating": "N/A",
+            "provider": "deepseek"
+        }
+    
+    def _future_result(self, future, deadline: float, default):
+        """在截止时间内获取并发子任务的结果，超时或出错时返回默认值"""
+        try:
+            return future.result(timeout=max(0, deadline - time.monotonic()))
+        except Exception as e:
+            future.cancel()
+            logger.warning(f"并发子任务未在截止时间内完成: {e}")
+            return default
+    
+    def _improve_structured(self, content: str, improve_type: str, deadline: float) -> Dict:
+        """一次调用同时返回润色结果、写作建议和质量评分"""
+        prompt = prompts.structured_improve_prompt(content, improve_type)
+        result = self.generate_content(prompt, max_tokens=4500, deadline=deadline, json_mode=True,
+                                       operation="improve")
+        return self._parse_structured_improvement(result)
+    
+    def _parse_structured_improvement(self, result: str) -> Dict:
+        """解析结构化润色结果"""
+        json_match = re.search(r'\{.*\}', result, re.DOTALL)
+        if not json_match:
+            raise ValueError("返回内容中没有JSON")
+        data = json.loads(json_match.group())
+        
+        improved_content = data.get("improved_content")
+        if not improved_content:
+            raise ValueError("返回结果缺少 improved_content")
+        
+        suggestions = [str(item).strip() for item in data.get("suggestions") or [] if str(item).strip()][:3]
+        return {
+            "improved_content": improved_content,
+            "suggestions": suggestions or DEFAULT_WRITING_SUGGESTIONS,
+            "overall_rating": self._parse_rating(str(data.get("rating", ""))) or DEFAULT_WRITING_RATING,
+            "provider": "deepseek"
+        }
     
-    def _generate_writing_suggestions(self, content: str) -> List[str]:
+    def _generate_writing_suggestions(self, content: str, deadline: Optional[float] = None) -> List[str]:
         """生成写作建议"""
         if len(content) < 50:
             return ["内容较短，建议扩展更多技术细节"]
         
-        prompt = f"""请为以下技术内容提供3条具体的写作改进建议：
-
-{content[:800]}
-
-要求：
-1. 针对技术文档的特点提出建议
-2. 每条建议要具体可行
-3. 用中文返回，用分号分隔
-4. 不要编号，直接返回建议内容"""
-        
         try:
-            suggestions = self.generate_content(prompt, max_tokens=500)
-            return [s.strip() for s in suggestions.split(";") if s.strip()][:3]
+            text = chunking.leading_text(content, DeepSeekConfig.SUGGESTIONS_MAX_CHARS)
+            suggestions = self.generate_content(prompts.suggestions_prompt(text), max_tokens=500,
+                                                deadline=deadline, operation="suggestions")
+            return self._parse_suggestions(suggestions)
         except:
-            return [
-                "建议：优化技术术语的使用一致性",
-                "建议：增加具体的代码或配置示例", 
-                "建议：改善段落之间的逻辑衔接"
-            ]
+            return DEFAULT_WRITING_SUGGESTIONS
     
-    def _rate_writing_quality(self, content: str) -> str:
+    def _parse_suggestions(self, text: str) -> List[str]:
+        """解析分号分隔的写作建议"""
+        return [s.strip() for s in text.split(";") if s.strip()][:3]
+    
+    def _rate_writing_quality(self, content: str, deadline: Optional[float] = None) -> str:
         """评估写作质量"""
         if len(content) < 50:
             return "内容过短"
         
-        prompt = f"""请从技术文档的角度评估以下内容的写作质量（满分10分）：
-
-{content[:500]}
-
-要求：
-1. 从专业性、清晰度、逻辑性等方面评估
-2. 只返回分数数字
-3. 不要其他文字"""
-        
         try:
-            rating = self.generate_content(prompt, max_tokens=10)
-            # 提取数字
-            import re
-            numbers = re.findall(r'\d+', rating)
-            if numbers:
-                score = min(10, max(1, int(numbers[0])))
-                return f"{score}/10"
+            rating = self.generate_content(prompts.rating_prompt(content), max_tokens=10,
+                                           deadline=deadline, operation="rating")
+            score = self._parse_rating(rating)
+            if score:
+                return score
         except:
             pass
         
-        return "8/10"  # 默认评分
+        return DEFAULT_WRITING_RATING
+    
+    def _parse_rating(self, text: str) -> Optional[str]:
+        """从模型输出中提取评分"""
+        numbers = re.findall(r'\d+', text)
+        if numbers:
+            score = min(10, max(1, int(numbers[0])))
+            return f"{score}/10"
+        return None
+    
+    def _map_bounded(self, fn, items: List) -> List:
+        """在共享线程池中并发执行 fn(item)，同时最多 CHUNK_CONCURRENCY 个，出错的项结果为 None"""
+        results = [None] * len(items)
+        pending = {}
+        queue = iter(enumerate(items))
+        
+        def submit_next():
+            for index, item in queue:
+                future = _fanout_executor.submit(contextvars.copy_context().run, fn, item)
+                pending[future] = index
+                return
+        
+        for _ in range(DeepSeekConfig.CHUNK_CONCURRENCY):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.warning(f"分块任务失败: {e}")
+                submit_next()
+        return results
+    
+    def _summarize_chunk(self, chunk: str) -> str:
+        """摘要单个分块，结果按分块内容缓存，只修改一个章节时其他分块直接命中缓存"""
+        return self._cached(
+            "chunk_summary", {}, chunk,
+            lambda: self.generate_content(
+                prompts.chunk_summary_prompt(chunk), max_tokens=400, operation="chunk_summary"
+            )
+        )
     
-    def generate_summary(self, content: str, max_length: int = 200) -> str:
-        """生成文章摘要"""
+    def _reduce_chunks(self, chunks: List[str], results: List[Optional[str]]) -> List[str]:
+        """把各分块的摘要重新分块；个别分块失败时用其开头代替，全部失败时抛出异常"""
+        if not any(results):
+            raise Exception("分块摘要全部失败")
+        summaries = [result or chunk[:300] for chunk, result in zip(chunks, results)]
+        return chunking.split_chunks("\n\n".join(summaries))
+    
+    def _article_digest(self, content: str) -> str:
+        """文章的纯文本底稿：短文章为全文，长文章为各分块摘要合并后的文本（map-reduce）"""
+        chunks = chunking.split_chunks(content)
+        for _ in range(DeepSeekConfig.CHUNK_REDUCE_MAX_DEPTH):
+            if len(chunks) <= 1:
+                break
+            chunks = self._reduce_chunks(chunks, self._map_bounded(self._summarize_chunk, chunks))
+        return "\n\n".join(chunks)
+    
+    def generate_summary(self, content: str, max_length: int = 200, strict: bool = False) -> str:
+        """生成文章摘要
+        
+        长文章先按段落/标题分块并发摘要，再基于分块摘要生成最终摘要。
+        失败时返回截断的原文；strict 为 True 时抛出异常（批量处理需要区分成功和失败）。
+        """
         if len(content) < 100:
             return content
         
-        prompt = f"""请为以下技术文章生成一个简洁的摘要，长度不超过{max_length}字：
-
-{content[:3000]}
-
-要求：
-1. 抓住技术核心观点和关键信息
-2. 突出技术要点和实践价值
-3. 语言精炼，逻辑清晰
-4. 直接返回摘要内容"""
-        
         try:
-            summary = self.generate_content(prompt, max_tokens=300)
-            if len(summary) > max_length:
-                summary = summary[:max_length] + "..."
-            return summary
+            text = self._article_digest(content)
+            prompt = prompts.summary_prompt(text, max_length)
+            summary = self._cached(
+                "summary", {"max_length": max_length}, text,
+                lambda: self.generate_content(prompt, max_tokens=300, operation="summary")
+            )
+            return self._truncate_summary(summary, max_length)
         except Exception as e:
             logger.error(f"生成摘要失败: {e}")
-            return content[:max_length] + ("..." if len(content) > max_length else "")
+            if strict:
+                raise
+            return self._truncate_summary(content, max_length)
+    
+    def _truncate_summary(self, summary: str, max_length: int) -> str:
+        """按最大长度截断摘要"""
+        if len(summary) > max_length:
+            return summary[:max_length] + "..."
+        return summary
     
-    def generate_tags(self, content: str, count: int = 5) -> List[str]:
-        """生成文章标签"""
+    def generate_tags(self, content: str, count: int = 5, strict: bool = False) -> List[str]:
+        """生成文章标签，长文章基于分块摘要（与 generate_summary 共用分块缓存）
+        
+        失败时返回默认标签；strict 为 True 时抛出异常。
+        """
         if len(content) < 50:
             return ["技术", "文档"]
         
-        prompt = f"""根据以下技术内容，生成{count}个相关的技术标签：
-
-{content[:1500]}
-
-要求：
-1. 标签要体现技术关键词
-2. 每个标签2-4个汉字
-3. 用中文逗号分隔返回
-4. 不要其他文字"""
-        
         try:
-            result = self.generate_content(prompt, max_tokens=100)
-            tags = [tag.strip() for tag in result.split("，") if tag.strip()]
-            unique_tags = list(dict.fromkeys(tags))[:count]
-            return unique_tags if unique_tags else ["技术", "开发", "文档", "实践"]
-        except:
-            return ["技术", "开发", "文档", "实践", "总结"]
+            text = self._article_digest(content)
+            prompt = prompts.tags_prompt(text, count)
+            result = self._cached(
+                "tags", {"count": count}, text,
+                lambda: self.generate_content(prompt, max_tokens=100, operation="tags")
+            )
+            return self._parse_tags(result, count)
+        except Exception:
+            if strict:
+                raise
+            return DEFAULT_TAGS
+    
+    def _parse_tags(self, result: str, count: int) -> List[str]:
+        """解析中文逗号分隔的标签并去重"""
+        tags = [tag.strip() for tag in result.split("，") if tag.strip()]
+        unique_tags = list(dict.fromkeys(tags))[:count]
+        return unique_tags if unique_tags else ["技术", "开发", "文档", "实践"]
 
 # 全局DeepSeek服务实例
 deepseek_service = DeepSeekService()
\ No newline at end of file
@@ -0,0 +1,27 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from articles.models import Article
+
+from . import retrieval
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Article)
+def update_retrieval_index(sender, instance, raw=False, **kwargs):
+    """文章保存后增量更新知识库检索索引"""
+    if raw:
+        return
+    try:
+        retrieval.update_article(instance)
+    except Exception as e:
+        # 其他进程或下次同步时会按 updated_at 重新索引
+        logger.warning(f"更新文章 #{instance.pk} 的检索索引失败: {e}")
+
+
+@receiver(post_delete, sender=Article)
+def remove_from_retrieval_index(sender, instance, **kwargs):
+    retrieval.remove_article(instance)
@@ -0,0 +1,35 @@
+import json
+from typing import Dict, Iterable
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def sse_response(events: Iterable[str]) -> StreamingHttpResponse:
+    """构造SSE流式响应"""
+    response = StreamingHttpResponse(events, content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # 禁止Nginx等反向代理缓冲，保证token到达后立即推送给浏览器
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class EventStreamRenderer(BaseRenderer):
+    """text/event-stream 渲染器
+
+    让 Accept: text/event-stream 的请求通过内容协商；
+    流式接口在出错时返回的普通 Response 会被渲染为一条 error 事件。
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return sse_event('error', data).encode(self.charset)
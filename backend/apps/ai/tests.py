@@ -0,0 +1,906 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+from unittest import mock
+
+import httpx
+import requests
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from config.testing import QueryBudgetMixin
+from users.models import User
+
+from articles.models import Article
+
+from . import batch, completion, jobs, retrieval, throttling
+from .models import AIAssistantSession, AIJob, AIMessage, AIRateBucket, AIUsageDaily
+from .resilience import CircuitBreaker, DeepSeekError, RetryBudget
+from .routing import Provider, ProviderRouter
+from .async_services import async_deepseek_service
+from .cache import ResultCache
+from .client import AsyncDeepSeekHTTPClient, DeepSeekHTTPClient, RequestCancelled
+from .config import DeepSeekConfig
+from .scheduler import QueueTimeoutError, Scheduler
+from .services import deepseek_service
+from .views import AIAssistantViewSet
+
+
+def create_sessions(user, count, messages_per_session=4):
+    """批量创建会话，每个会话一问一答交替的若干消息"""
+    sessions = AIAssistantSession.objects.bulk_create([
+        AIAssistantSession(user=user, title=f'会话 {i}') for i in range(count)
+    ])
+    AIMessage.objects.bulk_create([
+        AIMessage(session=session, content=f'消息 {j}', is_user=j % 2 == 0)
+        for session in sessions
+        for j in range(messages_per_session)
+    ])
+    return sessions
+
+
+class AIQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """AI接口的查询次数与会话数、消息数、任务数无关"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123')
+        cls.sessions = create_sessions(cls.user, 10)
+        AIJob.objects.bulk_create([
+            AIJob(user=cls.user, job_type='summary', params={}, available_at=timezone.now()) for _ in range(10)
+        ])
+        today = timezone.localdate()
+        AIUsageDaily.objects.bulk_create([
+            AIUsageDaily(user=cls.user, date=today - timedelta(days=i), requests=i, total_tokens=i * 100)
+            for i in range(10)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_session_list(self):
+        grow = lambda: create_sessions(self.user, 20, messages_per_session=10)
+        self.assertQueryCountConstant(lambda: self.get('/api/ai/sessions/'), grow, 1)
+
+    def test_session_retrieve(self):
+        session = self.sessions[0]
+        grow = lambda: AIMessage.objects.bulk_create([AIMessage(session=session, content='更多') for _ in range(30)])
+        self.assertQueryCountConstant(lambda: self.get(f'/api/ai/sessions/{session.pk}/'), grow, 1)
+
+    def test_messages(self):
+        session = self.sessions[0]
+        grow = lambda: AIMessage.objects.bulk_create([AIMessage(session=session, content='更多') for _ in range(80)])
+        # 会话 + 标记中断的回复 + 一页消息
+        self.assertQueryCountConstant(lambda: self.get(f'/api/ai/sessions/{session.pk}/messages/'), grow, 3)
+
+    def test_job_list(self):
+        grow = lambda: AIJob.objects.bulk_create([
+            AIJob(user=self.user, job_type='tags', params={}, available_at=timezone.now()) for _ in range(20)
+        ])
+        self.assertQueryCountConstant(lambda: self.get('/api/ai/jobs/'), grow, 1)
+
+    def test_usage(self):
+        self.assertQueryCountConstant(
+            lambda: self.get('/api/ai/usage/', {'days': 30}),
+            lambda: create_sessions(self.user, 20),
+            2
+        )
+
+
+# run_job 在工作线程中开始和结束时关闭数据库连接，测试在同一个事务中运行，不能关闭
+@mock.patch('apps.ai.jobs.close_old_connections', lambda: None)
+class AIJobRetryTests(TestCase):
+    """上游调用失败的后台任务按退避重试，用完次数后标记失败，不保存兜底结果"""
+
+    CONTENT = '知识库系统需要在编辑器中提供AI辅助写作功能。' * 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123')
+
+    def run_claimed(self):
+        claimed = jobs.claim_jobs('test-worker', 1)
+        self.assertEqual(len(claimed), 1)
+        return jobs.run_job(claimed[0], 'test-worker')
+
+    def test_upstream_failure_is_retried_then_failed(self):
+        params = {
+            'summary': {'content': self.CONTENT},
+            'tags': {'content': self.CONTENT},
+            'outline': {'topic': '知识库系统设计'},
+            'improve': {'content': self.CONTENT, 'mode': 'parallel'},
+        }
+        failing = mock.patch.object(deepseek_service, 'generate_content',
+                                    side_effect=DeepSeekError('DeepSeek API错误: 503', retryable=True))
+        for job_type, job_params in params.items():
+            with self.subTest(job_type=job_type), failing:
+                job = jobs.submit_job(self.user, job_type, job_params)
+                job.max_attempts = 2
+                job.save()
+
+                self.assertEqual(self.run_claimed(), 'pending')
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts, job.result), ('pending', 1, None))
+                self.assertIn('503', job.error)
+                self.assertGreater(job.available_at, timezone.now())
+
+                AIJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+                self.assertEqual(self.run_claimed(), 'failed')
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts, job.result), ('failed', 2, None))
+                self.assertIsNotNone(job.finished_at)
+
+    def test_success_saves_result(self):
+        with mock.patch.object(deepseek_service, 'generate_content', return_value='知识库，编辑器，AI写作'):
+            jobs.submit_job(self.user, 'tags', {'content': self.CONTENT + '成功'})
+            self.assertEqual(self.run_claimed(), 'succeeded')
+        job = AIJob.objects.get(user=self.user)
+        self.assertEqual(job.result, {'tags': ['知识库', '编辑器', 'AI写作']})
+
+
+async def settle():
+    """让已就绪的协程都运行到下一个等待点"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class SchedulerTests(SimpleTestCase):
+    """调度器的优先级、预留名额、同级用户轮转和排队超时"""
+
+    def test_released_slot_goes_to_highest_priority(self):
+        async def scenario():
+            scheduler = Scheduler(max_in_flight=2, interactive_reserved=1)
+            held = [await scheduler.aacquire('interactive') for _ in range(2)]
+            order = []
+
+            async def wait(priority):
+                waiter = await scheduler.aacquire(priority)
+                order.append(priority)
+                return waiter
+
+            tasks = [asyncio.create_task(wait(priority)) for priority in ('batch', 'editing', 'interactive')]
+            await settle()
+            self.assertEqual(order, [])
+            for waiter in held:
+                scheduler.release(waiter)
+                await settle()
+            self.assertEqual(order, ['interactive', 'editing'])
+            scheduler.release(tasks[2].result())
+            await settle()
+            self.assertEqual(order, ['interactive', 'editing', 'batch'])
+
+        asyncio.run(scenario())
+
+    def test_interactive_reserved_slots(self):
+        scheduler = Scheduler(max_in_flight=4, interactive_reserved=1)
+        editing = [scheduler.acquire('editing') for _ in range(3)]
+        with self.assertRaises(QueueTimeoutError):
+            scheduler.acquire('editing', deadline=time.monotonic() + 0.05)
+        # editing 已用满 总名额-预留，补全和对话仍能立即取得预留的名额
+        interactive = scheduler.acquire('interactive', deadline=time.monotonic() + 0.05)
+        stats = scheduler.stats()
+        self.assertEqual(stats['in_flight'], 4)
+        self.assertEqual(stats['classes']['editing']['shed'], 1)
+        self.assertEqual(stats['classes']['editing']['queue_depth'], 0)
+
+        for waiter in editing + [interactive]:
+            scheduler.release(waiter)
+        self.assertEqual(scheduler.stats()['in_flight'], 0)
+
+    def test_batch_limited_to_half(self):
+        scheduler = Scheduler(max_in_flight=4, interactive_reserved=1)
+        batch = [scheduler.acquire('batch') for _ in range(2)]
+        with self.assertRaises(QueueTimeoutError):
+            scheduler.acquire('batch', deadline=time.monotonic() + 0.05)
+        scheduler.release(scheduler.acquire('editing'))
+        for waiter in batch:
+            scheduler.release(waiter)
+
+    def test_same_priority_round_robin_by_user(self):
+        async def scenario():
+            scheduler = Scheduler(max_in_flight=1, interactive_reserved=0)
+            held = await scheduler.aacquire('editing', user_id=1)
+            order = []
+
+            async def wait(user_id):
+                waiter = await scheduler.aacquire('editing', user_id=user_id)
+                order.append(user_id)
+                scheduler.release(waiter)
+
+            tasks = [asyncio.create_task(wait(user_id)) for user_id in (1, 1, 1, 2)]
+            await settle()
+            scheduler.release(held)
+            await asyncio.gather(*tasks)
+            self.assertEqual(order, [1, 2, 1, 1])
+
+        asyncio.run(scenario())
+
+    def test_cancelled_async_waiter_leaves_queue(self):
+        async def scenario():
+            scheduler = Scheduler(max_in_flight=1, interactive_reserved=0)
+            held = await scheduler.aacquire('interactive')
+            task = asyncio.create_task(scheduler.aacquire('interactive'))
+            await settle()
+            self.assertEqual(scheduler.stats()['classes']['interactive']['queue_depth'], 1)
+            task.cancel()
+            await settle()
+            self.assertEqual(scheduler.stats()['classes']['interactive']['queue_depth'], 0)
+            scheduler.release(held)
+            self.assertEqual(scheduler.stats()['in_flight'], 0)
+
+        asyncio.run(scenario())
+
+    def test_async_service_waits_for_slot(self):
+        """异步接口的上游调用同样受调度器名额限制"""
+        scheduler = Scheduler(max_in_flight=1, interactive_reserved=0)
+        router = mock.Mock(apost=mock.AsyncMock())
+
+        async def scenario():
+            held = await scheduler.aacquire('editing')
+            with self.assertRaises(QueueTimeoutError):
+                await async_deepseek_service.agenerate_content('测试', operation='auto_complete')
+            router.apost.assert_not_called()
+            scheduler.release(held)
+
+        with mock.patch('apps.ai.async_services.scheduler', scheduler), \
+                mock.patch.dict(DeepSeekConfig.SCHEDULER_MAX_WAIT, {'interactive': 0.05}), \
+                mock.patch.object(async_deepseek_service, 'api_key', 'test-key'), \
+                mock.patch('apps.ai.async_services.routing.get_router', return_value=router):
+            asyncio.run(scenario())
+
+
+class ThrottlingTests(TestCase):
+    """令牌桶的扣除、补充、拒绝和退回"""
+
+    def setUp(self):
+        self.now = 1_000_000.0
+        patcher = mock.patch('apps.ai.throttling.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tokens(self, key):
+        return AIRateBucket.objects.get(key=key).tokens
+
+    def test_debit_and_rejection(self):
+        self.assertIsNone(throttling._take('test', '2/min', 1, 1))
+        self.assertIsNone(throttling._take('test', '2/min', 1, 1))
+        self.assertEqual(self.tokens('test'), 0)
+        # 每30秒补充1个
+        self.assertAlmostEqual(throttling._take('test', '2/min', 1, 1), 30)
+        self.assertEqual(self.tokens('test'), 0)
+
+    def test_refill_up_to_capacity(self):
+        throttling._take('test', '2/min', 2, 2)
+        self.now += 15
+        self.assertAlmostEqual(throttling._take('test', '2/min', 1, 1), 15)
+        self.now += 15
+        self.assertIsNone(throttling._take('test', '2/min', 1, 1))
+        self.assertEqual(self.tokens('test'), 0)
+        self.now += 3600
+        self.assertIsNone(throttling._take('test', '2/min', 1, 1))
+        self.assertEqual(self.tokens('test'), 1)
+
+    def test_charge_without_require_goes_negative(self):
+        throttling._take('test', '10/min', 25, None)
+        self.assertEqual(self.tokens('test'), -10)
+        # 欠下的部分补回之前只读检查也不通过
+        self.assertIsNotNone(throttling._take('test', '10/min', 0, 1e-9))
+        self.now += 61
+        self.assertIsNone(throttling._take('test', '10/min', 0, 1e-9))
+
+    def test_global_rejection_refunds_user_bucket(self):
+        with mock.patch.object(DeepSeekConfig, 'THROTTLE_ENABLED', True), \
+                mock.patch.object(DeepSeekConfig, 'THROTTLE_RATES', {'ai_chat': '10/min'}), \
+                mock.patch.object(DeepSeekConfig, 'THROTTLE_GLOBAL_REQUEST_RATE', '1/min'):
+            self.assertIsNone(throttling.check_request(1, 'ai_chat'))
+            self.assertIsNotNone(throttling.check_request(1, 'ai_chat'))
+            self.assertIsNotNone(throttling.check_request(2, 'ai_chat'))
+        self.assertEqual(self.tokens('user:1:ai_chat'), 9)
+        self.assertEqual(self.tokens('user:2:ai_chat'), 10)
+        self.assertEqual(self.tokens('global:requests'), 0)
+
+    def test_retry_uses_chat_scope(self):
+        self.assertEqual(AIAssistantViewSet.throttle_scopes['retry'], 'ai_chat')
+
+
+class ResultCacheSingleFlightTests(SimpleTestCase):
+    """相同key的并发请求只计算一次，错误传给所有等待者且不缓存"""
+
+    def setUp(self):
+        self.cache = ResultCache(max_entries=10, ttl=60, store_ttl=60)
+        # 只测试进程内的 single-flight，不读写数据库缓存
+        for name, value in (('_get_stored', (False, None)), ('_set_stored', None)):
+            patcher = mock.patch.object(self.cache, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = 0
+
+    def test_sync_concurrent_calls_compute_once(self):
+        started, release = threading.Event(), threading.Event()
+
+        def compute():
+            self.calls += 1
+            started.set()
+            release.wait(5)
+            return '结果'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.cache.get_or_compute('k', compute)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(self.cache.get_or_compute('k', compute)))
+                     for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        while self.cache.stats()['coalesced'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(results, ['结果'] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.get_or_compute('k', compute), '结果')
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_async_concurrent_calls_compute_once(self):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return '结果'
+
+        async def scenario():
+            return await asyncio.gather(*(self.cache.aget_or_compute('k', compute) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(scenario()), ['结果'] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats()['coalesced'], 4)
+        self.assertEqual(self.cache.stats()['in_flight'], 0)
+
+    def test_async_error_reaches_all_waiters_and_is_not_cached(self):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            raise DeepSeekError('DeepSeek API错误: 503', retryable=True)
+
+        async def scenario():
+            return await asyncio.gather(*(self.cache.aget_or_compute('k', compute) for _ in range(3)),
+                                        return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(isinstance(result, DeepSeekError) for result in results))
+        self.assertEqual(self.calls, 1)
+        asyncio.run(scenario())
+        self.assertEqual(self.calls, 2)
+
+    def test_async_leader_cancel_does_not_cancel_waiters(self):
+        async def scenario():
+            gate = asyncio.Event()
+            # 第 n 次调用 compute 时设置 started[n]；读数据库缓存要经过线程池，不能只靠 settle() 等待
+            started = {1: asyncio.Event(), 2: asyncio.Event()}
+
+            async def compute():
+                self.calls += 1
+                started[self.calls].set()
+                await gate.wait()
+                return f'结果 {self.calls}'
+
+            leader = asyncio.create_task(self.cache.aget_or_compute('k', compute))
+            await asyncio.wait_for(started[1].wait(), 1)
+            follower = asyncio.create_task(self.cache.aget_or_compute('k', compute))
+            await settle()
+            self.assertEqual(self.cache.stats()['coalesced'], 1)
+            leader.cancel()
+            # 等待者接着计算，而不是随计算的请求一起被取消
+            await asyncio.wait_for(started[2].wait(), 1)
+            self.assertEqual(self.calls, 2)
+            gate.set()
+            self.assertEqual(await asyncio.wait_for(follower, 1), '结果 2')
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+
+        asyncio.run(scenario())
+        self.assertEqual(self.cache.stats()['in_flight'], 0)
+
+
+class _FakeClient:
+    """按固定延迟返回的上游，收到取消信号时抛出 RequestCancelled"""
+
+    base_url = 'http://fake'
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def post(self, path, headers, json, total_timeout=None, cancel=None):
+        if cancel.wait(self.delay):
+            raise RequestCancelled("请求已取消")
+        return mock.Mock(status_code=200)
+
+
+@mock.patch.object(DeepSeekConfig, 'HEDGE_ENABLED', True)
+class HedgeLatencyTests(SimpleTestCase):
+    """对冲中被取消的一方的耗时作为下限记入延迟样本"""
+
+    def test_cancelled_loser_recorded_as_lower_bound(self):
+        primary = Provider('primary', _FakeClient(delay=5))
+        backup = Provider('backup', _FakeClient(delay=0))
+        for _ in range(Provider.MIN_SAMPLES):
+            primary.record('summary', 0.05, success=True)
+        router = ProviderRouter([primary, backup], hedge_percentile=95, hedge_min_delay=0.05,
+                                hedge_budget=RetryBudget(ratio=1, min_per_second=10))
+
+        provider, response = router.post('/chat/completions', {}, {}, operation='summary')
+        self.assertIs(provider, backup)
+        deadline = time.monotonic() + 5
+        while primary.stats()['cancelled'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(primary.stats()['cancelled'], 1)
+        self.assertEqual(primary.stats()['errors'], 0)
+        samples = primary._samples['summary']
+        self.assertEqual(len(samples), Provider.MIN_SAMPLES + 1)
+        self.assertGreaterEqual(samples[-1], 0.05)
+
+
+class _FakeAsyncClient:
+    """异步上游：等待 delay 秒后返回固定的补全结果，记录收到的请求体"""
+
+    def __init__(self, delay, content='结果'):
+        self.delay = delay
+        self.content = content
+        self.requests = []
+
+    async def post(self, path, json, headers=None, total_timeout=None):
+        self.requests.append(json)
+        await asyncio.sleep(self.delay)
+        return httpx.Response(200, json={'choices': [{'message': {'content': self.content}}]})
+
+
+def async_provider(name, delay, model=None, content='结果'):
+    provider = Provider(name, _FakeClient(delay=0), model=model)
+    provider.async_client = lambda client=_FakeAsyncClient(delay, content): client
+    return provider
+
+
+@mock.patch.object(DeepSeekConfig, 'HEDGE_ENABLED', True)
+class AsyncRoutingTests(SimpleTestCase):
+    """异步调用同样经过路由器：选择上游、对冲、记录延迟和实际使用的模型"""
+
+    def test_async_hedge(self):
+        primary = async_provider('primary', delay=5, content='主上游')
+        backup = async_provider('backup', delay=0, content='备用上游')
+        for _ in range(Provider.MIN_SAMPLES):
+            primary.record('summary', 0.05, success=True)
+        router = ProviderRouter([primary, backup], hedge_percentile=95, hedge_min_delay=0.05,
+                                hedge_budget=RetryBudget(ratio=1, min_per_second=10))
+
+        async def scenario():
+            provider, response = await router.apost('/chat/completions', {}, {}, operation='summary')
+            await settle()
+            return provider, response
+
+        provider, response = asyncio.run(scenario())
+        self.assertIs(provider, backup)
+        self.assertEqual(response.json()['choices'][0]['message']['content'], '备用上游')
+        self.assertEqual(backup.stats()['wins'], 1)
+        # 落后的主请求被取消，耗时作为下限记入样本
+        self.assertEqual(primary.stats()['cancelled'], 1)
+        self.assertEqual(len(primary._samples['summary']), Provider.MIN_SAMPLES + 1)
+        self.assertGreaterEqual(primary._samples['summary'][-1], 0.05)
+
+    def test_async_service_uses_provider_model(self):
+        provider = async_provider('other', delay=0, model='other-model')
+        router = ProviderRouter([provider])
+        with mock.patch('apps.ai.async_services.routing.get_router', return_value=router), \
+                mock.patch('apps.ai.async_services.usage.record_usage') as record_usage, \
+                mock.patch.object(async_deepseek_service, 'api_key', 'test-key'):
+            content = asyncio.run(async_deepseek_service.agenerate_content('测试', operation='summary'))
+        self.assertEqual(content, '结果')
+        self.assertEqual(provider.async_client().requests[0]['model'], 'other-model')
+        self.assertEqual(record_usage.call_args[0][:2], ('summary', 'other-model'))
+        self.assertEqual(provider.stats()['requests'], 1)
+
+
+class ResilienceTests(SimpleTestCase):
+    """熔断器的状态转换和重试预算"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('apps.ai.resilience.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open_breaker(self):
+        breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30, half_open_max_calls=1)
+        for _ in range(3):
+            self.assertTrue(breaker.allow_request())
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        return breaker
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        breaker = self.open_breaker()
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.retry_after(), 30)
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_half_open_probe_success_closes(self):
+        breaker = self.open_breaker()
+        self.now += 30
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        # 探测名额只有一个
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_half_open_probe_failure_reopens(self):
+        breaker = self.open_breaker()
+        self.now += 30
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.stats()['opened'], 2)
+
+    def test_released_probe_allows_next_probe(self):
+        breaker = self.open_breaker()
+        self.now += 30
+        self.assertTrue(breaker.allow_request())
+        breaker.release_probe()
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_retry_budget(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0.1, max_balance=10)
+        for _ in range(10):
+            self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+        # 每个请求存入 ratio 个令牌
+        for _ in range(4):
+            budget.record_request()
+        self.assertTrue(budget.try_acquire())
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+        # 低流量时每秒补充 min_per_second 个
+        self.now += 10
+        self.assertTrue(budget.try_acquire())
+        self.assertEqual(budget.stats()['retries_denied'], 2)
+
+
+class _StreamClient:
+    """流式上游：输出给定的行后抛出 error"""
+
+    base_url = 'http://fake'
+
+    def __init__(self, lines, error=None):
+        self.lines = lines
+        self.error = error
+
+    def stream_lines(self, path, json, headers=None, total_timeout=None):
+        yield from self.lines
+        if self.error is not None:
+            raise self.error
+
+
+class StreamBreakerTests(SimpleTestCase):
+    """流式调用在输出中途失败或提前关闭时同样更新熔断器"""
+
+    TOKEN = 'data: {"choices": [{"delta": {"content": "你好"}}]}'
+
+    def stream(self, client):
+        router = ProviderRouter([Provider('fake', client)])
+        with mock.patch('apps.ai.services.routing.get_router', return_value=router), \
+                mock.patch('apps.ai.services.usage.record_usage'), \
+                mock.patch.object(deepseek_service, 'api_key', 'test-key'):
+            yield from deepseek_service.stream_content('测试')
+
+    def half_open_breaker(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=30, half_open_max_calls=1)
+        breaker.record_failure()
+        breaker._opened_at -= 30
+        patcher = mock.patch('apps.ai.resilience.circuit_breaker', breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return breaker
+
+    def test_mid_stream_failure_recorded(self):
+        breaker = self.half_open_breaker()
+        client = _StreamClient([self.TOKEN], requests.exceptions.ChunkedEncodingError('连接中断'))
+        chunks = []
+        with self.assertRaises(DeepSeekError):
+            for chunk in self.stream(client):
+                chunks.append(chunk)
+        self.assertEqual(chunks, ['你好'])
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats()['failures'], 2)
+
+    def test_unexpected_error_before_output_releases_probe(self):
+        breaker = self.half_open_breaker()
+        with self.assertRaises(RuntimeError):
+            list(self.stream(_StreamClient([], RuntimeError('意外错误'))))
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # 探测名额已归还，下一个请求可以继续探测
+        self.assertEqual(list(self.stream(_StreamClient([self.TOKEN]))), ['你好'])
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class BM25IndexTests(SimpleTestCase):
+    """分块索引的BM25排序、增量更新和删除"""
+
+    def setUp(self):
+        self.index = retrieval.ChunkIndex()
+        self.index.add_article(1, '数据库索引', '联合索引的列顺序决定了能否用于排序。索引覆盖查询时不需要回表。', 1)
+        self.index.add_article(2, '前端组件', '组件拆分要考虑状态的归属，避免层层传递。数据库相关的接口放在服务层。', 1)
+        self.index.add_article(3, '部署流程', '容器镜像在持续集成中构建，发布前运行全部测试。', 1)
+
+    def test_most_relevant_article_ranks_first(self):
+        results = self.index.search('联合索引怎么设计', k=3)
+        self.assertEqual(results[0][1], 1)
+        self.assertTrue(all(results[i][0] >= results[i + 1][0] for i in range(len(results) - 1)))
+        self.assertNotIn(3, [article_id for _, article_id, _ in results])
+
+    def test_rare_terms_weigh_more(self):
+        # “组件”只出现在一篇文章中，“数据库”出现在两篇中
+        self.assertEqual(self.index.search('组件 数据库', k=1)[0][1], 2)
+
+    def test_update_and_remove(self):
+        self.index.add_article(3, '部署流程', '联合索引联合索引联合索引', 2)
+        self.assertEqual(self.index.search('联合索引', k=1)[0][1], 3)
+        # 旧版本不会覆盖新版本
+        self.index.add_article(3, '部署流程', '容器镜像', 1)
+        self.assertEqual(self.index.search('联合索引', k=1)[0][1], 3)
+        self.index.remove_article(3)
+        self.assertEqual([article_id for _, article_id, _ in self.index.search('联合索引', k=3)], [1])
+        self.assertEqual(self.index.search('没有匹配', k=3), [])
+
+
+class _InlineExecutor:
+    """在当前线程中执行提交的任务，测试能看到事务中的数据"""
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+@mock.patch('apps.ai.retrieval.close_old_connections', lambda: None)
+@mock.patch('apps.ai.retrieval._build_executor', _InlineExecutor())
+class RetrievalTests(TestCase):
+    """首次检索时在后台建索引，建好之前不带知识库上下文"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123')
+        cls.relevant = Article.objects.create(
+            title='数据库联合索引', content='联合索引的列顺序决定了能否用于排序和范围查询。' * 3, author=cls.user
+        )
+        Article.objects.create(title='前端组件', content='组件拆分要考虑状态的归属。' * 3, author=cls.user)
+
+    def setUp(self):
+        patcher = mock.patch('apps.ai.retrieval._registry', retrieval._Registry(max_users=4))
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_turn_skips_retrieval_while_index_builds(self):
+        with mock.patch.object(retrieval, '_build_executor') as executor:
+            self.assertEqual(retrieval.retrieve(self.user.pk, '联合索引的列顺序'), [])
+            self.assertEqual(retrieval.retrieve(self.user.pk, '联合索引的列顺序'), [])
+        # 同一用户只提交一次建索引任务
+        executor.submit.assert_called_once_with(self.registry.build, self.user.pk)
+        self.assertIsNone(self.registry.peek(self.user.pk))
+
+    def test_retrieves_after_build(self):
+        self.assertEqual(retrieval.retrieve(self.user.pk, '联合索引的列顺序'), [])
+        results = retrieval.retrieve(self.user.pk, '联合索引的列顺序')
+        self.assertEqual([result['article_id'] for result in results], [self.relevant.pk])
+        self.assertEqual(results[0]['title'], '数据库联合索引')
+
+        # 已加载的索引随文章保存和删除更新
+        article = Article.objects.create(title='联合索引进阶', content='联合索引的列顺序与最左前缀。' * 3,
+                                         author=self.user)
+        results = retrieval.retrieve(self.user.pk, '联合索引的列顺序 最左前缀')
+        self.assertEqual(results[0]['article_id'], article.pk)
+        article.delete()
+        results = retrieval.retrieve(self.user.pk, '联合索引的列顺序 最左前缀')
+        self.assertNotIn(article.pk, [result['article_id'] for result in results])
+
+    def test_batch_summaries_refresh_loaded_index(self):
+        retrieval.retrieve(self.user.pk, '联合索引的列顺序')
+        index = self.registry.peek(self.user.pk)
+        with mock.patch('apps.ai.batch.embeddings.update_article') as update_embedding:
+            batch._save_summaries({self.relevant.pk: '联合索引摘要'})
+        self.relevant.refresh_from_db()
+        # bulk_update 不触发 post_save，写回后仍要更新两个索引
+        self.assertEqual(index.article_versions[self.relevant.pk], self.relevant.updated_at)
+        self.assertEqual([call.args[0].pk for call in update_embedding.call_args_list], [self.relevant.pk])
+
+
+class ChatTurnTests(TestCase):
+    """对话回复以数据库中实际保存的状态为准"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123')
+        cls.session = AIAssistantSession.objects.create(user=cls.user, title='会话')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reply_reports_stored_status_when_turn_was_recovered(self):
+        def generate(*args, **kwargs):
+            # 等待模型期间这条回复已被判定为中断
+            AIMessage.objects.filter(status='pending').update(status='failed', error='已中断')
+            return '迟到的回复'
+
+        with mock.patch.object(deepseek_service, 'generate_content', side_effect=generate):
+            response = self.client.post(f'/api/ai/sessions/{self.session.pk}/chat/', {'message': '你好'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['ai_message']['status'], 'failed')
+        self.assertEqual(response.data['ai_message']['content'], '')
+
+    def test_stream_fails_turn_when_context_cannot_be_built(self):
+        with mock.patch('apps.ai.views.conversation.turn_context', side_effect=RuntimeError('数据库不可用')):
+            response = self.client.post(
+                f'/api/ai/sessions/{self.session.pk}/chat_stream/', {'message': '你好'}, format='json'
+            )
+        self.assertEqual(response.status_code, 500)
+        ai_message = AIMessage.objects.get(session=self.session, is_user=False)
+        self.assertEqual(ai_message.status, 'failed')
+        self.assertEqual(response.data['ai_message']['status'], 'failed')
+
+
+class CompletionTests(SimpleTestCase):
+    """自动补全的结果缓存、上下文截断和取消旧请求"""
+
+    def test_cache_lru_and_ttl(self):
+        now = [100.0]
+        cache = completion.CompletionCache(max_entries=2, ttl=10)
+        with mock.patch('apps.ai.completion.time.monotonic', lambda: now[0]):
+            cache.set('a', '甲')
+            cache.set('b', '乙')
+            self.assertEqual(cache.get('a'), '甲')
+            cache.set('c', '丙')
+            # 最久未使用的 b 被淘汰
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('a'), '甲')
+            now[0] += 11
+            self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 2, 'entries': 1})
+
+    def test_prepare_keys_on_context_window(self):
+        tail = '索引的列顺序决定了能否用于排序。' * 100
+        _, max_tokens, key = completion.prepare('很早之前的内容。' * 200 + tail, '继续', 'inline')
+        _, _, same_key = completion.prepare('完全不同的开头。' * 200 + tail, '继续', 'inline')
+        _, _, other_prompt = completion.prepare(tail, '总结', 'inline')
+        _, full_tokens, full_key = completion.prepare(tail, '继续', 'full')
+        self.assertEqual(key, same_key)
+        self.assertNotEqual(key, other_prompt)
+        self.assertNotEqual(key, full_key)
+        self.assertLess(max_tokens, full_tokens)
+
+    def test_newer_request_cancels_older(self):
+        registry = completion.CancelRegistry()
+        with registry.register(1, 'editor', 1) as first:
+            with registry.register(1, 'editor', 2) as second:
+                self.assertTrue(first.cancelled)
+                self.assertFalse(second.cancelled)
+                # 晚到的旧请求直接作废；其他用户、其他编辑器互不影响
+                with registry.register(1, 'editor', 1) as stale, \
+                        registry.register(2, 'editor', 1) as other_user, \
+                        registry.register(1, 'sidebar', 1) as other_channel:
+                    self.assertTrue(stale.cancelled)
+                    self.assertFalse(other_user.cancelled or other_channel.cancelled)
+                    self.assertFalse(second.cancelled)
+        self.assertEqual(registry.stats(), {'cancelled': 1, 'stale': 1, 'in_flight': 0})
+        with registry.register(1, 'editor', None) as untracked:
+            self.assertFalse(untracked.cancelled)
+            self.assertEqual(registry.stats()['in_flight'], 0)
+
+    def test_cancelled_stream_closes_upstream(self):
+        closed = []
+
+        def upstream(*args, **kwargs):
+            try:
+                yield from ('第一段', '第二段', '第三段')
+            finally:
+                closed.append(True)
+
+        ticket = completion.Ticket(1)
+        received = []
+        with mock.patch.object(deepseek_service, 'stream_content', upstream):
+            for delta in completion.stream(ticket, '提示', 20):
+                received.append(delta)
+                ticket.cancel()
+        self.assertEqual(received, ['第一段'])
+        self.assertEqual(closed, [True])
+
+
+class ClientTimeoutTests(SimpleTestCase):
+    """调用方的剩余时间已用完时不发出请求，直接按超时处理"""
+
+    def test_exhausted_budget_raises_timeout(self):
+        client = DeepSeekHTTPClient(base_url='http://127.0.0.1:9', total_timeout=30)
+        with mock.patch.object(client.session, 'post') as post:
+            for remaining in (0, -0.5):
+                with self.subTest(remaining=remaining):
+                    with self.assertRaises(requests.exceptions.Timeout):
+                        client.post('/chat/completions', json={}, total_timeout=remaining)
+                    with self.assertRaises(requests.exceptions.Timeout):
+                        list(client.stream_lines('/chat/completions', json={}, total_timeout=remaining))
+            post.assert_not_called()
+        self.assertEqual(client.stats()['in_flight'], 0)
+
+    def test_remaining_budget_caps_read_timeout(self):
+        client = DeepSeekHTTPClient(base_url='http://127.0.0.1:9', read_timeout=60, total_timeout=30)
+        response = mock.Mock(status_code=200, iter_content=mock.Mock(return_value=[b'{}']))
+        with mock.patch.object(client.session, 'post', return_value=response) as post:
+            client.post('/chat/completions', json={}, total_timeout=2)
+            client.post('/chat/completions', json={})
+        self.assertEqual(post.call_args_list[0].kwargs['timeout'][1], 2)
+        self.assertEqual(post.call_args_list[1].kwargs['timeout'][1], 30)
+
+    def test_async_exhausted_budget_raises_timeout(self):
+        async def scenario():
+            client = AsyncDeepSeekHTTPClient(base_url='http://127.0.0.1:9')
+            with mock.patch.object(client.client, 'post') as post:
+                for remaining in (0, -0.5):
+                    with self.assertRaises(httpx.TimeoutException):
+                        await client.post('/chat/completions', json={}, total_timeout=remaining)
+                post.assert_not_called()
+            await client.client.aclose()
+
+        asyncio.run(scenario())
+
+
+class SlotDeadlineTests(SimpleTestCase):
+    """排队取得名额时已经过了截止时间：按超时失败，不发出请求"""
+
+    def late_slot(self):
+        @contextmanager
+        def slot(operation, deadline=None):
+            time.sleep(max(0.0, deadline - time.monotonic()) + 0.01)
+            yield
+        return mock.Mock(slot=slot)
+
+    def test_sync_slot_granted_after_deadline(self):
+        router = mock.Mock()
+        with mock.patch('apps.ai.services.scheduler', self.late_slot()), \
+                mock.patch('apps.ai.services.routing.get_router', return_value=router), \
+                mock.patch.object(deepseek_service, 'api_key', 'test-key'):
+            with self.assertRaisesMessage(DeepSeekError, '超时'):
+                deepseek_service.generate_content('测试', deadline=time.monotonic() + 0.02)
+        router.post.assert_not_called()
+
+    def test_async_slot_granted_after_deadline(self):
+        @asynccontextmanager
+        async def aslot(operation, deadline=None):
+            await asyncio.sleep(max(0.0, deadline - time.monotonic()) + 0.01)
+            yield
+
+        router = mock.Mock(apost=mock.AsyncMock())
+        with mock.patch('apps.ai.async_services.scheduler', mock.Mock(aslot=aslot)), \
+                mock.patch('apps.ai.async_services.routing.get_router', return_value=router), \
+                mock.patch.object(async_deepseek_service, 'api_key', 'test-key'):
+            with self.assertRaisesMessage(DeepSeekError, '超时'):
+                asyncio.run(async_deepseek_service.agenerate_content('测试', deadline=time.monotonic() + 0.02))
+        router.apost.assert_not_called()
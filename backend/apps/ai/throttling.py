@@ -0,0 +1,186 @@
+"""AI接口限流：按用户和全局的令牌桶，同时限制请求数和模型token数
+
+每个请求检查四个桶，状态保存在 AIRateBucket 表中，所有工作进程共享：
+- 用户 + 接口范围的请求桶：容量和速率由 THROTTLE_RATES[scope] 配置，每个请求消耗1；
+- 全局请求桶：所有用户、所有AI接口共用；
+- 用户token桶、全局token桶：请求前要求余量大于0，上游调用完成后按实际用量扣除
+  （见 usage.record_usage），余量可以为负，欠下的部分按速率补回之前拒绝新请求。
+
+扣除用一条条件 UPDATE 完成：补充量在数据库中按 updated_at 计算，余量足够才扣除，
+热点的全局桶在并发下也不会丢失更新。任一桶不足时返回429，Retry-After 为该桶补足
+所需的秒数，之前已扣除的桶退回。限流存储出错时放行请求。
+"""
+import logging
+import math
+import threading
+import time
+from typing import Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from rest_framework import exceptions
+from rest_framework.throttling import BaseThrottle
+
+from .config import DeepSeekConfig
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_MIN_WAIT = 1.0  # 条件更新未扣除但读到的余量足够时（并发扣除的间隙），建议的最短等待秒数
+
+_stats_lock = threading.Lock()
+_stats = {'allowed': 0, 'throttled': 0, 'errors': 0}
+
+
+def throttled_message(wait: float) -> str:
+    return f'AI请求过于频繁，请在 {math.ceil(wait)} 秒后重试'
+
+
+class AIThrottled(exceptions.Throttled):
+    """429响应，提示信息使用中文（DRF默认会追加英文的等待时间说明）"""
+
+    def __init__(self, wait: float):
+        super().__init__(wait=wait)
+        self.detail = exceptions.ErrorDetail(throttled_message(wait), code=self.default_code)
+
+
+def parse_rate(rate: str) -> Tuple[float, float]:
+    """'30/min' -> (容量, 每秒补充量)，写法与DRF的限流频率相同"""
+    count, period = rate.split('/')
+    capacity = float(count)
+    return capacity, capacity / _PERIODS[period[0]]
+
+
+def _available(capacity: float, refill: float, now: float):
+    """按经过的时间补充后的余量（数据库表达式），不超过容量"""
+    return Least(Value(capacity), F('tokens') + Greatest(Value(now) - F('updated_at'), Value(0.0)) * Value(refill))
+
+
+def _take(key: str, rate: str, cost: float, require: Optional[float]) -> Optional[float]:
+    """余量不小于 require 时扣除 cost，返回 None；否则返回需要等待的秒数
+
+    cost 可以大于余量（按实际用量扣token），余量最低为 -容量；cost 为负数时退回。
+    require 为 None 时不检查余量直接扣除。
+    """
+    from .models import AIRateBucket
+
+    capacity, refill = parse_rate(rate)
+    now = time.time()
+    buckets = AIRateBucket.objects.filter(key=key)
+    if not cost:
+        # 只检查不扣除，不需要写入
+        row = buckets.values('tokens', 'updated_at').first()
+        tokens = capacity if row is None else min(capacity, row['tokens'] + max(0.0, now - row['updated_at']) * refill)
+        return None if require is None or tokens >= require else (require - tokens) / refill
+
+    for _ in range(2):
+        available = _available(capacity, refill, now)
+        target = buckets
+        if require is not None:
+            # 余量条件和扣除在同一条语句中，数据库保证原子性
+            target = target.alias(available=available).filter(available__gte=require)
+        # MySQL 按顺序执行赋值，tokens 必须在 updated_at 之前计算
+        updated = target.update(
+            tokens=Least(Value(capacity), Greatest(Value(-capacity), available - Value(cost))),
+            updated_at=Greatest(F('updated_at'), Value(now)),
+            version=F('version') + 1,
+        )
+        if updated:
+            return None
+
+        row = buckets.values('tokens', 'updated_at').first()
+        if row is None:
+            if require is not None and capacity < require:
+                return (require - capacity) / refill
+            try:
+                # 放在保存点中，唯一约束冲突时不会破坏外层事务
+                with transaction.atomic():
+                    AIRateBucket.objects.create(key=key, tokens=min(capacity, max(-capacity, capacity - cost)),
+                                                updated_at=now)
+                return None
+            except IntegrityError:
+                # 并发请求刚创建了这个桶，再执行一次条件更新
+                continue
+        if require is not None:
+            tokens = min(capacity, row['tokens'] + max(0.0, now - row['updated_at']) * refill)
+            # 读到的余量足够说明其他请求刚刚扣除过，不放行，稍后重试
+            return max(_MIN_WAIT, (require - tokens) / refill)
+    return _MIN_WAIT
+
+
+def check_request(user_id: int, scope: str) -> Optional[float]:
+    """检查并扣除一次请求，被限流时返回需要等待的秒数"""
+    if not DeepSeekConfig.THROTTLE_ENABLED:
+        return None
+    rate = DeepSeekConfig.THROTTLE_RATES.get(scope)
+    if rate is None:
+        return None
+    # 先检查只读的token桶；请求桶依次扣除，后面的桶不足时退回前面已扣除的
+    checks = [
+        (f'user:{user_id}:tokens', DeepSeekConfig.THROTTLE_USER_TOKEN_RATE, 0, 1e-9),
+        ('global:tokens', DeepSeekConfig.THROTTLE_GLOBAL_TOKEN_RATE, 0, 1e-9),
+        (f'user:{user_id}:{scope}', rate, 1, 1),
+        ('global:requests', DeepSeekConfig.THROTTLE_GLOBAL_REQUEST_RATE, 1, 1),
+    ]
+    taken = []
+    try:
+        for key, bucket_rate, cost, require in checks:
+            wait = _take(key, bucket_rate, cost, require)
+            if wait is not None:
+                for taken_key, taken_rate, taken_cost in taken:
+                    _take(taken_key, taken_rate, -taken_cost, None)
+                with _stats_lock:
+                    _stats['throttled'] += 1
+                logger.info(f"用户 #{user_id} 的 {scope} 请求被限流（{key}），{wait:.1f} 秒后可用")
+                return wait
+            if cost:
+                taken.append((key, bucket_rate, cost))
+    except Exception as e:
+        with _stats_lock:
+            _stats['errors'] += 1
+        logger.warning(f"限流检查失败，放行请求: {e}")
+        return None
+    with _stats_lock:
+        _stats['allowed'] += 1
+    return None
+
+
+def charge_tokens(user_id: Optional[int], tokens: int):
+    """上游调用完成后按实际用量扣除token桶"""
+    if not DeepSeekConfig.THROTTLE_ENABLED or tokens <= 0:
+        return
+    try:
+        if user_id is not None:
+            _take(f'user:{user_id}:tokens', DeepSeekConfig.THROTTLE_USER_TOKEN_RATE, tokens, None)
+        _take('global:tokens', DeepSeekConfig.THROTTLE_GLOBAL_TOKEN_RATE, tokens, None)
+    except Exception as e:
+        logger.warning(f"扣除限流token失败: {e}")
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats, enabled=DeepSeekConfig.THROTTLE_ENABLED)
+
+
+class AIRateThrottle(BaseThrottle):
+    """DRF限流类：视图的 throttle_scopes 按 action 指定范围，函数视图使用 scope 属性
+
+    没有对应范围的请求（如会话列表）不限流。
+    """
+    scope = None
+
+    def get_scope(self, view) -> Optional[str]:
+        scopes = getattr(view, 'throttle_scopes', None)
+        if scopes:
+            return scopes.get(getattr(view, 'action', None))
+        return self.scope
+
+    def allow_request(self, request, view) -> bool:
+        scope = self.get_scope(view)
+        if scope is None or not request.user or not request.user.is_authenticated:
+            return True
+        wait = check_request(request.user.pk, scope)
+        if wait is not None:
+            raise AIThrottled(wait)
+        return True
@@ -0,0 +1,44 @@
+import re
+
+# CJK统一表意文字、假名、韩文音节及全角标点
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+_BOUNDARY_RE = re.compile(r'[\n。！？；.!?;\s]')
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数
+
+    按DeepSeek官方给出的经验值：1个中文字符约0.6个token，1个英文字符约0.3个token。
+    只在上游没有返回 usage 时使用。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return max(1, round(cjk * 0.6 + other * 0.3))
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """保留文本末尾约 max_tokens 个token的内容
+
+    从末尾向前按与 estimate_tokens 相同的规则累计，只扫描保留的部分；
+    截断点尽量后移到最近的换行、句末标点或空格，避免从半个词/半句话开始。
+    """
+    if not text or max_tokens <= 0:
+        return ''
+    budget = max_tokens
+    start = len(text)
+    while start > 0:
+        cost = 0.6 if _CJK_RE.match(text[start - 1]) else 0.3
+        if cost > budget:
+            break
+        budget -= cost
+        start -= 1
+    if start == 0:
+        return text
+
+    window = text[start:]
+    # 在开头一小段内找最近的边界
+    boundary = _BOUNDARY_RE.search(window, 0, 40)
+    return window[boundary.end():].lstrip() if boundary else window
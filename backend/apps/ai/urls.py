@@ -1,10 +1,11 @@
 # apps/ai/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'sessions', views.AIAssistantViewSet, basename='ai-session')
+router.register(r'jobs', views.AIJobViewSet, basename='ai-job')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -17,4 +18,23 @@ urlpatterns = [
     
     # 文章相关AI功能
     path('articles/auto_complete/', views.ArticleAIViewSet.as_view({'post': 'auto_complete'}), name='auto-complete'),
+    # 手动注册的路由需要带上 @action 中声明的参数（如SSE渲染器），与router的行为保持一致
+    path('articles/auto_complete_stream/',
+         views.ArticleAIViewSet.as_view({'post': 'auto_complete_stream'}, **views.ArticleAIViewSet.auto_complete_stream.kwargs),
+         name='auto-complete-stream'),
+    
+    # 批量处理文章（摘要、标签）
+    path('batch/', views.batch_process, name='batch-process'),
+    
+    # 异步接口（ASGI部署时使用，等待上游时不占用工作线程）
+    path('async/sessions/<int:pk>/chat/', async_views.chat, name='async-chat'),
+    path('async/generate_outline/', async_views.generate_outline, name='async-generate-outline'),
+    path('async/improve_article/', async_views.improve_article, name='async-improve-article'),
+    path('async/generate_summary/', async_views.generate_summary, name='async-generate-summary'),
+    path('async/generate_tags/', async_views.generate_tags, name='async-generate-tags'),
+    path('async/articles/auto_complete/', async_views.auto_complete, name='async-auto-complete'),
+    
+    # 用量与运行指标
+    path('usage/', views.ai_usage, name='ai-usage'),
+    path('metrics/', views.ai_metrics, name='ai-metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""AI调用用量记录
+
+每次成功调用上游后写入一条 AIUsageLog 明细，并增量更新当天的 AIUsageDaily 汇总，
+用量统计和配额检查只需读取汇总行。
+
+调用方所属用户通过 contextvar 传递：视图和后台任务用 usage_scope 标记当前用户，
+服务层记录用量时读取；提交到线程池的子任务需要用 contextvars.copy_context() 携带上下文。
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .tokens import estimate_tokens
+from . import throttling
+
+logger = logging.getLogger(__name__)
+
+_current_user_id = contextvars.ContextVar('ai_usage_user_id', default=None)
+_collector = contextvars.ContextVar('ai_usage_collector', default=None)
+
+
+def _user_id(user) -> Optional[int]:
+    if user is None or isinstance(user, int):
+        return user
+    return user.pk if getattr(user, 'is_authenticated', False) else None
+
+
+def activate(user) -> contextvars.Token:
+    """标记当前上下文的用户，返回值用于 deactivate"""
+    return _current_user_id.set(_user_id(user))
+
+
+def deactivate(token: contextvars.Token):
+    _current_user_id.reset(token)
+
+
+def current_user_id() -> Optional[int]:
+    return _current_user_id.get()
+
+
+@contextmanager
+def usage_scope(user):
+    """在此范围内的AI调用用量记到 user 名下（user 可以是用户对象或用户ID）"""
+    token = activate(user)
+    try:
+        yield
+    finally:
+        deactivate(token)
+
+
+@contextmanager
+def collect() -> Iterator[List[Dict]]:
+    """收集此范围内每次上游调用的用量，用于保存到消息记录等场景"""
+    records = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+def bind_stream(events: Iterator, user) -> Iterator:
+    """让流式响应的生成器在带有用户标记的独立上下文中执行
+
+    StreamingHttpResponse 的内容在视图返回之后才被迭代，此时视图设置的上下文已经失效。
+    """
+    context = contextvars.copy_context()
+    context.run(activate, user)
+    try:
+        while True:
+            try:
+                item = context.run(next, events)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        context.run(events.close)
+
+
+def normalize_usage(usage: Optional[Dict], prompt: str = '', completion: str = '') -> Dict:
+    """整理上游返回的 usage；缺失时按文本估算"""
+    if usage and usage.get('total_tokens') is not None:
+        prompt_tokens = int(usage.get('prompt_tokens') or 0)
+        completion_tokens = int(usage.get('completion_tokens') or 0)
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': int(usage.get('total_tokens') or prompt_tokens + completion_tokens),
+            'estimated': False,
+        }
+
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(completion)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'estimated': True,
+    }
+
+
+def record_usage(operation: str, model: str, usage: Dict, latency: float):
+    """记录一次上游调用的用量
+
+    usage 为 normalize_usage 的返回值，latency 单位为秒。
+    写入失败只记录日志，不影响调用结果。
+    """
+    user_id = _current_user_id.get()
+    record = dict(usage, operation=operation, model=model, latency_ms=int(latency * 1000))
+
+    records = _collector.get()
+    if records is not None:
+        records.append(record)
+
+    try:
+        from .models import AIUsageLog
+
+        AIUsageLog.objects.create(user_id=user_id, **record)
+        if user_id is not None:
+            _add_to_daily(user_id, usage)
+    except Exception as e:
+        logger.warning(f"记录AI用量失败: {e}")
+
+    throttling.charge_tokens(user_id, usage['total_tokens'])
+
+
+def _add_to_daily(user_id: int, usage: Dict):
+    """原子地累加当天汇总；当天第一次调用时创建汇总行"""
+    from .models import AIUsageDaily
+
+    today = timezone.localdate()
+    increments = {
+        'requests': F('requests') + 1,
+        'prompt_tokens': F('prompt_tokens') + usage['prompt_tokens'],
+        'completion_tokens': F('completion_tokens') + usage['completion_tokens'],
+        'total_tokens': F('total_tokens') + usage['total_tokens'],
+        'updated_at': timezone.now(),
+    }
+    if AIUsageDaily.objects.filter(user_id=user_id, date=today).update(**increments):
+        return
+
+    try:
+        # 放在保存点中，唯一约束冲突时不会破坏外层事务
+        with transaction.atomic():
+            AIUsageDaily.objects.create(
+                user_id=user_id,
+                date=today,
+                requests=1,
+                prompt_tokens=usage['prompt_tokens'],
+                completion_tokens=usage['completion_tokens'],
+                total_tokens=usage['total_tokens'],
+            )
+    except IntegrityError:
+        # 并发请求刚创建了当天的汇总行
+        AIUsageDaily.objects.filter(user_id=user_id, date=today).update(**increments)
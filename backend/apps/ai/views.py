@@ -1,69 +1,241 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.db import transaction
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+from datetime import timedelta
 
-from .models import AIAssistantSession, AIMessage
+from .models import AIAssistantSession, AIMessage, AIJob, AIUsageDaily
+from .jobs import submit_job
+from .batch import run_batch
 from .services import deepseek_service
+from . import completion, conversation, routing, throttling, usage
+from .client import get_http_client, async_client_stats
+from .cache import result_cache
+from .resilience import CircuitOpenError, circuit_breaker, retry_budget
+from .scheduler import scheduler
+from .context import schedule_compaction
+from .pagination import SessionCursorPagination, MessageCursorPagination
+from .streaming import EventStreamRenderer, sse_event, sse_response
 from .serializers import (
     AIAssistantSessionSerializer, 
     AIMessageSerializer,
     OutlineRequestSerializer,
     ImproveRequestSerializer,
-    SummaryRequestSerializer
+    SummaryRequestSerializer,
+    AutoCompleteRequestSerializer,
+    BatchRequestSerializer,
+    AIJobSerializer,
+    AIJobCreateSerializer
 )
 
-class AIAssistantViewSet(viewsets.ModelViewSet):
+def circuit_open_response(error=None):
+    """熔断期间直接返回503，不再等待上游"""
+    message = str(error) if error else 'DeepSeek服务暂时不可用，请稍后重试'
+    return Response(
+        {'error': message},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(max(1, circuit_breaker.retry_after()))}
+    )
+
+class UsageScopeMixin:
+    """请求处理期间把AI调用用量记到当前用户名下"""
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._usage_token = usage.activate(request.user)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_usage_token', None)
+        if token is not None:
+            usage.deactivate(token)
+            self._usage_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class AIAssistantViewSet(UsageScopeMixin, viewsets.ModelViewSet):
     """AI助手视图集"""
     permission_classes = [IsAuthenticated]
+    throttle_classes = [throttling.AIRateThrottle]
+    # action -> 限流范围（频率见 DeepSeekConfig.THROTTLE_RATES），未列出的action不限流
+    throttle_scopes = {
+        'chat': 'ai_chat',
+        'chat_stream': 'ai_chat',
+        'retry': 'ai_chat',
+        'generate_outline': 'ai_generate',
+        'generate_summary': 'ai_generate',
+        'generate_tags': 'ai_generate',
+        'improve_article': 'ai_improve',
+    }
     serializer_class = AIAssistantSessionSerializer
+    pagination_class = SessionCursorPagination
     
     def get_queryset(self):
-        return AIAssistantSession.objects.filter(user=self.request.user)
+        queryset = AIAssistantSession.objects.filter(user=self.request.user)
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        
+        # 消息数和最后一条消息用子查询注解，列表页的查询次数与会话数量无关
+        messages = AIMessage.objects.filter(session=OuterRef('pk'))
+        last_message = messages.order_by('-created_at', '-id')
+        return queryset.annotate(
+            message_count=Coalesce(
+                Subquery(
+                    messages.order_by().values('session').annotate(c=Count('id')).values('c'),
+                    output_field=IntegerField()
+                ),
+                0
+            ),
+            last_message_preview=Subquery(last_message.annotate(
+                preview=Substr('content', 1, 100)
+            ).values('preview')[:1]),
+            last_message_is_user=Subquery(last_message.values('is_user')[:1]),
+            last_message_at=Subquery(last_message.values('created_at')[:1]),
+        )
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    @action(detail=True, methods=['get'], pagination_class=MessageCursorPagination)
+    def messages(self, request, pk=None):
+        """会话消息（游标分页，最新的在前）"""
+        session = self.get_object()
+        if not request.query_params.get(self.paginator.cursor_query_param):
+            # 加载最新一页时把已中断的回复标记为失败，前端可以对其重试
+            conversation.recover_stale(session.id)
+        
+        queryset = AIMessage.objects.filter(session=session)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(AIMessageSerializer(page, many=True).data)
+    
     @action(detail=True, methods=['post'])
     def chat(self, request, pk=None):
-        """与AI对话"""
+        """与AI对话
+        
+        先保存用户消息和一条生成中的AI消息，在事务之外调用模型，完成后再更新AI消息，
+        等待模型期间不持有数据库事务。
+        """
         session = self.get_object()
         message_content = request.data.get('message', '').strip()
         
         if not message_content:
             return Response({'error': '消息内容不能为空'}, status=400)
         
+        if circuit_breaker.state == circuit_breaker.OPEN:
+            return circuit_open_response()
+        
+        user_message, ai_message = conversation.start_turn(session, message_content)
+        return self._generate_reply(session, ai_message, {
+            'user_message': AIMessageSerializer(user_message).data
+        })
+    
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """重新生成失败或中断的AI回复"""
+        session = self.get_object()
         try:
-            with transaction.atomic():
-                # 保存用户消息
-                user_message = AIMessage.objects.create(
-                    session=session,
-                    content=message_content,
-                    is_user=True
-                )
-                
-                # 获取AI回复
-                ai_response = deepseek_service.generate_content(message_content)
-                
-                # 保存AI回复
-                ai_message = AIMessage.objects.create(
-                    session=session,
-                    content=ai_response,
-                    is_user=False,
-                    tokens_used=len(ai_response) // 4  # 简单估算token数
-                )
-                
-                # 更新会话时间
-                session.save()
-            
+            message_id = int(request.data.get('message_id'))
+        except (TypeError, ValueError):
+            return Response({'error': 'message_id 不能为空'}, status=400)
+        
+        if circuit_breaker.state == circuit_breaker.OPEN:
+            return circuit_open_response()
+        
+        ai_message = conversation.restart_turn(session, message_id)
+        if ai_message is None:
+            return Response({'error': '消息不存在或不需要重试'}, status=400)
+        return self._generate_reply(session, ai_message, {})
+    
+    def _generate_reply(self, session, ai_message, data):
+        """为一条生成中的AI消息调用模型并保存结果"""
+        try:
+            # 带上会话摘要和预算内的近期消息
+            messages, needs_compaction = conversation.turn_context(session, ai_message)
+            with usage.collect() as records:
+                reply = deepseek_service.generate_content('', operation="chat", messages=messages)
+        except Exception as e:
+            conversation.fail_turn(ai_message, str(e))
+            if isinstance(e, CircuitOpenError):
+                return circuit_open_response(e)
+            data['ai_message'] = AIMessageSerializer(ai_message).data
+            data['error'] = f'AI服务错误: {str(e)}'
+            return Response(data, status=500)
+        
+        if not conversation.complete_turn(ai_message, reply, sum(r['completion_tokens'] for r in records)):
+            # 消息已被判定为中断，返回数据库中实际保存的状态
+            ai_message.refresh_from_db()
+        if needs_compaction:
+            schedule_compaction(session.id)
+        
+        data['ai_message'] = AIMessageSerializer(ai_message).data
+        return Response(data)
+    
+    @action(detail=True, methods=['post'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def chat_stream(self, request, pk=None):
+        """与AI对话（SSE流式返回）"""
+        session = self.get_object()
+        message_content = request.data.get('message', '').strip()
+        
+        if not message_content:
+            return Response({'error': '消息内容不能为空'}, status=400)
+        
+        if circuit_breaker.state == circuit_breaker.OPEN:
+            return circuit_open_response()
+        
+        user_message, ai_message = conversation.start_turn(session, message_content)
+        try:
+            messages, needs_compaction = conversation.turn_context(session, ai_message)
+        except Exception as e:
+            conversation.fail_turn(ai_message, str(e))
             return Response({
                 'user_message': AIMessageSerializer(user_message).data,
-                'ai_message': AIMessageSerializer(ai_message).data
-            })
-            
-        except Exception as e:
-            return Response({'error': f'AI服务错误: {str(e)}'}, status=500)
+                'ai_message': AIMessageSerializer(ai_message).data,
+                'error': f'AI服务错误: {str(e)}'
+            }, status=500)
+        
+        def event_stream():
+            chunks = []
+            finished = False
+            stream = deepseek_service.stream_content('', operation="chat", messages=messages)
+            try:
+                yield sse_event('start', {
+                    'user_message': AIMessageSerializer(user_message).data,
+                    'ai_message': AIMessageSerializer(ai_message).data
+                })
+                try:
+                    with usage.collect() as records:
+                        for delta in stream:
+                            chunks.append(delta)
+                            yield sse_event('token', {'delta': delta})
+                except Exception as e:
+                    # 中途出错：标记失败并保留已生成的部分回复
+                    conversation.fail_turn(ai_message, str(e), ''.join(chunks))
+                    finished = True
+                    yield sse_event('error', {
+                        'error': f'AI服务错误: {str(e)}',
+                        'ai_message': AIMessageSerializer(ai_message).data
+                    })
+                    return
+                
+                if not conversation.complete_turn(
+                    ai_message, ''.join(chunks), sum(r['completion_tokens'] for r in records)
+                ):
+                    ai_message.refresh_from_db()
+                finished = True
+                if needs_compaction:
+                    schedule_compaction(session.id)
+                yield sse_event('done', {'ai_message': AIMessageSerializer(ai_message).data})
+            except GeneratorExit:
+                # 客户端断开连接：保留已收到的部分回复，之后可以重试
+                if not finished:
+                    conversation.fail_turn(ai_message, '客户端已断开连接', ''.join(chunks))
+                raise
+            finally:
+                stream.close()
+        
+        return sse_response(usage.bind_stream(event_stream(), request.user))
     
     @action(detail=False, methods=['post'])
     def generate_outline(self, request):
@@ -90,9 +262,10 @@ class AIAssistantViewSet(viewsets.ModelViewSet):
         
         content = serializer.validated_data['content']
         improve_type = serializer.validated_data.get('improve_type', 'style')
+        mode = serializer.validated_data.get('mode')
         
         try:
-            improvement = deepseek_service.improve_writing(content, improve_type)
+            improvement = deepseek_service.improve_writing(content, improve_type, mode)
             return Response(improvement)
         except Exception as e:
             return Response({'error': f'文章优化失败: {str(e)}'}, status=500)
@@ -128,23 +301,212 @@ class AIAssistantViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': f'生成标签失败: {str(e)}'}, status=500)
 
-class ArticleAIViewSet(viewsets.ViewSet):
+class ArticleAIViewSet(UsageScopeMixin, viewsets.ViewSet):
     """文章AI功能视图集"""
     permission_classes = [IsAuthenticated]
+    throttle_classes = [throttling.AIRateThrottle]
+    throttle_scopes = {
+        'auto_complete': 'ai_autocomplete',
+        'auto_complete_stream': 'ai_autocomplete',
+    }
     
     @action(detail=False, methods=['post'])
     def auto_complete(self, request):
-        """文章自动补全"""
-        prompt = request.data.get('prompt', '')
-        context = request.data.get('context', '')
+        """文章自动补全（mode=inline 为编辑器行内建议的快速通道，见 completion.py）"""
+        if not request.data.get('prompt', ''):
+            return Response({'error': '补全提示不能为空'}, status=400)
+        
+        serializer = AutoCompleteRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        data = serializer.validated_data
         
-        if not prompt:
+        full_prompt, max_tokens, cache_key = completion.prepare(data['context'], data['prompt'], data['mode'])
+        cached = completion.completion_cache.get(cache_key)
+        if cached is not None:
+            return Response({'completion': cached, 'cached': True})
+        
+        with completion.cancel_registry.register(request.user.id, data['channel'], data.get('request_id')) as ticket:
+            try:
+                text = ''.join(completion.stream(ticket, full_prompt, max_tokens))
+            except CircuitOpenError as e:
+                return circuit_open_response(e)
+            except Exception as e:
+                return Response({'error': f'自动补全失败: {str(e)}'}, status=500)
+            if ticket.cancelled:
+                # 已被同一编辑器的新请求取代
+                return Response({'completion': '', 'cancelled': True})
+        
+        if text:
+            completion.completion_cache.set(cache_key, text)
+        return Response({'completion': text})
+    
+    @action(detail=False, methods=['post'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def auto_complete_stream(self, request):
+        """文章自动补全（SSE流式返回），参数与 auto_complete 相同"""
+        if not request.data.get('prompt', ''):
             return Response({'error': '补全提示不能为空'}, status=400)
         
-        full_prompt = f"上下文：{context}\n\n请继续写作：{prompt}"
+        serializer = AutoCompleteRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        data = serializer.validated_data
+        
+        full_prompt, max_tokens, cache_key = completion.prepare(data['context'], data['prompt'], data['mode'])
+        cached = completion.completion_cache.get(cache_key)
+        if cached is not None:
+            return sse_response(iter([
+                sse_event('token', {'delta': cached}),
+                sse_event('done', {'completion': cached, 'cached': True}),
+            ]))
+        
+        if circuit_breaker.state == circuit_breaker.OPEN:
+            return circuit_open_response()
         
+        def event_stream():
+            chunks = []
+            with completion.cancel_registry.register(
+                request.user.id, data['channel'], data.get('request_id')
+            ) as ticket:
+                stream = completion.stream(ticket, full_prompt, max_tokens)
+                try:
+                    for delta in stream:
+                        chunks.append(delta)
+                        yield sse_event('token', {'delta': delta})
+                    if ticket.cancelled:
+                        yield sse_event('cancelled', {'completion': ''.join(chunks)})
+                        return
+                    text = ''.join(chunks)
+                    if text:
+                        completion.completion_cache.set(cache_key, text)
+                    yield sse_event('done', {'completion': text})
+                except Exception as e:
+                    yield sse_event('error', {
+                        'error': f'自动补全失败: {str(e)}',
+                        'completion': ''.join(chunks)
+                    })
+                finally:
+                    stream.close()
+        
+        return sse_response(usage.bind_stream(event_stream(), request.user))
+
+class AIJobViewSet(mixins.CreateModelMixin,
+                   mixins.RetrieveModelMixin,
+                   mixins.ListModelMixin,
+                   viewsets.GenericViewSet):
+    """AI后台任务：提交后由 ai_worker 工作进程执行，前端轮询状态和结果"""
+    permission_classes = [IsAuthenticated]
+    serializer_class = AIJobSerializer
+    throttle_classes = [throttling.AIRateThrottle]
+    throttle_scopes = {'create': 'ai_jobs'}
+    
+    def get_queryset(self):
+        return AIJob.objects.filter(user=self.request.user)
+    
+    def create(self, request, *args, **kwargs):
+        """提交任务"""
+        serializer = AIJobCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        
+        job = submit_job(
+            request.user,
+            serializer.validated_data['job_type'],
+            serializer.validated_data['params']
+        )
+        return Response(AIJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """获取任务结果，任务未结束时返回202"""
+        job = self.get_object()
+        data = AIJobSerializer(job).data
+        if job.status in ('pending', 'running'):
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        data['result'] = job.result
+        return Response(data)
+
+class BatchRateThrottle(throttling.AIRateThrottle):
+    scope = 'ai_batch'
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+@throttle_classes([BatchRateThrottle])
+def batch_process(request):
+    """批量为文章生成摘要和标签，摘要写回文章
+    
+    stream 为 true 时每篇文章完成后推送一个 item 事件，最后推送 done 事件；
+    否则处理完后一次返回所有结果。单篇文章失败不影响其他文章。
+    """
+    serializer = BatchRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    
+    data = serializer.validated_data
+    if circuit_breaker.state == circuit_breaker.OPEN:
+        return circuit_open_response()
+    
+    options = {key: data[key] for key in ('operations', 'max_length', 'tag_count', 'overwrite')}
+    
+    def totals(results):
+        counts = {'ok': 0, 'partial': 0, 'failed': 0, 'skipped': 0, 'not_found': 0}
+        for result in results:
+            counts[result['status']] += 1
+        return counts
+    
+    if not data['stream']:
+        with usage.usage_scope(request.user):
+            results = list(run_batch(request.user, data['article_ids'], options))
+        return Response({'results': results, 'counts': totals(results)})
+    
+    def event_stream():
+        results = []
+        batch = run_batch(request.user, data['article_ids'], options)
         try:
-            completion = deepseek_service.generate_content(full_prompt, max_tokens=500)
-            return Response({'completion': completion})
+            for result in batch:
+                results.append(result)
+                yield sse_event('item', result)
+            yield sse_event('done', {'counts': totals(results)})
         except Exception as e:
-            return Response({'error': f'自动补全失败: {str(e)}'}, status=500)
\ No newline at end of file
+            yield sse_event('error', {'error': f'批量处理失败: {str(e)}', 'counts': totals(results)})
+        finally:
+            batch.close()
+    
+    return sse_response(usage.bind_stream(event_stream(), request.user))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def ai_metrics(request):
+    """AI服务运行指标（仅管理员）"""
+    return Response({
+        'http_client': get_http_client().stats(),
+        'async_http_client': async_client_stats(),
+        'result_cache': result_cache.stats(),
+        'circuit_breaker': circuit_breaker.stats(),
+        'retry_budget': retry_budget.stats(),
+        'auto_complete': completion.stats(),
+        'routing': routing.get_router().stats(),
+        'scheduler': scheduler.stats(),
+        'throttling': throttling.stats(),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ai_usage(request):
+    """当前用户的AI用量（按天汇总），days 参数指定最近天数，默认30天"""
+    try:
+        days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+    except ValueError:
+        return Response({'error': 'days 参数必须是整数'}, status=400)
+    
+    since = timezone.localdate() - timedelta(days=days - 1)
+    daily = AIUsageDaily.objects.filter(user=request.user, date__gte=since).order_by('-date')
+    fields = ('requests', 'prompt_tokens', 'completion_tokens', 'total_tokens')
+    totals = daily.aggregate(**{field: Sum(field) for field in fields})
+    
+    return Response({
+        'days': days,
+        'total': {field: totals[field] or 0 for field in fields},
+        'daily': list(daily.values('date', *fields)),
+    })
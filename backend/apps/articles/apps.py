@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ArticlesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'articles'
+
+    def ready(self):
+        # 注册文章保存/删除时更新相关文章索引的信号
+        from . import signals  # noqa: F401
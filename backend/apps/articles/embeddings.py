@@ -0,0 +1,326 @@
+"""相关文章：本地计算的文章向量和按用户划分的内存索引
+
+向量计算不依赖外部服务：标题和正文分词后按词频（1+log tf）加权，词哈希到
+HASH_BUCKETS 个桶，再用固定随机种子生成的投影矩阵降到 EMBEDDING_DIM 维并归一化。
+同一内容在任何进程中得到相同的向量，文章保存时计算一次存入 ArticleEmbedding。
+
+每个用户的向量在内存中保存为连续的 float32 矩阵，相关文章查询是一次矩阵-向量乘法
+加 argpartition 取 top-k，不重新计算任何向量。文章保存/删除时通过信号增量更新
+本进程的索引；其他进程的索引在查询时按 updated_at 拉取增量，已删除的文章在返回
+结果时过滤掉并从索引中移除。用户的索引首次使用时在后台线程中补算向量并加载，
+加载完成之前相关文章返回空列表，不在请求中做全量加载。
+"""
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+from .text import html_to_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 128
+HASH_BUCKETS = 1 << 14
+_PROJECTION_SEED = 20240601
+
+_build_executor = ThreadPoolExecutor(
+    max_workers=settings.ARTICLE_EMBEDDING_BUILD_WORKERS, thread_name_prefix="article-embeddings"
+)
+
+
+@lru_cache(maxsize=1)
+def _projection() -> np.ndarray:
+    """稀疏词频向量到稠密向量的随机投影矩阵（HASH_BUCKETS x EMBEDDING_DIM），首次使用时生成"""
+    return (
+        np.random.default_rng(_PROJECTION_SEED)
+        .standard_normal((HASH_BUCKETS, EMBEDDING_DIM))
+        .astype(np.float32)
+    )
+
+
+def _bucket(token: str) -> int:
+    # 不能用内置 hash()：每个进程的字符串哈希种子不同
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'little') % HASH_BUCKETS
+
+
+def article_text(title: str, content: str) -> str:
+    """用于计算向量的文本，标题重复一次以提高权重"""
+    title = title or ''
+    return f"{title} {title} {html_to_text(content)}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def embed_text(text: str) -> np.ndarray:
+    """计算文本的归一化向量（float32，EMBEDDING_DIM 维），没有有效词时返回零向量"""
+    counts = Counter(tokenize(text))
+    if not counts:
+        return np.zeros(EMBEDDING_DIM, dtype=np.float32)
+
+    buckets = np.fromiter((_bucket(token) for token in counts), dtype=np.int64, count=len(counts))
+    weights = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    vector = weights @ _projection()[buckets]
+    norm = np.linalg.norm(vector)
+    return (vector / norm).astype(np.float32) if norm > 0 else vector.astype(np.float32)
+
+
+def vector_from_bytes(data: bytes) -> Optional[np.ndarray]:
+    vector = np.frombuffer(data, dtype=np.float32)
+    return vector if vector.shape == (EMBEDDING_DIM,) else None
+
+
+class EmbeddingIndex:
+    """单个用户的向量索引：连续的 float32 矩阵 + 文章ID数组
+
+    容量不足时按倍数扩容，删除时用最后一行填补空位，矩阵前 size 行始终连续有效。
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((capacity, EMBEDDING_DIM), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self.size = 0
+        self.synced_at = None  # 已同步到的 ArticleEmbedding.updated_at
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, EMBEDDING_DIM), dtype=np.float32)
+        matrix[:self.size] = self._matrix[:self.size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self._ids[:self.size]
+        self._matrix, self._ids = matrix, ids
+
+    def load(self, ids: List[int], vectors: np.ndarray):
+        with self._lock:
+            self._grow(len(ids))
+            self._matrix[:len(ids)] = vectors
+            self._ids[:len(ids)] = ids
+            self._positions = {article_id: row for row, article_id in enumerate(ids)}
+            self.size = len(ids)
+
+    def upsert(self, article_id: int, vector: np.ndarray):
+        with self._lock:
+            row = self._positions.get(article_id)
+            if row is None:
+                self._grow(self.size + 1)
+                row = self.size
+                self._positions[article_id] = row
+                self._ids[row] = article_id
+                self.size += 1
+            self._matrix[row] = vector
+
+    def remove(self, article_id: int):
+        with self._lock:
+            row = self._positions.pop(article_id, None)
+            if row is None:
+                return
+            last = self.size - 1
+            if row != last:
+                moved_id = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._positions[moved_id] = row
+            self.size = last
+
+    def vector(self, article_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._positions.get(article_id)
+            return None if row is None else self._matrix[row].copy()
+
+    def search(self, vector: np.ndarray, k: int, exclude: int = None) -> List[Tuple[int, float]]:
+        """余弦相似度最高的 k 篇文章（向量已归一化，点积即余弦）"""
+        with self._lock:
+            size = self.size
+            if size == 0:
+                return []
+            scores = self._matrix[:size] @ vector
+            if exclude is not None and exclude in self._positions:
+                scores[self._positions[exclude]] = -np.inf
+            k = min(k, size)
+            top = np.argpartition(scores, size - k)[size - k:]
+            top = top[np.argsort(-scores[top])]
+            return [(int(self._ids[row]), float(scores[row])) for row in top if scores[row] > -np.inf]
+
+
+class IndexRegistry:
+    """按用户缓存索引，超过 max_users 时淘汰最久未使用的用户"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._indexes: 'OrderedDict[int, EmbeddingIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = set()
+
+    def peek(self, user_id: int) -> Optional[EmbeddingIndex]:
+        """已加载的索引，未加载时返回 None（信号处理不触发加载）"""
+        with self._lock:
+            return self._indexes.get(user_id)
+
+    def get(self, user_id: int) -> Optional[EmbeddingIndex]:
+        """同步其他进程写入的增量后返回已加载的索引；还没有加载时在后台加载，返回 None"""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                schedule = user_id not in self._building
+                self._building.add(user_id)
+            else:
+                self._indexes.move_to_end(user_id)
+        if index is None:
+            if schedule:
+                _build_executor.submit(self.build, user_id)
+            return None
+
+        _sync_index(user_id, index)
+        return index
+
+    def build(self, user_id: int):
+        """补算缺失的向量并加载用户的索引（在后台线程中运行）"""
+        close_old_connections()
+        try:
+            index = _load_index(user_id)
+            with self._lock:
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        except Exception as e:
+            logger.warning(f"加载用户 #{user_id} 的文章向量索引失败: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(user_id)
+            close_old_connections()
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+registry = IndexRegistry(max_users=settings.ARTICLE_EMBEDDING_CACHE_USERS)
+
+
+def _backfill(user_id: int):
+    """为还没有向量的文章计算向量（首次加载或历史数据）"""
+    from .models import Article, ArticleEmbedding
+
+    missing = Article.objects.filter(author_id=user_id, embedding__isnull=True).values_list(
+        'id', 'title', 'content'
+    )
+    batch = []
+    for article_id, title, content in missing.iterator(chunk_size=500):
+        text = article_text(title, content)
+        batch.append(ArticleEmbedding(
+            article_id=article_id, user_id=user_id,
+            vector=embed_text(text).tobytes(), content_hash=content_hash(text),
+        ))
+        if len(batch) >= 500:
+            ArticleEmbedding.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        ArticleEmbedding.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _load_index(user_id: int) -> EmbeddingIndex:
+    from .models import ArticleEmbedding
+
+    _backfill(user_id)
+    rows = ArticleEmbedding.objects.filter(user_id=user_id).values_list('article_id', 'vector', 'updated_at')
+    ids, vectors, synced_at = [], [], None
+    for article_id, data, updated_at in rows.iterator(chunk_size=2000):
+        vector = vector_from_bytes(bytes(data))
+        if vector is None:
+            continue
+        ids.append(article_id)
+        vectors.append(vector)
+        if synced_at is None or updated_at > synced_at:
+            synced_at = updated_at
+
+    index = EmbeddingIndex(capacity=max(64, len(ids)))
+    if ids:
+        index.load(ids, np.vstack(vectors))
+    index.synced_at = synced_at
+    logger.info(f"加载用户 #{user_id} 的文章向量索引: {len(ids)} 篇")
+    return index
+
+
+def _sync_index(user_id: int, index: EmbeddingIndex):
+    """拉取 synced_at 之后写入的向量（其他进程保存的文章）"""
+    from .models import ArticleEmbedding
+
+    rows = ArticleEmbedding.objects.filter(user_id=user_id)
+    if index.synced_at is not None:
+        rows = rows.filter(updated_at__gt=index.synced_at)
+    for article_id, data, updated_at in rows.values_list('article_id', 'vector', 'updated_at'):
+        vector = vector_from_bytes(bytes(data))
+        if vector is not None:
+            index.upsert(article_id, vector)
+        if index.synced_at is None or updated_at > index.synced_at:
+            index.synced_at = updated_at
+
+
+def update_article(article):
+    """文章保存后更新向量；标题和正文未变化时跳过"""
+    from .models import ArticleEmbedding
+
+    text = article_text(article.title, article.content)
+    digest = content_hash(text)
+    existing = ArticleEmbedding.objects.filter(article_id=article.pk).values_list('content_hash', flat=True).first()
+    if existing == digest:
+        return
+
+    vector = embed_text(text)
+    ArticleEmbedding.objects.update_or_create(
+        article_id=article.pk,
+        defaults={'user_id': article.author_id, 'vector': vector.tobytes(), 'content_hash': digest},
+    )
+    index = registry.peek(article.author_id)
+    if index is not None:
+        index.upsert(article.pk, vector)
+
+
+def remove_article(article):
+    """文章删除后从本进程的索引中移除（数据库中的向量随文章级联删除）"""
+    index = registry.peek(article.author_id)
+    if index is not None:
+        index.remove(article.pk)
+
+
+def related_articles(article, k: int = 5) -> List[Tuple[object, float]]:
+    """与 article 最相似的 k 篇同一作者的文章，返回 [(文章, 相似度)]；索引还在加载时返回空列表"""
+    from .models import Article
+
+    index = registry.get(article.author_id)
+    if index is None:
+        return []
+    vector = index.vector(article.pk)
+    if vector is None:
+        # 文章刚创建且信号尚未写入（或向量已失效），现场计算一次
+        vector = embed_text(article_text(article.title, article.content))
+        index.upsert(article.pk, vector)
+
+    # 多取几篇，过滤掉其他进程已删除的文章
+    candidates = index.search(vector, k + 5, exclude=article.pk)
+    articles = Article.objects.filter(
+        author_id=article.author_id, id__in=[article_id for article_id, _ in candidates]
+    ).select_related('author', 'category').in_bulk()
+
+    results = []
+    for article_id, score in candidates:
+        if article_id not in articles:
+            index.remove(article_id)
+        elif len(results) < k:
+            results.append((articles[article_id], score))
+    return results
@@ -0,0 +1,159 @@
+import json
+import re
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.ai.models import AIMessage
+from apps.ai.views import AIAssistantViewSet
+from articles.models import Article
+from articles.search import search_queryset
+from articles.views import ArticleViewSet, filter_articles
+from categories.views import CategoryViewSet
+
+# SQLite 查询计划中的一行，例如 "SEARCH articles USING INDEX articles_author_created_idx (author_id=?)"
+_SQLITE_STEP = re.compile(
+    r'\b(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+)| USING (INTEGER PRIMARY KEY))?'
+)
+
+
+def view_queryset(viewset_class, action, user):
+    """取视图集在该 action 下实际使用的查询集（与接口执行的查询形状一致）"""
+    view = viewset_class()
+    view.action = action
+    view.request = SimpleNamespace(user=user)
+    return view.get_queryset()
+
+
+def hot_queries(user, session_id, category_id):
+    """[(名称, 查询集, 是否要求按索引顺序读取)]，与各接口和后台同步的查询形状一致"""
+    articles = view_queryset(ArticleViewSet, 'list', user)
+    since = timezone.now() - timedelta(days=1)
+    queries = [
+        ('文章列表', articles.order_by('-created_at', '-id')[:21], True),
+        ('已发布文章', articles.filter(status='published').order_by('-created_at', '-id')[:21], True),
+        ('按分类过滤文章', filter_articles(articles, {'category': str(category_id)}).order_by('-created_at', '-id')[:21],
+         True),
+        ('按更新时间排序', articles.order_by('-updated_at', '-id')[:21], True),
+        ('检索索引增量同步', Article.objects.filter(author=user, updated_at__gt=since)
+         .values_list('id', 'title', 'content', 'updated_at'), False),
+        ('分类下的文章', Article.objects.filter(category_id=category_id), True),
+        ('分类列表及文章数', view_queryset(CategoryViewSet, 'list', user), False),
+        ('会话列表', view_queryset(AIAssistantViewSet, 'list', user).order_by('-updated_at', '-id')[:31], True),
+        ('会话消息分页', AIMessage.objects.filter(session_id=session_id).order_by('-created_at', '-id')[:51], True),
+        ('对话上下文', AIMessage.objects.filter(session_id=session_id, id__gt=0)
+         .filter(Q(is_user=True) | Q(status='completed')).order_by('-id').values_list('content', 'is_user')[:20], True),
+    ]
+    if connection.vendor == 'mysql':
+        # 其他数据库没有全文索引，搜索退化为 LIKE 匹配，不检查
+        queries.append(('全文搜索', search_queryset(Article.objects.filter(author=user), '索引')[:20], False))
+    return queries
+
+
+def mysql_plan(queryset):
+    """EXPLAIN FORMAT=JSON -> ([{table, access, key, rows}], 是否额外排序)"""
+    plan = json.loads(queryset.explain(format='json'))
+    steps, filesort = [], False
+
+    def walk(node):
+        nonlocal filesort
+        if isinstance(node, dict):
+            table = node.get('table')
+            if isinstance(table, dict) and 'table_name' in table:
+                steps.append({
+                    'table': table['table_name'],
+                    'access': table.get('access_type'),
+                    'key': table.get('key'),
+                    'rows': table.get('rows_examined_per_scan'),
+                })
+            if node.get('using_filesort'):
+                filesort = True
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return steps, filesort
+
+
+def sqlite_plan(queryset):
+    steps, filesort = [], False
+    for line in queryset.explain().splitlines():
+        if 'USE TEMP B-TREE FOR ORDER BY' in line:
+            filesort = True
+        match = _SQLITE_STEP.search(line)
+        if match:
+            kind, table, index, primary = match.groups()
+            key = index or ('PRIMARY' if primary else None)
+            steps.append({
+                'table': table,
+                'access': 'ALL' if kind == 'SCAN' and key is None else kind.lower(),
+                'key': key,
+                'rows': None,
+            })
+    return steps, filesort
+
+
+class Command(BaseCommand):
+    help = ('对文章、分类、AI会话和消息的热点查询执行 EXPLAIN，检查是否使用了索引。'
+            '建议先用 generate_fixtures 生成大数据量，数据太少时优化器可能直接选择全表扫描')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='以该用户的数据生成查询，默认取文章最多的用户')
+        parser.add_argument('--verbose-plan', action='store_true', help='同时输出原始查询计划')
+        parser.add_argument('--strict', action='store_true', help='有查询没有使用索引时以错误退出')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'mysql':
+            explain = mysql_plan
+        elif connection.vendor == 'sqlite':
+            explain = sqlite_plan
+        else:
+            raise CommandError(f"不支持的数据库: {connection.vendor}")
+
+        User = get_user_model()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.annotate(n=Count('articles')).order_by('-n').first()
+        if user is None:
+            raise CommandError('没有可用的用户')
+
+        session = (AIMessage.objects.filter(session__user=user).values('session')
+                   .annotate(n=Count('id')).order_by('-n').first())
+        category = Article.objects.filter(author=user, category__isnull=False).values('category').first()
+        session_id = session['session'] if session else 0
+        category_id = category['category'] if category else 0
+        self.stdout.write(f"数据库 {connection.vendor}，用户 {user.username}，会话 #{session_id}，分类 #{category_id}")
+
+        queries = hot_queries(user, session_id, category_id)
+        problems = []
+        for name, queryset, ordered in queries:
+            steps, filesort = explain(queryset)
+            issues = [f"{step['table']} 全表扫描" for step in steps if step['access'] == 'ALL']
+            if ordered and filesort:
+                issues.append('额外排序')
+            detail = '；'.join(
+                f"{step['table']}: {step['key'] or '-'}"
+                + (f" ({step['access']}, 约 {step['rows']} 行)" if step['rows'] is not None else f" ({step['access']})")
+                for step in steps
+            )
+            if issues:
+                problems.append(name)
+                self.stdout.write(self.style.WARNING(f"[需优化] {name}: {'，'.join(issues)} | {detail}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"[使用索引] {name}: {detail}"))
+            if options['verbose_plan']:
+                self.stdout.write(str(queryset.query))
+                self.stdout.write(queryset.explain())
+
+        if problems and options['strict']:
+            raise CommandError(f"{len(problems)} 条查询没有完全使用索引: {'、'.join(problems)}")
+        self.stdout.write(f"共检查 {len(queries)} 条查询，{len(problems)} 条需要优化")
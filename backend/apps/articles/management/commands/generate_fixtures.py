@@ -0,0 +1,223 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.ai.models import AIAssistantSession, AIMessage
+from articles.models import Article
+from categories.models import Category
+
+PHRASES = (
+    '知识库', '全文检索', '数据库索引', '查询优化', '缓存策略', '连接池', '异步任务', '消息队列',
+    '前端渲染', '组件设计', '接口限流', '分页查询', '向量检索', '模型调用', '日志分析', '性能测试',
+    '部署流程', '权限控制', '数据迁移', '故障排查', '代码评审', '单元测试', '持续集成', '容器编排',
+)
+SENTENCES = (
+    '本文记录了{0}在实际项目中的做法。', '{0}和{1}需要一起考虑，单独优化效果有限。',
+    '上线后{0}的延迟明显下降，{1}的资源占用也更平稳。', '遇到的主要问题是{0}，最终通过调整{1}解决。',
+    '团队对{0}的讨论集中在可维护性上。', '下面给出{0}的关键步骤和注意事项。',
+)
+CATEGORY_NAMES = ('后端', '前端', '数据库', '运维', '架构', '读书笔记', '算法', '工具', '随笔', '项目复盘')
+TIME_SPAN = timedelta(days=365)  # 生成的数据分布在最近一年内
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """生成期间关闭 auto_now / auto_now_add，使用数据中给定的创建和更新时间"""
+    fields = [
+        field for model in models for field in model._meta.fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('生成大数据量的测试数据：用户、分类、文章、AI会话和消息，全部批量插入。'
+            '每个用户的数据量按长尾分布，少数用户拥有大部分文章和会话，用于检查查询计划和分页性能')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='用户数')
+        parser.add_argument('--articles', type=int, default=10000, help='文章总数')
+        parser.add_argument('--categories', type=int, default=5, help='每个用户的分类数')
+        parser.add_argument('--sessions', type=int, default=20000, help='AI会话总数')
+        parser.add_argument('--messages', type=int, default=1000000, help='AI消息总数')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批插入的行数')
+        parser.add_argument('--prefix', default='fixture', help='生成的用户名前缀')
+        parser.add_argument('--seed', type=int, default=42, help='随机数种子，相同参数生成相同的数据')
+        parser.add_argument('--clear', action='store_true', help='先删除之前用同一前缀生成的用户及其数据')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        prefix = f"{options['prefix']}_"
+
+        User = get_user_model()
+        existing = User.objects.filter(username__startswith=prefix)
+        if existing.exists():
+            if not options['clear']:
+                raise CommandError(f"已存在前缀为 {prefix} 的用户，使用 --clear 先删除")
+            self.clear(existing)
+
+        with explicit_timestamps(User, Category, Article, AIAssistantSession, AIMessage):
+            users = self.stage(f"{options['users']} 个用户",
+                               lambda: self.create_users(User, prefix, options['users']))
+            # 长尾分布：少数用户拥有大部分数据
+            weights = [self.rng.paretovariate(1.16) for _ in users]
+            categories = self.stage('分类', lambda: self.create_categories(users, options['categories']))
+            self.stage(f"{options['articles']} 篇文章",
+                       lambda: self.create_articles(users, weights, categories, options['articles']))
+            sessions = self.stage(f"{options['sessions']} 个会话",
+                                  lambda: self.create_sessions(users, weights, options['sessions'],
+                                                               options['messages']))
+            self.stage(f"{options['messages']} 条消息", lambda: self.create_messages(sessions))
+
+    def stage(self, name, func):
+        started = time.perf_counter()
+        result = func()
+        self.stdout.write(f"{name}完成，耗时 {time.perf_counter() - started:.1f} 秒")
+        return result
+
+    def clear(self, users):
+        """子表先删：消息、会话、文章的删除都是按条件的批量 DELETE"""
+        started = time.perf_counter()
+        user_ids = list(users.values_list('id', flat=True))
+        AIMessage.objects.filter(session__user_id__in=user_ids).delete()
+        AIAssistantSession.objects.filter(user_id__in=user_ids).delete()
+        Article.objects.filter(author_id__in=user_ids).only('id', 'author_id').delete()
+        Category.objects.filter(user_id__in=user_ids).delete()
+        users.delete()
+        self.stdout.write(f"已删除 {len(user_ids)} 个旧用户的数据，耗时 {time.perf_counter() - started:.1f} 秒")
+
+    def random_time(self, start=None):
+        start = start or self.now - TIME_SPAN
+        return start + (self.now - start) * self.rng.random()
+
+    def text(self, sentences: int) -> str:
+        return ''.join(
+            self.rng.choice(SENTENCES).format(self.rng.choice(PHRASES), self.rng.choice(PHRASES))
+            for _ in range(sentences)
+        )
+
+    def insert(self, model, rows):
+        """按 batch_size 分批插入生成器产生的对象，内存中最多保留一批"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def create_users(self, User, prefix, count):
+        password = make_password('password123')  # 哈希只计算一次
+
+        def rows():
+            for i in range(count):
+                joined = self.random_time()
+                yield User(username=f'{prefix}{i:06d}', email=f'{prefix}{i:06d}@example.com', password=password,
+                           date_joined=joined, created_at=joined, updated_at=joined)
+
+        self.insert(User, rows())
+        # MySQL 的 bulk_create 不回填主键，重新查出ID
+        return list(User.objects.filter(username__startswith=prefix).values_list('id', 'date_joined'))
+
+    def create_categories(self, users, per_user):
+        def rows():
+            for user_id, joined in users:
+                for name in self.rng.sample(CATEGORY_NAMES, min(per_user, len(CATEGORY_NAMES))):
+                    created = self.random_time(joined)
+                    yield Category(user_id=user_id, name=name, created_at=created, updated_at=created)
+
+        self.insert(Category, rows())
+        by_user = {}
+        for category_id, user_id in Category.objects.filter(
+            user_id__in=[user_id for user_id, _ in users]
+        ).values_list('id', 'user_id'):
+            by_user.setdefault(user_id, []).append(category_id)
+        return by_user
+
+    def create_articles(self, users, weights, categories, count):
+        authors = self.rng.choices(users, weights=weights, k=count)
+
+        def rows():
+            for i, (user_id, joined) in enumerate(authors):
+                created = self.random_time(joined)
+                updated = self.random_time(created)
+                published = self.rng.random() < 0.7
+                owned = categories.get(user_id)
+                topic = self.rng.choice(PHRASES)
+                paragraphs = ''.join(f'<p>{self.text(self.rng.randint(2, 6))}</p>'
+                                     for _ in range(self.rng.randint(3, 20)))
+                yield Article(
+                    title=f'{topic}实践笔记 {i}',
+                    content=f'<h2>{topic}</h2>{paragraphs}',
+                    summary=self.text(2),
+                    status='published' if published else 'draft',
+                    is_public=self.rng.random() < 0.8,
+                    author_id=user_id,
+                    category_id=self.rng.choice(owned) if owned and self.rng.random() < 0.9 else None,
+                    created_at=created,
+                    updated_at=updated,
+                    published_at=updated if published else None,
+                )
+
+        self.insert(Article, rows())
+
+    def create_sessions(self, users, weights, count, messages):
+        """会话的消息数同样按长尾分布；每个会话的消息按固定间隔排列，更新时间为最后一条消息的时间"""
+        owners = self.rng.choices(users, weights=weights, k=count)
+        message_weights = [self.rng.paretovariate(1.5) for _ in range(count)]
+        message_counts = [0] * count
+        for index in self.rng.choices(range(count), weights=message_weights, k=messages):
+            message_counts[index] += 1
+
+        plans = []
+        for (user_id, joined), message_count in zip(owners, message_counts):
+            step = timedelta(seconds=self.rng.randint(10, 300))
+            # 最后一条消息不晚于当前时间
+            latest = self.now - step * max(0, message_count - 1)
+            created = joined + (latest - joined) * self.rng.random() if latest > joined else latest
+            plans.append((user_id, created, step, message_count))
+        self.insert(AIAssistantSession, (
+            AIAssistantSession(user_id=user_id, title=f'{self.rng.choice(PHRASES)}相关问题',
+                               created_at=created, updated_at=created + step * max(0, message_count - 1))
+            for user_id, created, step, message_count in plans
+        ))
+
+        # 按插入顺序查回ID（同一批用户的会话只有这次生成的）
+        session_ids = AIAssistantSession.objects.filter(
+            user_id__in={user_id for user_id, _ in users}
+        ).order_by('id').values_list('id', flat=True)
+        return [(session_id, created, step, message_count)
+                for session_id, (_, created, step, message_count) in zip(session_ids, plans)]
+
+    def create_messages(self, sessions):
+        def rows():
+            for session_id, created, step, message_count in sessions:
+                for i in range(message_count):
+                    is_user = i % 2 == 0
+                    at = created + step * i
+                    yield AIMessage(
+                        session_id=session_id,
+                        content=self.text(1 if is_user else self.rng.randint(2, 8)),
+                        is_user=is_user,
+                        tokens_used=0 if is_user else self.rng.randint(50, 800),
+                        created_at=at,
+                        updated_at=at,
+                    )
+
+        self.insert(AIMessage, rows())
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('articles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleEmbedding',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='articles.article', verbose_name='文章')),
+                ('vector', models.BinaryField(verbose_name='向量')),
+                ('content_hash', models.CharField(max_length=40, verbose_name='内容哈希')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '文章向量',
+                'verbose_name_plural': '文章向量',
+                'db_table': 'article_embeddings',
+                'indexes': [models.Index(fields=['user', 'updated_at'], name='article_emb_user_updated_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0002_article_embeddings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['author', 'created_at'], name='articles_author_created_idx'),
+        ),
+    ]
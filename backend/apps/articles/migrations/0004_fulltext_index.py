@@ -0,0 +1,29 @@
+from django.db import migrations
+
+INDEX_NAME = 'articles_fulltext_idx'
+
+
+def create_fulltext_index(apps, schema_editor):
+    """MySQL：标题、摘要、正文的全文索引，使用 ngram 分词（中文按相邻字切分）"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        f'ALTER TABLE articles ADD FULLTEXT INDEX {INDEX_NAME} (title, summary, content) WITH PARSER ngram'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(f'ALTER TABLE articles DROP INDEX {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0003_author_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
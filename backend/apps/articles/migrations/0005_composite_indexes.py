@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0004_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['author', 'status', 'created_at'], name='articles_author_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['author', 'updated_at'], name='articles_author_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'created_at'], name='articles_category_created_idx'),
+        ),
+    ]
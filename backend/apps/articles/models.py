@@ -25,6 +25,16 @@ class Article(models.Model):
         verbose_name = '文章'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            # 文章列表按作者过滤、按 (created_at, id) 游标分页
+            models.Index(fields=['author', 'created_at'], name='articles_author_created_idx'),
+            # 已发布/草稿列表和按状态过滤，同样按创建时间分页
+            models.Index(fields=['author', 'status', 'created_at'], name='articles_author_status_idx'),
+            # 按更新时间排序的列表、检索索引按 updated_at 增量同步
+            models.Index(fields=['author', 'updated_at'], name='articles_author_updated_idx'),
+            # 分类下的文章列表
+            models.Index(fields=['category', 'created_at'], name='articles_category_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -33,4 +43,23 @@ class Article(models.Model):
         if self.status == 'published' and not self.published_at:
             from django.utils import timezone
             self.published_at = timezone.now()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class ArticleEmbedding(models.Model):
+    """文章向量（用于相关文章），内容未变化时不重新计算"""
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='embedding', verbose_name='文章')
+    # 冗余作者字段，按用户加载索引时不需要关联文章表
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='+', verbose_name='用户')
+    vector = models.BinaryField(verbose_name='向量')
+    content_hash = models.CharField(max_length=40, verbose_name='内容哈希')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'article_embeddings'
+        verbose_name = '文章向量'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='article_emb_user_updated_idx'),
+        ]
@@ -0,0 +1,88 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+COUNT_LIMIT = 1000
+
+
+def approximate_count(queryset, limit: int = COUNT_LIMIT):
+    """数到 limit + 1 条为止，返回 (总数, 是否被截断)，不对全部结果做 COUNT(*)"""
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, True
+    return count, False
+
+
+class ArticleCursorPagination(CursorPagination):
+    """文章列表：按 (created_at, id) 游标分页，配合 (author, created_at) 索引
+
+    ordering 参数可选 created_at / updated_at（加 - 为倒序），默认最新创建的在前。
+    count 为近似总数：最多数到 COUNT_LIMIT 条，超过时返回 COUNT_LIMIT 且 count_capped 为 true。
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    ordering_fields = ('created_at', 'updated_at')
+
+    def get_ordering(self, request, queryset, view):
+        value = request.query_params.get('ordering', '')
+        field = value.lstrip('-')
+        if field not in self.ordering_fields:
+            return self.ordering
+        direction = '-' if value.startswith('-') else ''
+        return (f'{direction}{field}', f'{direction}id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count, self.count_capped = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'count': self.count,
+            'count_capped': self.count_capped,
+            'results': data,
+        })
+
+
+class ArticleSearchPagination(BasePagination):
+    """搜索结果按相关度排序，用页码分页；只能翻到前 COUNT_LIMIT 条结果，避免深分页的大偏移量"""
+    page_size = 20
+    max_page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = max(1, int(request.query_params.get('page', 1)))
+            self.page_size = min(max(1, int(request.query_params.get('page_size', self.page_size))),
+                                 self.max_page_size)
+        except ValueError:
+            raise NotFound('无效的页码')
+        offset = (self.page - 1) * self.page_size
+        if offset >= COUNT_LIMIT:
+            raise NotFound('页码超出范围')
+
+        self.count, self.count_capped = approximate_count(queryset)
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size and offset + self.page_size < COUNT_LIMIT
+        return rows[:self.page_size]
+
+    def get_paginated_response(self, data):
+        url = self.request.build_absolute_uri()
+        next_link = replace_query_param(url, 'page', self.page + 1) if self.has_next else None
+        previous_link = None
+        if self.page > 2:
+            previous_link = replace_query_param(url, 'page', self.page - 1)
+        elif self.page == 2:
+            previous_link = remove_query_param(url, 'page')
+        return Response({
+            'next': next_link,
+            'previous': previous_link,
+            'count': self.count,
+            'count_capped': self.count_capped,
+            'page': self.page,
+            'results': data,
+        })
@@ -0,0 +1,105 @@
+"""文章全文搜索
+
+MySQL 上使用 0004_fulltext_index 建立的 FULLTEXT(title, summary, content) ngram 索引，
+MATCH ... AGAINST 同时用于过滤和相关度排序，不做 LIKE '%...%' 全表扫描。
+其他数据库（本地开发用的 SQLite 等）没有全文索引，退化为 icontains 匹配，
+按命中的字段加权排序，只适合小数据量。
+
+搜索结果附带高亮片段：正文转为纯文本后截取第一个命中位置附近的一段，
+HTML 转义后用 <mark> 标出命中的词，前端可以直接用 v-html 显示。
+"""
+import html
+import re
+from typing import Dict, List
+
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .text import html_to_text, tokenize
+
+MAX_QUERY_LENGTH = 100
+SNIPPET_CHARS = 120
+MAX_FALLBACK_TERMS = 5
+
+
+def query_terms(query: str) -> List[str]:
+    """用于高亮的词：按空白切分的原词，较长的在前（优先匹配完整的词）"""
+    terms = {term.lower() for term in query.split() if term}
+    return sorted(terms, key=len, reverse=True)
+
+
+def _match_sql() -> str:
+    quote = connection.ops.quote_name
+    columns = ', '.join(f'{quote("articles")}.{quote(column)}' for column in ('title', 'summary', 'content'))
+    return f'MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+
+
+def search_queryset(queryset, query: str):
+    """按相关度过滤和排序，结果带 score 注解"""
+    if connection.vendor == 'mysql':
+        return (
+            queryset.annotate(score=RawSQL(_match_sql(), (query,), output_field=FloatField()))
+            .filter(score__gt=0)
+            .order_by('-score', '-id')
+        )
+
+    terms = query_terms(query)[:MAX_FALLBACK_TERMS]
+    condition = Q()
+    score = Value(0)
+    for term in terms:
+        condition |= Q(title__icontains=term) | Q(summary__icontains=term) | Q(content__icontains=term)
+        for field, weight in (('title', 3), ('summary', 2), ('content', 1)):
+            score = score + Case(
+                When(**{f'{field}__icontains': term}, then=Value(weight)), default=Value(0), output_field=IntegerField()
+            )
+    return (
+        queryset.filter(condition)
+        .annotate(score=score)
+        .order_by('-score', '-created_at', '-id')
+    )
+
+
+def _pattern(terms: List[str]):
+    if not terms:
+        return None
+    return re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+
+
+def highlight(text: str, pattern) -> str:
+    """HTML转义后用 <mark> 标出命中的词"""
+    if pattern is None:
+        return html.escape(text)
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return ''.join(parts)
+
+
+def snippet(text: str, pattern, width: int = SNIPPET_CHARS) -> str:
+    """截取第一个命中位置附近的一段并高亮，没有命中时取开头"""
+    match = pattern.search(text) if pattern is not None else None
+    start = 0 if match is None else max(0, match.start() - width // 3)
+    end = min(len(text), start + width)
+    fragment = text[start:end]
+    return ('…' if start > 0 else '') + highlight(fragment, pattern) + ('…' if end < len(text) else '')
+
+
+def build_highlights(articles, query: str) -> Dict[int, Dict[str, str]]:
+    """为一页搜索结果生成 {文章ID: {'title', 'snippet'}}"""
+    terms = query_terms(query)
+    results = {}
+    for article in articles:
+        text = f"{article.summary} {html_to_text(article.content)}".strip()
+        pattern = _pattern(terms)
+        if pattern is not None and not pattern.search(f"{article.title} {text}"):
+            # ngram 索引可能只命中了词的一部分，退回到按分词结果高亮
+            pattern = _pattern(sorted(set(tokenize(query)), key=len, reverse=True))
+        results[article.pk] = {
+            'title': highlight(article.title, pattern),
+            'snippet': snippet(text, pattern),
+        }
+    return results
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from categories.models import Category
+
 from .models import Article
 
 class ArticleListSerializer(serializers.ModelSerializer):
@@ -21,4 +23,44 @@ class ArticleDetailSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+BULK_MAX_ARTICLES = 1000
+
+
+class ArticleBulkSerializer(serializers.Serializer):
+    """批量操作文章请求序列化器"""
+    ACTION_CHOICES = (
+        ('publish', '发布'),
+        ('unpublish', '转为草稿'),
+        ('delete', '删除'),
+        ('move_category', '移动分类'),
+        ('set_public', '设置是否公开'),
+    )
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=BULK_MAX_ARTICLES,
+        label='文章ID列表'
+    )
+    action = serializers.ChoiceField(choices=ACTION_CHOICES, label='操作')
+    category = serializers.IntegerField(required=False, allow_null=True, label='目标分类ID')
+    is_public = serializers.BooleanField(required=False, label='是否公开')
+
+    def validate_ids(self, value):
+        # 去重并保持顺序，结果按请求中的顺序返回
+        return list(dict.fromkeys(value))
+
+    def validate(self, attrs):
+        action = attrs['action']
+        if action == 'move_category':
+            if 'category' not in attrs:
+                raise serializers.ValidationError({'category': '移动分类需要指定分类（null 表示移出分类）'})
+            category = attrs['category']
+            if category is not None:
+                if not Category.objects.filter(pk=category, user=self.context['request'].user).exists():
+                    raise serializers.ValidationError({'category': '分类不存在'})
+        elif action == 'set_public' and 'is_public' not in attrs:
+            raise serializers.ValidationError({'is_public': '需要指定是否公开'})
+        return attrs
@@ -0,0 +1,26 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import embeddings
+from .models import Article
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Article)
+def update_article_embedding(sender, instance, raw=False, **kwargs):
+    """文章保存后增量更新相关文章索引"""
+    if raw:
+        return
+    try:
+        embeddings.update_article(instance)
+    except Exception as e:
+        # 向量只影响相关文章推荐，失败时不影响文章保存；新文章缺失的向量在下次加载索引时补算
+        logger.warning(f"更新文章 #{instance.pk} 的向量失败: {e}")
+
+
+@receiver(post_delete, sender=Article)
+def remove_article_embedding(sender, instance, **kwargs):
+    embeddings.remove_article(instance)
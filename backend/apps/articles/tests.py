@@ -1,3 +1,195 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from categories.models import Category
+from config.testing import QueryBudgetMixin
+from users.models import User
+
+from . import embeddings
+from .models import Article
+
+
+class _InlineExecutor:
+    """在当前线程中执行提交的任务，测试能看到事务中的数据"""
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+def create_articles(user, count, categories=(), start=0):
+    """批量创建文章，轮流放入各个分类，一半发布"""
+    categories = list(categories) or [None]
+    return Article.objects.bulk_create([
+        Article(
+            title=f'文章 {start + i} 性能测试',
+            content=f'<p>第 {start + i} 篇文章的正文，介绍数据库索引和查询优化。</p>',
+            summary=f'摘要 {start + i}',
+            status='published' if i % 2 else 'draft',
+            author=user,
+            category=categories[i % len(categories)],
+        )
+        for i in range(count)
+    ])
+
+
+class ArticleQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """文章接口的查询次数与文章数量无关"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123')
+        cls.other = User.objects.create_user(username='other', password='password123')
+        cls.categories = [Category.objects.create(name=f'分类 {i}', user=cls.user) for i in range(5)]
+        create_articles(cls.user, 30, cls.categories)
+        create_articles(cls.other, 10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def grow(self):
+        create_articles(self.user, 60, self.categories, start=1000)
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_list(self):
+        self.assertQueryCountConstant(lambda: self.get('/api/articles/articles/', {'page_size': 50}), self.grow, 2)
+
+    def test_list_filtered(self):
+        params = {'status': 'published', 'category': self.categories[0].pk, 'page_size': 50}
+        self.assertQueryCountConstant(lambda: self.get('/api/articles/articles/', params), self.grow, 2)
+
+    def test_published_and_drafts(self):
+        for url in ('/api/articles/articles/published/', '/api/articles/articles/drafts/'):
+            with self.subTest(url=url):
+                self.assertQueryCountConstant(lambda: self.get(url, {'page_size': 50}), self.grow, 2)
+
+    def test_search(self):
+        request = lambda: self.get('/api/articles/articles/search/', {'q': '索引', 'page_size': 50})
+        self.assertQueryCountConstant(request, self.grow, 2)
+
+    def test_retrieve(self):
+        article = Article.objects.filter(author=self.user, category__isnull=False).first()
+        with self.assertQueryBudget(1):
+            self.get(f'/api/articles/articles/{article.pk}/')
+
+    def test_related(self):
+        article = Article.objects.filter(author=self.user).first()
+        with mock.patch.object(embeddings, '_build_executor', _InlineExecutor()), \
+                mock.patch.object(embeddings, 'close_old_connections', lambda: None):
+            self.get(f'/api/articles/articles/{article.pk}/related/')  # 首次请求加载向量索引
+        request = lambda: self.get(f'/api/articles/articles/{article.pk}/related/', {'k': 10})
+        self.assertQueryCountConstant(request, lambda: None, 3)
+
+    def test_bulk_update(self):
+        ids = list(Article.objects.filter(author=self.user).values_list('id', flat=True))
+        is_public = [True]
+
+        def request():
+            is_public[0] = not is_public[0]
+            response = self.client.post('/api/articles/articles/bulk/', {
+                'ids': ids, 'action': 'set_public', 'is_public': is_public[0],
+            }, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        def grow():
+            ids.extend(article.pk for article in create_articles(self.user, 200, start=1000))
+
+        # 加锁查询 + 一条 UPDATE，以及事务的保存点
+        self.assertQueryCountConstant(request, grow, 4)
+
+    def test_bulk_delete(self):
+        ids = [article.pk for article in create_articles(self.user, 50, start=1000)]
+        ids.append(Article.objects.filter(author=self.other).values_list('id', flat=True).first())
+        with self.assertQueryBudget(6):
+            response = self.client.post('/api/articles/articles/bulk/', {'ids': ids, 'action': 'delete'}, format='json')
+        self.assertEqual(response.data['counts'], {'deleted': 50, 'unchanged': 0, 'not_found': 1})
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+    """文章向量的计算和按用户的向量索引"""
+
+    def embed(self, title, content):
+        return embeddings.embed_text(embeddings.article_text(title, content))
+
+    def test_embed_text_is_deterministic_and_normalized(self):
+        vector = self.embed('数据库索引', '<p>联合索引的列顺序</p>')
+        self.assertEqual(vector.shape, (embeddings.EMBEDDING_DIM,))
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+        np.testing.assert_array_equal(vector, self.embed('数据库索引', '<p>联合索引的列顺序</p>'))
+        self.assertFalse(embeddings.embed_text('  ').any())
+
+    def test_similar_text_scores_higher(self):
+        query = self.embed('数据库索引优化', '联合索引的列顺序决定了能否用于排序')
+        similar = self.embed('索引设计', '数据库联合索引和覆盖索引的使用')
+        unrelated = self.embed('前端组件', '组件拆分要考虑状态的归属')
+        self.assertGreater(float(query @ similar), float(query @ unrelated))
+
+    def test_index_upsert_remove_and_search(self):
+        index = embeddings.EmbeddingIndex(capacity=2)
+        vectors = {i: self.embed(f'文章 {i}', f'主题 {i} ' * (i + 1)) for i in range(1, 6)}
+        for article_id, vector in vectors.items():
+            index.upsert(article_id, vector)
+        self.assertEqual(index.size, 5)
+
+        results = index.search(vectors[3], k=3)
+        self.assertEqual(results[0][0], 3)
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+        self.assertEqual([score for _, score in results], sorted((score for _, score in results), reverse=True))
+        self.assertNotIn(3, [article_id for article_id, _ in index.search(vectors[3], k=10, exclude=3)])
+
+        # 删除时用最后一行填补空位，其余文章的向量不变
+        index.remove(2)
+        self.assertEqual(index.size, 4)
+        self.assertIsNone(index.vector(2))
+        np.testing.assert_array_equal(index.vector(5), vectors[5])
+        self.assertEqual(sorted(article_id for article_id, _ in index.search(vectors[1], k=10)), [1, 3, 4, 5])
+
+
+# 后台加载在工作线程中开始和结束时关闭数据库连接，测试在同一个事务中运行，不能关闭
+@mock.patch.object(embeddings, 'close_old_connections', lambda: None)
+@mock.patch.object(embeddings, '_build_executor', _InlineExecutor())
+class RelatedArticlesTests(TestCase):
+    """相关文章按向量相似度排序，只返回同一作者仍存在的文章"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123')
+        other = User.objects.create_user(username='other', password='password123')
+        cls.article = Article.objects.create(title='数据库索引', content='<p>联合索引的列顺序和覆盖索引</p>',
+                                             author=cls.user)
+        cls.similar = Article.objects.create(title='索引设计', content='<p>数据库联合索引的使用</p>', author=cls.user)
+        cls.unrelated = Article.objects.create(title='前端组件', content='<p>组件拆分和状态管理</p>', author=cls.user)
+        Article.objects.create(title='数据库索引', content='<p>联合索引的列顺序和覆盖索引</p>', author=other)
+
+    def setUp(self):
+        patcher = mock.patch.object(embeddings, 'registry', embeddings.IndexRegistry(max_users=4))
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_request_does_not_load_index(self):
+        with mock.patch.object(embeddings, '_build_executor') as executor:
+            self.assertEqual(embeddings.related_articles(self.article), [])
+            self.assertEqual(embeddings.related_articles(self.article), [])
+        # 同一用户只提交一次加载任务
+        executor.submit.assert_called_once_with(self.registry.build, self.user.pk)
+        self.assertIsNone(self.registry.peek(self.user.pk))
+
+    def test_related_articles(self):
+        self.assertEqual(embeddings.related_articles(self.article, k=5), [])
+        results = embeddings.related_articles(self.article, k=5)
+        self.assertEqual([article.pk for article, _ in results], [self.similar.pk, self.unrelated.pk])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_deleted_article_filtered(self):
+        embeddings.related_articles(self.article)
+        self.similar.delete()
+        results = embeddings.related_articles(self.article)
+        self.assertEqual([article.pk for article, _ in results], [self.unrelated.pk])
@@ -0,0 +1,36 @@
+"""文章文本处理：HTML转纯文本和分词
+
+文章以中文为主，不引入分词库：连续的汉字按相邻两字（bigram）切分，单个汉字单独成词；
+英文、数字按单词切分并转为小写。相关文章和知识库检索共用这套分词。
+"""
+import html
+import re
+from typing import List
+
+from django.utils.html import strip_tags
+
+_CJK_RE = r'㐀-䶿一-鿿豈-﫿'
+_TOKEN_RE = re.compile(rf'[{_CJK_RE}]+|[a-z0-9_]+(?:[.\-+#][a-z0-9_]+)*')
+_CJK_RUN_RE = re.compile(rf'[{_CJK_RE}]')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def html_to_text(content: str) -> str:
+    """去掉HTML标签并合并空白"""
+    text = html.unescape(strip_tags(content or ''))
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """把纯文本切分为词：汉字bigram + 小写英文单词"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if _CJK_RUN_RE.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        elif len(word) > 1 or word.isdigit():
+            tokens.append(word)
+    return tokens
@@ -3,22 +3,102 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 import os
-from datetime import datetime
+from datetime import datetime, time
 
 from .models import Article
-from .serializers import ArticleListSerializer, ArticleDetailSerializer
+from .embeddings import related_articles
+from .pagination import ArticleCursorPagination, ArticleSearchPagination
+from .search import MAX_QUERY_LENGTH, build_highlights, search_queryset
+from .serializers import ArticleBulkSerializer, ArticleListSerializer, ArticleDetailSerializer
+
+LIST_ACTIONS = ('list', 'published', 'drafts')
+
+
+def _parse_bound(value: str, end: bool = False):
+    """解析日期或日期时间参数；只有日期时，结束边界取当天最后时刻"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        parsed = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_articles(queryset, params):
+    """按查询参数过滤文章列表
+
+    status、category（分类ID，none 表示未分类）、is_public（true/false）、
+    created_after / created_before（日期或日期时间）。按关键词查找使用 search 接口。
+    """
+    status_value = params.get('status')
+    if status_value:
+        if status_value not in dict(Article.STATUS_CHOICES):
+            raise ValidationError({'status': f'无效的状态: {status_value}'})
+        queryset = queryset.filter(status=status_value)
+
+    category = params.get('category')
+    if category:
+        if category == 'none':
+            queryset = queryset.filter(category__isnull=True)
+        elif category.isdigit():
+            queryset = queryset.filter(category_id=int(category))
+        else:
+            raise ValidationError({'category': '分类必须是ID或 none'})
+
+    is_public = params.get('is_public')
+    if is_public:
+        if is_public.lower() not in ('true', 'false', '1', '0'):
+            raise ValidationError({'is_public': '必须是 true 或 false'})
+        queryset = queryset.filter(is_public=is_public.lower() in ('true', '1'))
+
+    for name, lookup, end in (('created_after', 'created_at__gte', False),
+                              ('created_before', 'created_at__lte', True)):
+        value = params.get(name)
+        if value:
+            bound = _parse_bound(value, end)
+            if bound is None:
+                raise ValidationError({name: '日期格式应为 YYYY-MM-DD 或 ISO 8601'})
+            queryset = queryset.filter(**{lookup: bound})
+    return queryset
+
 
 class ArticleViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = ArticleCursorPagination
 
     def get_queryset(self):
-        return Article.objects.filter(author=self.request.user)
+        # 序列化器输出作者和分类名称，一次关联查出
+        queryset = Article.objects.filter(author=self.request.user).select_related('author', 'category')
+        if self.action in LIST_ACTIONS:
+            # 列表不返回正文
+            queryset = queryset.defer('content')
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in LIST_ACTIONS:
+            queryset = filter_articles(queryset, self.request.query_params)
+        return queryset
+
+    def _paginated_list(self, queryset):
+        page = self.paginate_queryset(self.filter_queryset(queryset))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in LIST_ACTIONS:
             return ArticleListSerializer
         return ArticleDetailSerializer
 
@@ -27,17 +107,109 @@ class ArticleViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def published(self, request):
-        """获取已发布的文章"""
-        articles = Article.objects.filter(author=request.user, status='published')
-        serializer = self.get_serializer(articles, many=True)
-        return Response(serializer.data)
+        """获取已发布的文章（分页和过滤参数与列表相同）"""
+        return self._paginated_list(self.get_queryset().filter(status='published'))
 
     @action(detail=False, methods=['get'])
     def drafts(self, request):
         """获取草稿文章"""
-        articles = Article.objects.filter(author=request.user, status='draft')
-        serializer = self.get_serializer(articles, many=True)
-        return Response(serializer.data)
+        return self._paginated_list(self.get_queryset().filter(status='draft'))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """全文搜索：q 为关键词，按相关度排序，支持与列表相同的过滤参数，page/page_size 分页
+
+        每条结果附带 highlight.title 和 highlight.snippet（已转义的HTML，命中的词用 <mark> 标出）。
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': '搜索关键词不能为空'}, status=400)
+        if len(query) > MAX_QUERY_LENGTH:
+            return Response({'error': f'搜索关键词不能超过{MAX_QUERY_LENGTH}个字符'}, status=400)
+
+        queryset = filter_articles(
+            Article.objects.filter(author=request.user).select_related('author', 'category'),
+            request.query_params
+        )
+        paginator = ArticleSearchPagination()
+        page = paginator.paginate_queryset(search_queryset(queryset, query), request, view=self)
+        highlights = build_highlights(page, query)
+        data = ArticleListSerializer(page, many=True).data
+        for item, article in zip(data, page):
+            item['score'] = round(float(article.score), 4)
+            item['highlight'] = highlights[article.pk]
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """批量操作：ids 为文章ID列表，action 为 publish / unpublish / delete / move_category / set_public
+
+        在一个事务中一次查出并锁定属于当前用户的文章，用一条 UPDATE 或 DELETE 完成修改。
+        results 按请求顺序给出每篇的结果：updated / deleted / unchanged（已是目标状态）/ not_found。
+        """
+        serializer = ArticleBulkSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        ids = serializer.validated_data['ids']
+        bulk_action = serializer.validated_data['action']
+        field, value = {
+            'publish': ('status', 'published'),
+            'unpublish': ('status', 'draft'),
+            'delete': (None, None),
+            'move_category': ('category_id', serializer.validated_data.get('category')),
+            'set_public': ('is_public', serializer.validated_data.get('is_public')),
+        }[bulk_action]
+
+        with transaction.atomic():
+            rows = (
+                Article.objects.select_for_update()
+                .filter(author=request.user, id__in=ids)
+                .values_list('id', 'status', 'category_id', 'is_public')
+            )
+            current = {row[0]: dict(zip(('status', 'category_id', 'is_public'), row[1:])) for row in rows}
+            if bulk_action == 'delete':
+                changed = set(current)
+                # 逐篇触发 post_delete 信号，从本进程的相关文章和知识库检索索引中移除
+                Article.objects.filter(id__in=changed).only('id', 'author_id').delete()
+            else:
+                changed = {article_id for article_id, values in current.items() if values[field] != value}
+                if changed:
+                    now = timezone.now()
+                    updates = {field: value, 'updated_at': now}
+                    if bulk_action == 'publish':
+                        updates['published_at'] = Coalesce('published_at', Value(now))
+                    # 只修改状态、分类或公开设置，正文不变，无需经过 save 更新向量和检索索引
+                    Article.objects.filter(id__in=changed).update(**updates)
+
+        done = 'deleted' if bulk_action == 'delete' else 'updated'
+        results = []
+        for article_id in ids:
+            if article_id not in current:
+                outcome = 'not_found'
+            elif article_id in changed:
+                outcome = done
+            else:
+                outcome = 'unchanged'
+            results.append({'id': article_id, 'status': outcome})
+        counts = {outcome: 0 for outcome in (done, 'unchanged', 'not_found')}
+        for item in results:
+            counts[item['status']] += 1
+        return Response({'action': bulk_action, 'counts': counts, 'results': results})
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """相关文章：按内容向量的余弦相似度取同一作者的 top-k 文章"""
+        article = self.get_object()
+        try:
+            k = min(max(int(request.query_params.get('k', 5)), 1), 20)
+        except ValueError:
+            return Response({'error': 'k 参数必须是整数'}, status=400)
+
+        results = related_articles(article, k)
+        data = ArticleListSerializer([related for related, _ in results], many=True).data
+        for item, (_, score) in zip(data, results):
+            item['score'] = round(score, 4)
+        return Response(data)
 
     @action(detail=True, methods=['post'])
     def publish(self, request, pk=None):
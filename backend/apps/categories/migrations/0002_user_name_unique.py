@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:52
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('categories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together={('user', 'name')},
+        ),
+    ]
@@ -13,7 +13,8 @@ class Category(models.Model):
         db_table = 'categories'
         verbose_name = '分类'
         verbose_name_plural = verbose_name
-        unique_together = ['name', 'user']
+        # 用户在前：唯一约束的索引同时用于按用户查询分类
+        unique_together = ['user', 'name']
         app_label = 'categories'  # 添加这一行
 
     def __str__(self):
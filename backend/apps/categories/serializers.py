@@ -2,16 +2,14 @@ from rest_framework import serializers
 from .models import Category
 
 class CategorySerializer(serializers.ModelSerializer):
-    article_count = serializers.SerializerMethodField()
+    # 由视图的查询集注解提供，新建的分类没有文章
+    article_count = serializers.IntegerField(read_only=True, default=0)
     
     class Meta:
         model = Category
         fields = ('id', 'name', 'description', 'color', 'article_count', 'created_at')
         read_only_fields = ('user', 'article_count')
     
-    def get_article_count(self, obj):
-        return obj.articles.count()
-    
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
\ No newline at end of file
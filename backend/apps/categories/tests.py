@@ -1,3 +1,45 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from articles.tests import create_articles
+from config.testing import QueryBudgetMixin
+from users.models import User
+
+from .models import Category
+
+
+class CategoryQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """分类接口的查询次数与分类数、文章数无关"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123')
+        cls.categories = [Category.objects.create(name=f'分类 {i}', user=cls.user) for i in range(5)]
+        create_articles(cls.user, 30, cls.categories)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def grow(self):
+        categories = [Category.objects.create(name=f'新分类 {i}', user=self.user) for i in range(10)]
+        create_articles(self.user, 60, self.categories + categories, start=1000)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_list(self):
+        self.assertQueryCountConstant(lambda: self.get('/api/categories/categories/'), self.grow, 1)
+        counts = {item['id']: item['article_count'] for item in self.get('/api/categories/categories/').data}
+        self.assertEqual(counts[self.categories[0].pk], self.categories[0].articles.count())
+
+    def test_retrieve(self):
+        with self.assertQueryBudget(1):
+            response = self.get(f'/api/categories/categories/{self.categories[0].pk}/')
+        self.assertEqual(response.data['article_count'], 6)
+
+    def test_articles(self):
+        url = f'/api/categories/categories/{self.categories[0].pk}/articles/'
+        self.assertQueryCountConstant(lambda: self.get(url), self.grow, 2)
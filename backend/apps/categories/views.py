@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db.models import Count
 from .models import Category
 from .serializers import CategorySerializer
 
@@ -10,7 +11,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Category.objects.filter(user=self.request.user)
+        # 文章数用 COUNT 注解一次查出，不再每个分类单独查询
+        return Category.objects.filter(user=self.request.user).annotate(article_count=Count('articles'))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -34,5 +36,5 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return Response({
             "category": category.name,
             "articles": article_data,
-            "article_count": articles.count()
+            "article_count": len(article_data)
         })
\ No newline at end of file
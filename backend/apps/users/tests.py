@@ -1,3 +1,45 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from articles.tests import create_articles
+from config.testing import QueryBudgetMixin
+
+from .models import User
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """用户接口的查询次数与用户的文章数无关"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', password='password123', email='writer@example.com')
+        create_articles(cls.user, 30)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def grow(self):
+        create_articles(self.user, 60, start=1000)
+
+    def test_login(self):
+        def request():
+            response = self.client.post('/api/auth/login/', {'username': 'writer', 'password': 'password123'},
+                                        format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertQueryCountConstant(request, self.grow, 1)
+
+    def test_profile(self):
+        self.client.force_authenticate(self.user)
+
+        def request():
+            response = self.client.get('/api/auth/profile/')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertQueryCountConstant(request, self.grow, 0)
+
+    def test_update_profile(self):
+        self.client.force_authenticate(self.user)
+        with self.assertQueryBudget(1):
+            response = self.client.put('/api/auth/profile/update/', {'bio': '简介'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
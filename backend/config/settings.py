@@ -57,6 +57,69 @@ INSTALLED_APPS = [
 
 # DeepSeek配置 - 添加详细的调试信息
 DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
+# 可指向本地模拟服务（python manage.py mock_deepseek）做离线压测
+DEEPSEEK_BASE_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1')
+# DeepSeek HTTP连接池与超时
+DEEPSEEK_POOL_CONNECTIONS = int(os.environ.get('DEEPSEEK_POOL_CONNECTIONS', '4'))
+DEEPSEEK_POOL_MAXSIZE = int(os.environ.get('DEEPSEEK_POOL_MAXSIZE', '32'))
+DEEPSEEK_CONNECT_TIMEOUT = float(os.environ.get('DEEPSEEK_CONNECT_TIMEOUT', '5'))
+DEEPSEEK_READ_TIMEOUT = float(os.environ.get('DEEPSEEK_READ_TIMEOUT', '60'))
+DEEPSEEK_TOTAL_TIMEOUT = float(os.environ.get('DEEPSEEK_TOTAL_TIMEOUT', '90'))
+# 备用上游（JSON列表，每项 {"name", "base_url", "model", "api_key"}，兼容OpenAI接口），按顺序作为降级目标
+AI_PROVIDERS = os.environ.get('AI_PROVIDERS', '')
+# 对冲请求：主上游超过该操作的延迟分位数仍未返回时向备用上游再发一次，对冲次数不超过请求数的 RATIO 倍
+AI_HEDGE_ENABLED = os.environ.get('AI_HEDGE_ENABLED', 'true').lower() == 'true'
+AI_HEDGE_PERCENTILE = float(os.environ.get('AI_HEDGE_PERCENTILE', '95'))
+AI_HEDGE_MIN_DELAY = float(os.environ.get('AI_HEDGE_MIN_DELAY', '1'))
+AI_HEDGE_BUDGET_RATIO = float(os.environ.get('AI_HEDGE_BUDGET_RATIO', '0.05'))
+# DeepSeek熔断与重试预算
+DEEPSEEK_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('DEEPSEEK_BREAKER_FAILURE_THRESHOLD', '5'))
+DEEPSEEK_BREAKER_RECOVERY_TIMEOUT = float(os.environ.get('DEEPSEEK_BREAKER_RECOVERY_TIMEOUT', '30'))
+DEEPSEEK_BREAKER_HALF_OPEN_MAX_CALLS = int(os.environ.get('DEEPSEEK_BREAKER_HALF_OPEN_MAX_CALLS', '1'))
+DEEPSEEK_RETRY_BUDGET_RATIO = float(os.environ.get('DEEPSEEK_RETRY_BUDGET_RATIO', '0.1'))
+DEEPSEEK_RETRY_BUDGET_MIN_PER_SECOND = float(os.environ.get('DEEPSEEK_RETRY_BUDGET_MIN_PER_SECOND', '0.5'))
+# AI调用调度：进程内同时进行的上游调用上限，以及为补全/对话保留的名额
+AI_SCHEDULER_MAX_IN_FLIGHT = int(os.environ.get('AI_SCHEDULER_MAX_IN_FLIGHT', '16'))
+AI_SCHEDULER_INTERACTIVE_RESERVED = int(os.environ.get('AI_SCHEDULER_INTERACTIVE_RESERVED', '4'))
+# AI接口限流（令牌桶，格式同DRF限流频率）：全局请求数、每个用户和全局的模型token数
+AI_THROTTLE_ENABLED = os.environ.get('AI_THROTTLE_ENABLED', 'true').lower() == 'true'
+AI_THROTTLE_GLOBAL_REQUEST_RATE = os.environ.get('AI_THROTTLE_GLOBAL_REQUEST_RATE', '600/min')
+AI_THROTTLE_USER_TOKEN_RATE = os.environ.get('AI_THROTTLE_USER_TOKEN_RATE', '200000/hour')
+AI_THROTTLE_GLOBAL_TOKEN_RATE = os.environ.get('AI_THROTTLE_GLOBAL_TOKEN_RATE', '5000000/hour')
+# AI结果缓存（摘要/标签/大纲）
+AI_RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('AI_RESULT_CACHE_MAX_ENTRIES', '1000'))
+AI_RESULT_CACHE_TTL = int(os.environ.get('AI_RESULT_CACHE_TTL', '3600'))
+AI_RESULT_CACHE_STORE_TTL = int(os.environ.get('AI_RESULT_CACHE_STORE_TTL', str(7 * 24 * 3600)))
+# AI文章润色
+AI_IMPROVE_MODE = os.environ.get('AI_IMPROVE_MODE', 'parallel')
+AI_IMPROVE_DEADLINE = float(os.environ.get('AI_IMPROVE_DEADLINE', '90'))
+AI_FANOUT_WORKERS = int(os.environ.get('AI_FANOUT_WORKERS', '16'))
+# 长文章分块摘要：分块最大字符数，单个请求并发摘要的分块数
+AI_CHUNK_MAX_CHARS = int(os.environ.get('AI_CHUNK_MAX_CHARS', '3000'))
+AI_CHUNK_CONCURRENCY = int(os.environ.get('AI_CHUNK_CONCURRENCY', '4'))
+# AI对话上下文：历史消息token预算，超出后把较早的对话压缩为摘要
+AI_CONTEXT_MAX_TOKENS = int(os.environ.get('AI_CONTEXT_MAX_TOKENS', '3000'))
+AI_CONTEXT_KEEP_MESSAGES = int(os.environ.get('AI_CONTEXT_KEEP_MESSAGES', '6'))
+# 知识库检索：对话时附带的相关文章分块数和token预算
+AI_RETRIEVAL_TOP_K = int(os.environ.get('AI_RETRIEVAL_TOP_K', '4'))
+AI_RETRIEVAL_MAX_TOKENS = int(os.environ.get('AI_RETRIEVAL_MAX_TOKENS', '1500'))
+# 编辑器行内补全：发送的上下文token数和生成的最大token数
+AI_AUTOCOMPLETE_CONTEXT_TOKENS = int(os.environ.get('AI_AUTOCOMPLETE_CONTEXT_TOKENS', '300'))
+AI_AUTOCOMPLETE_MAX_TOKENS = int(os.environ.get('AI_AUTOCOMPLETE_MAX_TOKENS', '64'))
+# 批量AI处理：单次请求的文章数上限、单个请求同时处理的文章数、全局批量处理线程数
+AI_BATCH_MAX_ARTICLES = int(os.environ.get('AI_BATCH_MAX_ARTICLES', '50'))
+AI_BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', '4'))
+AI_BATCH_WORKERS = int(os.environ.get('AI_BATCH_WORKERS', '8'))
+# AI后台任务队列（python manage.py ai_worker）
+AI_JOB_WORKER_CONCURRENCY = int(os.environ.get('AI_JOB_WORKER_CONCURRENCY', '4'))
+AI_JOB_LEASE_SECONDS = int(os.environ.get('AI_JOB_LEASE_SECONDS', '300'))
+AI_JOB_POLL_INTERVAL = float(os.environ.get('AI_JOB_POLL_INTERVAL', '1'))
+AI_JOB_MAX_ATTEMPTS = int(os.environ.get('AI_JOB_MAX_ATTEMPTS', '3'))
+
+# 相关文章：内存中最多缓存多少个用户的文章向量索引
+ARTICLE_EMBEDDING_CACHE_USERS = int(os.environ.get('ARTICLE_EMBEDDING_CACHE_USERS', '16'))
+# 首次使用时在后台加载向量索引的线程数
+ARTICLE_EMBEDDING_BUILD_WORKERS = int(os.environ.get('ARTICLE_EMBEDDING_BUILD_WORKERS', '2'))
 
 AUTH_USER_MODEL = 'users.User'
 MIDDLEWARE = [
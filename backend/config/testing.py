@@ -0,0 +1,76 @@
+"""测试工具：接口SQL查询次数预算
+
+QueryBudgetMixin 提供两个断言：
+- assertQueryBudget(budget)：代码块执行的查询不超过 budget 条；
+- assertQueryCountConstant(request, grow, budget)：执行一次请求，调用 grow 增加数据后再执行一次，
+  两次的查询次数必须相同（与数据量无关）且不超过 budget。
+
+失败信息把SQL中的字面量替换为 ?，相同的语句合并计数，增长检查还会给出两次执行的差异，
+重复出现的 N+1 查询一眼就能看出来。
+
+运行：python manage.py test articles categories users apps.ai.tests
+"""
+import difflib
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, List
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)')
+_MAX_SQL = 300
+
+
+def normalize_sql(sql: str) -> str:
+    """去掉字面量，同一语句模板得到相同的字符串"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    if len(sql) > _MAX_SQL:
+        sql = sql[:_MAX_SQL] + '…'
+    return sql
+
+
+def summarize_queries(queries: List[dict]) -> List[str]:
+    """按首次出现的顺序列出语句模板，重复执行的标注次数"""
+    counts = Counter(normalize_sql(query['sql']) for query in queries)
+    return [f'{count:>3} × {sql}' for sql, count in counts.items()]
+
+
+class QueryBudgetMixin:
+    """TestCase 混入类：SQL查询次数预算断言"""
+
+    def _capture(self, func: Callable, using: str) -> List[dict]:
+        with CaptureQueriesContext(connections[using]) as context:
+            func()
+        return context.captured_queries
+
+    @contextmanager
+    def assertQueryBudget(self, budget: int, using: str = DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            self.fail(
+                f'执行了 {executed} 条查询，超出预算 {budget} 条：\n'
+                + '\n'.join(summarize_queries(context.captured_queries))
+            )
+
+    def assertQueryCountConstant(self, request: Callable, grow: Callable, budget: int,
+                                 using: str = DEFAULT_DB_ALIAS):
+        """request 执行一次被测请求，grow 增加数据（其中的查询不计入）"""
+        before = self._capture(request, using)
+        grow()
+        after = self._capture(request, using)
+        if len(after) != len(before):
+            diff = difflib.unified_diff(
+                summarize_queries(before), summarize_queries(after),
+                fromfile=f'增加数据前（{len(before)} 条）', tofile=f'增加数据后（{len(after)} 条）', lineterm=''
+            )
+            self.fail('查询次数随数据量增长：\n' + '\n'.join(diff))
+        if len(after) > budget:
+            self.fail(f'执行了 {len(after)} 条查询，超出预算 {budget} 条：\n' + '\n'.join(summarize_queries(after)))
@@ -1,11 +1,27 @@
 // src/api/ai.js - 修复版本
 import request from '@/utils/request'
+import { useAuthStore } from '@/stores/auth'
 
-// AI助手会话管理
-export const getAISessions = () => {
+// 从游标分页响应的 next 链接中取出游标参数
+export const cursorOf = (url) => {
+  return url ? new URL(url).searchParams.get('cursor') : null
+}
+
+// AI助手会话管理（游标分页，按最近更新时间倒序）
+export const getAISessions = (params) => {
   return request({
     url: '/api/ai/sessions/',
-    method: 'get'
+    method: 'get',
+    params
+  })
+}
+
+// 会话消息（游标分页，最新的在前）
+export const getAISessionMessages = (sessionId, params) => {
+  return request({
+    url: `/api/ai/sessions/${sessionId}/messages/`,
+    method: 'get',
+    params
   })
 }
 
@@ -34,6 +50,16 @@ export const aiChat = (sessionId, message) => {
   })
 }
 
+// 重新生成失败或中断的AI回复
+export const aiRetryMessage = (sessionId, messageId) => {
+  return request({
+    url: `/api/ai/sessions/${sessionId}/retry/`,
+    method: 'post',
+    data: { message_id: messageId },
+    timeout: 120000
+  })
+}
+
 // 文章AI功能 - 修复路径
 export const aiCreateOutline = (data) => {
   return request({
@@ -71,6 +97,8 @@ export const aiCreateTags = (data) => {
   })
 }
 
+// 自动补全：data.mode 为 'inline' 时是编辑器行内建议（短上下文、短输出、带缓存）；
+// 同一编辑器传相同的 channel 和递增的 request_id，新请求会取消服务端尚未完成的旧请求
 export const aiAutoComplete = (data) => {
   return request({
     url: '/api/ai/articles/auto_complete/',
@@ -79,3 +107,63 @@ export const aiAutoComplete = (data) => {
     timeout: 30000
   })
 }
+
+// SSE流式请求：逐条回调服务端推送的事件（token/done/error 等）
+const postEventStream = async (url, data, onEvent, signal) => {
+  const authStore = useAuthStore()
+  const response = await fetch(`${request.defaults.baseURL}${url}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+      ...(authStore.token ? { Authorization: `Bearer ${authStore.token}` } : {})
+    },
+    body: JSON.stringify(data),
+    signal
+  })
+
+  if (!response.body) {
+    throw new Error(`请求失败: ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder('utf-8')
+  let buffer = ''
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // 事件之间以空行分隔
+    let boundary = buffer.indexOf('\n\n')
+    while (boundary !== -1) {
+      const raw = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      boundary = buffer.indexOf('\n\n')
+
+      let event = 'message'
+      let payload = ''
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) payload += line.slice(5).trim()
+      }
+      if (payload) onEvent(event, JSON.parse(payload))
+    }
+  }
+}
+
+// AI对话（流式）
+export const aiChatStream = (sessionId, message, onEvent, signal) => {
+  return postEventStream(`/api/ai/sessions/${sessionId}/chat_stream/`, { message }, onEvent, signal)
+}
+
+// 文章自动补全（流式）
+export const aiAutoCompleteStream = (data, onEvent, signal) => {
+  return postEventStream('/api/ai/articles/auto_complete_stream/', data, onEvent, signal)
+}
+
+// 批量为文章生成摘要和标签（流式，每篇文章完成后推送 item 事件，最后推送 done 事件）
+export const aiBatchProcessStream = (data, onEvent, signal) => {
+  return postEventStream('/api/ai/batch/', { ...data, stream: true }, onEvent, signal)
+}
@@ -1,12 +1,32 @@
 import request from '@/utils/request'
 
-export const getArticles = () => {
+// 游标分页：params 可包含 page_size、cursor（上一次响应中 next/previous 链接的 cursor 参数）
+// 以及过滤条件 status、category、is_public、created_after、created_before（按关键词查找用 searchArticles）
+// 返回 { results, next, previous, count, count_capped }，count 超过上限时为近似值
+export const getArticles = (params = {}) => {
   return request({
     url: '/api/articles/articles/',
-    method: 'get'
+    method: 'get',
+    params
   })
 }
 
+// 全文搜索：q 为关键词，支持与列表相同的过滤参数，page/page_size 分页（按相关度排序）
+// 每条结果带 highlight.title / highlight.snippet（已转义的HTML，命中词用 <mark> 标出）
+export const searchArticles = (params) => {
+  return request({
+    url: '/api/articles/articles/search/',
+    method: 'get',
+    params
+  })
+}
+
+// 从 next/previous 链接中取出 cursor 参数
+export const cursorFromLink = (link) => {
+  if (!link) return null
+  return new URL(link, window.location.origin).searchParams.get('cursor')
+}
+
 export const createArticle = (data) => {
   return request({
     url: '/api/articles/articles/',
@@ -30,6 +50,17 @@ export const deleteArticle = (id) => {
   })
 }
 
+// 批量操作：action 为 publish / unpublish / delete / move_category（需 category，null 表示移出分类）
+// / set_public（需 is_public），一次请求最多 1000 篇
+// 返回 { action, counts, results: [{ id, status }] }，status 为 updated / deleted / unchanged / not_found
+export const bulkArticles = (data) => {
+  return request({
+    url: '/api/articles/articles/bulk/',
+    method: 'post',
+    data
+  })
+}
+
 export const getArticle = (id) => {
   return request({
     url: `/api/articles/articles/${id}/`,